@@ -0,0 +1,5 @@
+import time
+
+# Время загрузки воркера считаем от начала импорта пакета приложения,
+# до тяжелых импортов app.main
+BOOT_STARTED = time.perf_counter()
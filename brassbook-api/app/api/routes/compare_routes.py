@@ -1,61 +1,195 @@
 import asyncio
+import functools
+import json
 import logging
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
-from app.core.auth import security
-from app.config import MAX_FILE_SIZE
-from app.core.compare_melodies import compare_melodies
+from typing import List, Optional, Tuple
+import numpy as np
+from fastapi import (APIRouter, Depends, File, Form, HTTPException, Request,
+                     UploadFile, WebSocket, WebSocketDisconnect, status)
+from authx.schema import RequestToken
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.api.uploads import check_upload_size, read_upload
+from app.core.auth import get_current_user, security
+from app.config import (COMPARE_RETRY_AFTER, JWT_ACCESS_COOKIE_NAME,
+                        MAX_BATCH_FILES, MAX_FILE_SIZE)
+from app.core.analysis_executor import ExecutorBusyError, analysis_executor
+from app.core.comparison_jobs import comparison_jobs
+from app.core.direct_uploads import find_recording, load_recording
+from app.core.reference_catalog import (ReferenceAnalysisError, get_reference,
+                                        load_reference_melody)
+from app.core.streaming_comparison import StreamingComparison
+from app.data.database import SessionLocal, get_db
+from app.data.storage import ObjectStorage, get_object_storage
 
 logger = logging.getLogger(__name__)
 
 compare_router = APIRouter(tags=["compare"])
 
+MP3_CONTENT_TYPES = ("audio/mpeg",)
+WEBM_CONTENT_TYPES = ("audio/webm", "audio/webm;codecs=opus")
+
+
+class BatchComparisonItem(BaseModel):
+    filename: Optional[str]
+    result: Optional[list]
+    recording_id: Optional[int] = None
+
+
+class ComparisonJobStatus(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[list] = None
+
+
+def busy_exception() -> HTTPException:
+    """Build the 503 response returned when the analysis queue is full."""
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(COMPARE_RETRY_AFTER)},
+    )
+
+
+def validate_reference_choice(
+    file1: Optional[UploadFile], reference_id: Optional[int]
+) -> None:
+    """
+    Check that exactly one reference source is given and that file1 is an MP3.
+
+    Raises:
+        HTTPException: If both or neither are given, or file1 is not an MP3.
+    """
+    if (file1 is None) == (reference_id is None):
+        logger.warning("Request must contain either file1 or reference_id")
+        raise HTTPException(
+            status_code=400, detail="Provide either file1 or reference_id"
+        )
+    if file1 is not None and file1.content_type not in MP3_CONTENT_TYPES:
+        logger.warning("Invalid file1 type: %s", file1.content_type)
+        raise HTTPException(status_code=400, detail="File1 must be an MP3 file")
+
+
+def validate_recording_choice(
+    file2: Optional[UploadFile], recording_id: Optional[int]
+) -> None:
+    """
+    Check that exactly one recording source is given and that file2 is a WebM.
+
+    Raises:
+        HTTPException: If both or neither are given, or file2 is not a WebM.
+    """
+    if (file2 is None) == (recording_id is None):
+        logger.warning("Request must contain either file2 or recording_id")
+        raise HTTPException(
+            status_code=400, detail="Provide either file2 or recording_id"
+        )
+    if file2 is not None and file2.content_type not in WEBM_CONTENT_TYPES:
+        logger.warning("Invalid file2 type: %s", file2.content_type)
+        raise HTTPException(status_code=400, detail="File2 must be a WebM file")
+
+
+async def load_catalog_reference(
+    reference_id: int, db: Session
+) -> Tuple[np.ndarray, float]:
+    """
+    Load the analysed melody of a catalog reference.
+
+    Raises:
+        HTTPException: If the reference does not exist or cannot be analysed.
+        ExecutorBusyError: If a re-analysis is needed and the queue is full.
+    """
+    reference = get_reference(db, reference_id)
+    if reference is None:
+        logger.warning("Reference not found: %s", reference_id)
+        raise HTTPException(status_code=404, detail="Reference not found")
+    try:
+        return await load_reference_melody(db, reference)
+    except ReferenceAnalysisError as e:
+        logger.error("Reference %s could not be analysed: %s", reference_id, str(e))
+        raise HTTPException(status_code=500, detail="Failed to analyse the reference")
+
+
 @compare_router.post(
     "/api/v1/compare_melodies",
     summary="Compare two audio files for melody similarity",
     dependencies=[Depends(security.get_token_from_request)]
 )
 async def compare_melodies_route(
-    file1: UploadFile = File(..., media_type="audio/mpeg"),
-    file2: UploadFile = File(..., media_type="audio/webm")  # Allow WebM for file2
+    request: Request,
+    file2: Optional[UploadFile] = File(None, media_type="audio/webm"),
+    file1: Optional[UploadFile] = File(None, media_type="audio/mpeg"),
+    reference_id: Optional[int] = Form(None),
+    recording_id: Optional[int] = Form(None),
+    db: Session = Depends(get_db),
+    storage: ObjectStorage = Depends(get_object_storage),
 ):
     """
     Compare two uploaded audio files to determine melody similarity.
 
+    The reference is either uploaded as file1 or taken from the reference
+    catalog by reference_id, in which case it is not decoded again. The
+    student recording is either uploaded as file2 or is a recording the
+    current user has uploaded directly to storage (recording_id).
+
     Args:
-        file1: First audio file (must be MP3).
-        file2: Second audio file (must be WebM).
+        request: Incoming request, used to identify the owner of recording_id.
+        file1: First audio file (must be MP3); omitted if reference_id is given.
+        file2: Second audio file (must be WebM); omitted if recording_id is given.
+        reference_id: Catalog reference to compare against instead of file1.
+        recording_id: Confirmed direct upload to compare instead of file2.
+        db: SQLAlchemy database session.
+        storage: Object storage holding direct uploads.
 
     Returns:
         dict: Comparison result or error message.
 
     Raises:
-        HTTPException: If file validation fails, file is too large, or comparison fails.
+        HTTPException: If file validation fails, file is too large, the analysis
+            queue is full, or comparison fails.
     """
-    logger.info("Received request to compare melodies: %s, %s", file1.filename, file2.filename)
+    logger.info(
+        "Received request to compare melodies: %s, %s",
+        reference_id if file1 is None else file1.filename,
+        recording_id if file2 is None else file2.filename,
+    )
 
     try:
         # Validate file types
-        if file1.content_type != "audio/mpeg":
-            logger.warning("Invalid file1 type: %s", file1.content_type)
-            raise HTTPException(status_code=400, detail="File1 must be an MP3 file")
-        if file2.content_type not in ["audio/webm", "audio/webm;codecs=opus"]:
-            logger.warning("Invalid file2 type: %s", file2.content_type)
-            raise HTTPException(status_code=400, detail="File2 must be a WebM file")
+        validate_reference_choice(file1, reference_id)
+        validate_recording_choice(file2, recording_id)
 
         # Read file contents and validate size
-        file1_content = await file1.read()
-        file2_content = await file2.read()
+        file1_content = None
+        if file1 is not None:
+            file1_content = await read_upload(file1, "File1")
+        file2_format = "webm"
+        if file2 is not None:
+            file2_content = await read_upload(file2, "File2")
+        else:
+            file2_content, file2_format = await load_recording(
+                db, storage, get_current_user(request, db), recording_id
+            )
 
-        if len(file1_content) > MAX_FILE_SIZE:
-            logger.warning("File1 too large: %s", file1.filename)
-            raise HTTPException(status_code=413, detail="File1 exceeds 10MB limit")
-        if len(file2_content) > MAX_FILE_SIZE:
-            logger.warning("File2 too large: %s", file2.filename)
-            raise HTTPException(status_code=413, detail="File2 exceeds 10MB limit")
-
-        # Run comparison in a thread
-        logger.debug("Starting melody comparison thread")
-        comparison_result = await asyncio.to_thread(compare_melodies, file1_content, file2_content)
+        # Run comparison on the analysis executor
+        logger.debug("Submitting melody comparison to the analysis executor")
+        try:
+            if file1_content is None:
+                teacher_melody, min_per_t = await load_catalog_reference(
+                    reference_id, db
+                )
+                comparison_result = await analysis_executor.compare_with_melody(
+                    teacher_melody, min_per_t, file2_content, file2_format
+                )
+            else:
+                comparison_result = await analysis_executor.compare(
+                    file1_content, file2_content, file2_format=file2_format
+                )
+        except ExecutorBusyError:
+            raise busy_exception()
+        except asyncio.TimeoutError:
+            logger.error("Melody comparison timed out")
+            raise HTTPException(status_code=504, detail="Melody comparison timed out")
 
         if comparison_result is None:
             logger.error("Melody comparison returned None")
@@ -69,4 +203,399 @@ async def compare_melodies_route(
         raise
     except Exception as e:
         logger.error("Unexpected error during melody comparison: %s", str(e))
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@compare_router.post(
+    "/api/v1/compare_melodies/batch",
+    summary="Compare many recordings against one reference",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=List[BatchComparisonItem],
+)
+async def compare_melodies_batch_route(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None, media_type="audio/webm"),
+    file1: Optional[UploadFile] = File(None, media_type="audio/mpeg"),
+    reference_id: Optional[int] = Form(None),
+    recording_ids: Optional[List[int]] = Form(None),
+    db: Session = Depends(get_db),
+    storage: ObjectStorage = Depends(get_object_storage),
+):
+    """
+    Compare a class's recordings of the same exercise with one reference.
+
+    The reference is analysed once (or taken from the catalog) and the
+    recordings are analysed in parallel on the analysis executor. Every
+    recording is validated up front but read only when a worker is free for
+    it, so memory use is bounded by the number of workers, not the batch.
+
+    Args:
+        request: Incoming request, used to identify the owner of recording_ids.
+        files: Student recordings (must be WebM).
+        file1: Reference audio file (must be MP3); omitted if reference_id is given.
+        reference_id: Catalog reference to compare against instead of file1.
+        recording_ids: Confirmed direct uploads (must be WebM) to compare too.
+        db: SQLAlchemy database session.
+        storage: Object storage holding direct uploads.
+
+    Returns:
+        List[BatchComparisonItem]: Per-recording results, uploaded files first
+        in upload order, then recording_ids in the given order; the result
+        has the same shape as /api/v1/compare_melodies or is null if that
+        recording could not be analysed.
+
+    Raises:
+        HTTPException: If validation fails, a file is too large, the batch is
+            too big, the analysis queue is full, or the analysis times out.
+    """
+    files = files or []
+    recording_ids = recording_ids or []
+    count = len(files) + len(recording_ids)
+    logger.info(
+        "Received batch comparison request: %s against %d recordings",
+        reference_id if file1 is None else file1.filename,
+        count,
+    )
+
+    validate_reference_choice(file1, reference_id)
+    if count == 0:
+        logger.warning("Batch contains no recordings")
+        raise HTTPException(
+            status_code=400, detail="Provide files or recording_ids"
+        )
+    if count > MAX_BATCH_FILES:
+        logger.warning("Batch too large: %d recordings", count)
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds limit of {MAX_BATCH_FILES} recordings",
+        )
+    for file in files:
+        if file.content_type not in WEBM_CONTENT_TYPES:
+            logger.warning("Invalid recording type: %s", file.content_type)
+            raise HTTPException(
+                status_code=400, detail=f"{file.filename} must be a WebM file"
+            )
+
+    file1_content = None
+    if file1 is not None:
+        file1_content = await read_upload(file1, "File1")
+    recordings = []
+    for file in files:
+        check_upload_size(file, file.filename)
+        recordings.append(functools.partial(read_upload, file, file.filename))
+    if recording_ids:
+        user = get_current_user(request, db)
+        for recording_id in recording_ids:
+            object_name, file_format = find_recording(db, user, recording_id)
+            if file_format != "webm":
+                logger.warning("Invalid recording format: %s", file_format)
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Recording {recording_id} must be a WebM file",
+                )
+            recordings.append(functools.partial(storage.get_bytes, object_name))
+
+    try:
+        if file1_content is None:
+            teacher_melody, min_per_t = await load_catalog_reference(reference_id, db)
+            results = await analysis_executor.compare_batch_with_melody(
+                teacher_melody, min_per_t, recordings
+            )
+        else:
+            results = await analysis_executor.compare_batch(file1_content, recordings)
+    except ExecutorBusyError:
+        raise busy_exception()
+    except asyncio.TimeoutError:
+        logger.error("Batch comparison timed out")
+        raise HTTPException(status_code=504, detail="Melody comparison timed out")
+
+    failed = sum(result is None for result in results)
+    if failed:
+        logger.warning("%d of %d recordings could not be compared", failed, count)
+    logger.info("Batch comparison completed: %d recordings", count)
+    sources = [(file.filename, None) for file in files]
+    sources += [(None, recording_id) for recording_id in recording_ids]
+    return [
+        BatchComparisonItem(
+            filename=filename,
+            recording_id=recording_id,
+            result=None if result is None else list(result),
+        )
+        for (filename, recording_id), result in zip(sources, results)
+    ]
+
+
+@compare_router.post(
+    "/api/v1/compare_melodies/jobs",
+    summary="Start a background melody comparison",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=ComparisonJobStatus,
+    status_code=202,
+)
+async def submit_comparison_job(
+    request: Request,
+    file2: Optional[UploadFile] = File(None, media_type="audio/webm"),
+    file1: Optional[UploadFile] = File(None, media_type="audio/mpeg"),
+    reference_id: Optional[int] = Form(None),
+    recording_id: Optional[int] = Form(None),
+    db: Session = Depends(get_db),
+    storage: ObjectStorage = Depends(get_object_storage),
+):
+    """
+    Submit a comparison and return immediately with a job id.
+
+    The reference and the recording are given as in /api/v1/compare_melodies,
+    so a long take uploaded directly to storage is not uploaded again. Only
+    the submitting user can poll the job.
+
+    Args:
+        request: Incoming request, used to identify the submitting user.
+        file1: Reference audio file (must be MP3); omitted if reference_id is given.
+        file2: Student recording (must be WebM); omitted if recording_id is given.
+        reference_id: Catalog reference to compare against instead of file1.
+        recording_id: Confirmed direct upload to compare instead of file2.
+        db: SQLAlchemy database session.
+        storage: Object storage holding direct uploads.
+
+    Returns:
+        ComparisonJobStatus: Identifier and status of the pending job.
+
+    Raises:
+        HTTPException: If validation fails, a file is too large, or the
+            analysis queue is full.
+    """
+    logger.info(
+        "Received comparison job: %s, %s",
+        reference_id if file1 is None else file1.filename,
+        recording_id if file2 is None else file2.filename,
+    )
+    validate_reference_choice(file1, reference_id)
+    validate_recording_choice(file2, recording_id)
+
+    user = get_current_user(request, db)
+    file1_content = None
+    if file1 is not None:
+        file1_content = await read_upload(file1, "File1")
+    file2_format = "webm"
+    if file2 is not None:
+        file2_content = await read_upload(file2, "File2")
+    else:
+        file2_content, file2_format = await load_recording(
+            db, storage, user, recording_id
+        )
+
+    try:
+        if file1_content is None:
+            teacher_melody, min_per_t = await load_catalog_reference(reference_id, db)
+            job = comparison_jobs.submit_with_melody(
+                user.id, teacher_melody, min_per_t, file2_content, file2_format
+            )
+        else:
+            job = comparison_jobs.submit(
+                user.id, file1_content, file2_content, file2_format=file2_format
+            )
+    except ExecutorBusyError:
+        raise busy_exception()
+    return ComparisonJobStatus(job_id=job.id, status=job.status)
+
+
+@compare_router.get(
+    "/api/v1/compare_melodies/jobs/{job_id}",
+    summary="Get the status and result of a background comparison",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=ComparisonJobStatus,
+)
+async def get_comparison_job(
+    job_id: str, request: Request, db: Session = Depends(get_db)
+):
+    """
+    Poll a background comparison submitted by the current user.
+
+    Args:
+        job_id: Identifier returned when the job was submitted.
+        request: Incoming request, used to identify the current user.
+        db: SQLAlchemy database session.
+
+    Returns:
+        ComparisonJobStatus: Job status ("pending", "done" or "failed") and, once
+        done, the result in the same shape as /api/v1/compare_melodies.
+
+    Raises:
+        HTTPException: If the job is unknown, its result has expired, or it
+            was submitted by another user.
+    """
+    job = comparison_jobs.get(job_id, get_current_user(request, db).id)
+    if job is None:
+        logger.warning("Comparison job not found: %s", job_id)
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ComparisonJobStatus(
+        job_id=job.id,
+        status=job.status,
+        result=None if job.result is None else list(job.result),
+    )
+
+
+def websocket_authorized(websocket: WebSocket) -> bool:
+    """
+    Check the access token of a WebSocket handshake.
+
+    Browsers send the access cookie with the handshake; other clients may pass
+    the token as the ``token`` query parameter.
+
+    Args:
+        websocket: Incoming WebSocket connection.
+
+    Returns:
+        bool: True if a valid access token was presented.
+    """
+    location = "cookies"
+    token = websocket.cookies.get(JWT_ACCESS_COOKIE_NAME)
+    if token is None:
+        location = "query"
+        token = websocket.query_params.get("token")
+    if token is None:
+        return False
+    try:
+        security.verify_token(
+            RequestToken(token=token, location=location), verify_csrf=False
+        )
+        return True
+    except Exception as e:
+        logger.warning("Rejected WebSocket token: %s", str(e))
+        return False
+
+
+async def forward_events(websocket: WebSocket, session: StreamingComparison):
+    """Send live verdicts to the client until the None sentinel arrives."""
+    while True:
+        event = await session.events.get()
+        if event is None:
+            return
+        await websocket.send_json(event)
+
+
+async def close_with_error(websocket: WebSocket, code: int, detail: str):
+    """Report an error to the client and close the connection."""
+    await websocket.send_json({"type": "error", "detail": detail})
+    await websocket.close(code=code)
+
+
+@compare_router.websocket("/api/v1/compare_melodies/stream")
+async def compare_melodies_stream(websocket: WebSocket):
+    """
+    Compare a recording while it is being played, with live per-note feedback.
+
+    Protocol:
+        1. The client sends the reference MP3 as the first binary message,
+           or a text message {"reference_id": <id>} naming a catalog
+           reference; the server answers {"type": "ready"} once it is loaded.
+        2. The client sends the WebM recording in binary chunks as it is
+           recorded (e.g. MediaRecorder timeslices). Whenever notes are
+           completed the server pushes {"type": "notes", "seconds": ...,
+           "notes": [{"index", "band", "length", "expected_band", "pitch_ok",
+           "rhythm_ok"}, ...]}.
+        3. The client sends the text message "stop"; the server answers
+           {"type": "result", "result": [...]} with the same result as
+           /api/v1/compare_melodies and closes the connection.
+
+    Errors are reported as {"type": "error", "detail": ...} before closing.
+    """
+    if not websocket_authorized(websocket):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    session = None
+    forwarder = None
+    try:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        if message.get("text") is not None:
+            # Сессия БД нужна только для загрузки эталона, не на все время записи
+            db = SessionLocal()
+            try:
+                teacher_melody, min_per_t = await load_catalog_reference(
+                    int(json.loads(message["text"])["reference_id"]), db
+                )
+            except (ValueError, KeyError, TypeError):
+                await close_with_error(
+                    websocket, status.WS_1003_UNSUPPORTED_DATA, "Invalid reference"
+                )
+                return
+            except HTTPException as e:
+                await close_with_error(
+                    websocket, status.WS_1003_UNSUPPORTED_DATA, str(e.detail)
+                )
+                return
+            finally:
+                db.close()
+        elif len(message["bytes"]) > MAX_FILE_SIZE:
+            await close_with_error(
+                websocket, status.WS_1009_MESSAGE_TOO_BIG, "File1 exceeds 10MB limit"
+            )
+            return
+        else:
+            with analysis_executor.reserve():
+                teacher_melody, min_per_t = await analysis_executor.extract_reference(
+                    message["bytes"]
+                )
+        if teacher_melody is None:
+            await close_with_error(
+                websocket,
+                status.WS_1003_UNSUPPORTED_DATA,
+                "Failed to analyse the reference",
+            )
+            return
+
+        session = StreamingComparison.open(teacher_melody, min_per_t)
+        forwarder = asyncio.create_task(forward_events(websocket, session))
+        await websocket.send_json({"type": "ready"})
+        logger.info("Streaming comparison started")
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                session.feed(message["bytes"])
+                if session.received > MAX_FILE_SIZE:
+                    await close_with_error(
+                        websocket,
+                        status.WS_1009_MESSAGE_TOO_BIG,
+                        "File2 exceeds 10MB limit",
+                    )
+                    return
+            elif message.get("text") == "stop":
+                break
+
+        result = await session.finish()
+        session.events.put_nowait(None)
+        await forwarder
+        if result is None:
+            await close_with_error(
+                websocket,
+                status.WS_1011_INTERNAL_ERROR,
+                "Error during melody comparison",
+            )
+            return
+        await websocket.send_json({"type": "result", "result": list(result)})
+        await websocket.close()
+        logger.info("Streaming comparison completed: %d bytes", session.received)
+
+    except WebSocketDisconnect:
+        logger.info("Streaming comparison aborted by the client")
+    except ExecutorBusyError:
+        await close_with_error(
+            websocket, status.WS_1013_TRY_AGAIN_LATER, "Server is busy"
+        )
+    except asyncio.TimeoutError:
+        logger.error("Streaming comparison timed out")
+        await close_with_error(
+            websocket, status.WS_1011_INTERNAL_ERROR, "Melody comparison timed out"
+        )
+    finally:
+        if forwarder is not None and not forwarder.done():
+            forwarder.cancel()
+        if session is not None:
+            session.close()
@@ -12,18 +12,17 @@ from pydantic import BaseModel, EmailStr
 from sqlalchemy.orm import Session
 import jwt
 
-from app.config import JWT_REFRESH_COOKIE_NAME, MINIO_BUCKET_NAME, MAX_FILE_SIZE
+from app.config import JWT_REFRESH_COOKIE_NAME, MAX_FILE_SIZE
 from app.core.auth import get_current_user, pwd_context, security
 from app.core.email_sender import send_verification_email
 from app.data.database import get_db
 from app.data.models import User
-from app.data.storage import get_minio_client
+from app.core.avatar_thumbnails import AvatarThumbnailer, get_avatar_thumbnailer
+from app.data.storage import ObjectStorage, get_object_storage, presigned_urls
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-minio_client = get_minio_client()
-
 router = APIRouter(prefix="/api/v1", tags=["legacy"])
 
 class Register(BaseModel):
@@ -334,7 +333,13 @@ def update_user(data: UpdateUser, user: User, db: Session) -> User:
         raise HTTPException(status_code=500, detail="Failed to update profile")
 
 
-def update_avatar(avatar: UploadFile, user: User, db: Session) -> User:
+async def update_avatar(
+    avatar: UploadFile,
+    user: User,
+    db: Session,
+    storage: ObjectStorage,
+    thumbnailer: AvatarThumbnailer,
+) -> User:
     """
     Update the user's avatar and store it in MinIO.
 
@@ -342,6 +347,8 @@ def update_avatar(avatar: UploadFile, user: User, db: Session) -> User:
         avatar: Uploaded avatar file.
         user: Current authenticated user.
         db: SQLAlchemy database session.
+        storage: Object storage receiving the file.
+        thumbnailer: Background worker creating the resized variants.
 
     Returns:
         User: Updated user object.
@@ -362,16 +369,20 @@ def update_avatar(avatar: UploadFile, user: User, db: Session) -> User:
         avatar.file.seek(0, 2)
         file_size = avatar.file.tell()
         avatar.file.seek(0)
-        minio_client.put_object(
-            bucket_name=MINIO_BUCKET_NAME,
-            object_name=object_name,
-            data=avatar.file,
-            length=file_size,
-            content_type=avatar.content_type or "application/octet-stream",
+        await storage.put_file(
+            object_name,
+            avatar.file,
+            file_size,
+            avatar.content_type or "application/octet-stream",
         )
-        avatar_url = minio_client.presigned_get_object(MINIO_BUCKET_NAME, object_name)
-        user.avatar = avatar_url
+        # Persist the stable object key rather than a presigned URL that expires;
+        # the file was replaced, so stop handing out URLs signed for the old one
+        presigned_urls.discard(object_name)
+        user.photo_url = f"/{storage.bucket}/{object_name}"
+        user.photo_sizes = None
         db.commit()
+        thumbnailer.schedule(user.id, user.photo_url)
+        user.avatar = await storage.get_url(object_name)
         logger.info("Avatar updated successfully for user: %s", user.email)
         return user
     except Exception as e:
@@ -528,15 +539,17 @@ def update_user_endpoint(
 
 
 @router.put("/auth/avatar", dependencies=[Depends(security.get_token_from_request)])
-def update_avatar_endpoint(
+async def update_avatar_endpoint(
     token: RequestToken = Depends(),
     avatar: UploadFile = File(...),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    storage: ObjectStorage = Depends(get_object_storage),
+    thumbnailer: AvatarThumbnailer = Depends(get_avatar_thumbnailer),
 ):
     """Update the user's avatar."""
     try: 
         security.verify_token(token=token)
-        return update_avatar(avatar, user, db)
+        return await update_avatar(avatar, user, db, storage, thumbnailer)
     except Exception as e:
           raise HTTPException(401, detail={"message": str(e)}) from e
\ No newline at end of file
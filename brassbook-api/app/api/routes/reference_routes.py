@@ -0,0 +1,110 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.api.routes.compare_routes import MP3_CONTENT_TYPES, busy_exception
+from app.api.uploads import read_upload
+from app.core.analysis_executor import ExecutorBusyError
+from app.core.auth import security
+from app.core.reference_catalog import (
+    ReferenceAnalysisError,
+    get_reference,
+    list_references,
+    register_reference,
+)
+from app.data.database import get_db
+from app.data.models import ReferenceTrack
+
+logger = logging.getLogger(__name__)
+
+reference_router = APIRouter(prefix="/api/v1/references", tags=["references"])
+
+
+class ReferenceResponse(BaseModel):
+    id: int
+    title: Optional[str]
+    created_at: Optional[datetime]
+
+
+def to_response(reference: ReferenceTrack) -> ReferenceResponse:
+    return ReferenceResponse(
+        id=reference.id, title=reference.title, created_at=reference.created_at
+    )
+
+
+@reference_router.post(
+    "",
+    summary="Register a reference track in the catalog",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=ReferenceResponse,
+    status_code=201,
+)
+async def create_reference(
+    title: str = Form(...),
+    file: UploadFile = File(..., media_type="audio/mpeg"),
+    db: Session = Depends(get_db),
+):
+    """
+    Analyse a reference MP3 once and store it for later comparisons.
+
+    Args:
+        title: Title of the exercise.
+        file: Reference audio file (must be MP3).
+        db: SQLAlchemy database session.
+
+    Returns:
+        ReferenceResponse: The catalog entry; its id is passed as
+        ``reference_id`` to the comparison endpoints.
+
+    Raises:
+        HTTPException: If validation or analysis fails, the file is too large,
+            or the analysis queue is full.
+    """
+    logger.info("Registering reference: %s (%s)", title, file.filename)
+    if file.content_type not in MP3_CONTENT_TYPES:
+        logger.warning("Invalid reference type: %s", file.content_type)
+        raise HTTPException(status_code=400, detail="Reference must be an MP3 file")
+    content = await read_upload(file, "File")
+
+    try:
+        reference = await register_reference(db, title, content)
+    except ExecutorBusyError:
+        raise busy_exception()
+    except ReferenceAnalysisError as e:
+        logger.error("Reference analysis failed: %s", str(e))
+        raise HTTPException(status_code=422, detail="Failed to analyse the reference")
+    return to_response(reference)
+
+
+@reference_router.get(
+    "",
+    summary="List reference tracks",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=List[ReferenceResponse],
+)
+async def read_references(db: Session = Depends(get_db)):
+    """Return all catalog entries, newest first."""
+    return [to_response(reference) for reference in list_references(db)]
+
+
+@reference_router.get(
+    "/{reference_id}",
+    summary="Get a reference track",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=ReferenceResponse,
+)
+async def read_reference(reference_id: int, db: Session = Depends(get_db)):
+    """
+    Return a catalog entry.
+
+    Raises:
+        HTTPException: If the reference does not exist.
+    """
+    reference = get_reference(db, reference_id)
+    if reference is None:
+        raise HTTPException(status_code=404, detail="Reference not found")
+    return to_response(reference)
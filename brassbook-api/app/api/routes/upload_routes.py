@@ -0,0 +1,109 @@
+import logging
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.core.auth import get_current_user, security
+from app.core.avatar_thumbnails import AvatarThumbnailer, get_avatar_thumbnailer
+from app.core.direct_uploads import confirm_upload, start_upload
+from app.data.database import get_db
+from app.data.models import User
+from app.data.storage import ObjectStorage, get_object_storage
+
+logger = logging.getLogger(__name__)
+
+upload_router = APIRouter(prefix="/api/v1/uploads", tags=["uploads"])
+
+
+class UploadRequest(BaseModel):
+    kind: str
+    content_type: str
+
+
+class PresignedUpload(BaseModel):
+    url: str
+    fields: Dict[str, str]
+    object_name: str
+    expires_at: int
+
+
+class UploadConfirmation(BaseModel):
+    object_name: str
+
+
+class ConfirmedUpload(BaseModel):
+    kind: str
+    object_name: str
+    recording_id: Optional[int] = None
+
+
+@upload_router.post(
+    "",
+    summary="Issue a presigned form for uploading straight to object storage",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=PresignedUpload,
+)
+async def create_upload(
+    request: UploadRequest,
+    user: User = Depends(get_current_user),
+    storage: ObjectStorage = Depends(get_object_storage),
+):
+    """
+    Start a direct upload of an avatar or a recording.
+
+    The client POSTs a multipart form to ``url`` with ``fields`` followed by
+    the file, then calls /api/v1/uploads/confirm with ``object_name``.
+    MinIO enforces the content type and the size limit.
+
+    Args:
+        request: Upload kind ("avatar" or "recording") and content type.
+        user: Current authenticated user.
+        storage: Object storage receiving the file.
+
+    Returns:
+        PresignedUpload: Form target, signed fields and object name.
+
+    Raises:
+        HTTPException: If the kind or the content type is not allowed.
+    """
+    return await start_upload(storage, user, request.kind, request.content_type)
+
+
+@upload_router.post(
+    "/confirm",
+    summary="Record a finished direct upload",
+    dependencies=[Depends(security.get_token_from_request)],
+    response_model=ConfirmedUpload,
+)
+async def confirm_direct_upload(
+    request: UploadConfirmation,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    storage: ObjectStorage = Depends(get_object_storage),
+    thumbnailer: AvatarThumbnailer = Depends(get_avatar_thumbnailer),
+):
+    """
+    Confirm a direct upload once the client has sent the file.
+
+    Thumbnails of a confirmed avatar are generated in the background.
+
+    Args:
+        request: Object name returned by /api/v1/uploads.
+        user: Current authenticated user.
+        db: SQLAlchemy database session.
+        storage: Object storage holding the file.
+        thumbnailer: Background worker creating avatar thumbnails.
+
+    Returns:
+        ConfirmedUpload: Upload kind and, for recordings, the new id.
+
+    Raises:
+        HTTPException: If the upload is missing, belongs to another user or
+            does not match the allowed types and size.
+    """
+    confirmed = await confirm_upload(db, storage, user, request.object_name)
+    if confirmed["kind"] == "avatar":
+        thumbnailer.schedule(user.id, user.photo_url)
+    return confirmed
@@ -1,15 +1,17 @@
-import io
-import os
 from uuid import uuid4
-from fastapi import File, HTTPException, UploadFile, APIRouter, Depends
-from minio import Minio, S3Error
+from typing import Literal, Optional
+from fastapi import File, HTTPException, Query, UploadFile, APIRouter, Depends
+from app.api.uploads import check_upload_size
 from app.core.auth import get_current_user, pwd_context, security
 from pydantic import BaseModel
 from sqlalchemy import String
 from sqlalchemy.orm import Session
 from app.core.auth import get_current_user
+from app.core.avatar_thumbnails import (AvatarThumbnailer, avatar_object_name,
+                                        get_avatar_thumbnailer)
 from app.data.database import get_db
 from app.data.models import User
+from app.data.storage import ObjectStorage, get_object_storage
 from authx import RequestToken
 
 
@@ -49,10 +51,18 @@ class AvatarUrl(BaseModel):
     url: str
 @avatar_user_router.get("/", dependencies=[Depends(security.get_token_from_request)], response_model=AvatarUrl)
 async def get_user_avatar(
+    size: Optional[int] = Query(None, ge=1, description="Нужный размер в пикселях"),
+    format: Literal["webp", "jpeg"] = Query("webp"),
     user: User = Depends(get_current_user),
+    storage: ObjectStorage = Depends(get_object_storage),
     # token: RequestToken = Depends()
 ) -> AvatarUrl:
-    return AvatarUrl(url = "" if user.photo_url is None else user.photo_url)
+    # В базе хранится ключ объекта; ссылка подписывается заново только при истечении.
+    # С size отдается наименьшая готовая миниатюра не меньше size, иначе оригинал
+    object_name = avatar_object_name(user, storage.bucket, size, format)
+    if object_name is None:
+        return AvatarUrl(url="")
+    return AvatarUrl(url=await storage.get_url(object_name))
 
 @avatar_user_router.put("/", dependencies=[Depends(security.get_token_from_request)])
 async def upload_user_avatar(
@@ -60,44 +70,21 @@ async def upload_user_avatar(
     # token: RequestToken = Depends(),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    storage: ObjectStorage = Depends(get_object_storage),
+    thumbnailer: AvatarThumbnailer = Depends(get_avatar_thumbnailer),
 ):
-    minio_endpoint = os.getenv("MINIO_ENDPOINT", "minio:9000")
-    minio_access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
-    minio_secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin")
-    bucket_name = os.getenv("MINIO_BUCKET_NAME", "your-bucket")
-    # Настройка MinIO клиента
-    minio_client = Minio(
-        minio_endpoint,
-        access_key=minio_access_key,
-        secret_key=minio_secret_key,
-        secure=False,
-    )
-
-    if not minio_client.bucket_exists(bucket_name):
-        minio_client.make_bucket(bucket_name)
-
     # Генерация уникального имени файла
     extension = file.filename.split('.')[-1]
     filename = f"{uuid4()}.{extension}"
     
-    # Загрузка файла в MinIO
-    try:
-        content = await file.read()
-        file_stream = io.BytesIO(content)
-        file_size = len(content)
-        minio_client.put_object(
-            bucket_name,
-            filename,
-            data=file_stream,
-            length=file_size,
-            content_type=file.content_type,
-        )
-    except S3Error as e:
-        raise HTTPException(status_code=500, detail=f"MinIO error: {str(e)}")
+    # Загрузка файла в MinIO прямо из временного файла, без копии в памяти
+    check_upload_size(file, "Avatar")
+    await storage.put_file(filename, file.file, file.size, file.content_type)
 
     # Сборка URL и сохранение в базу
-    avatar_url = f"/{bucket_name}/{filename}"
+    avatar_url = f"/{storage.bucket}/{filename}"
     user.photo_url = avatar_url
+    user.photo_sizes = None
 
     try:
         db.commit()
@@ -105,6 +92,8 @@ async def upload_user_avatar(
         db.rollback()
         raise HTTPException(status_code=500, detail="Database commit failed")
 
+    # Миниатюры создаются в фоне; до их готовности отдается оригинал
+    thumbnailer.schedule(user.id, avatar_url)
     return {"avatar_url": avatar_url}
     
     
@@ -117,6 +106,7 @@ async def delete_user_avatar(
     db: Session = Depends(get_db),
 ):
     user.photo_url = None
+    user.photo_sizes = None
     try:
         db.commit()
     except:
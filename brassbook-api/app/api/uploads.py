@@ -0,0 +1,159 @@
+import json
+import logging
+from typing import Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import MAX_BATCH_FILES, MAX_FILE_SIZE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Room for multipart boundaries, part headers and small form fields
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Request body limits of the upload endpoints, by route path
+UPLOAD_BODY_LIMITS: Dict[str, int] = {
+    "/api/v1/compare_melodies": 2 * MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/api/v1/compare_melodies/jobs": 2 * MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/api/v1/compare_melodies/batch": (MAX_BATCH_FILES + 1) * MAX_FILE_SIZE
+    + MULTIPART_OVERHEAD,
+    "/api/v1/references": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/api/v1/auth/avatar": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+    "/v2/users/avatar": MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+}
+
+
+def size_limit_detail(limit: int) -> str:
+    """Human readable 413 message for a limit in bytes."""
+    return f"Request body exceeds {limit // 1024 // 1024}MB limit"
+
+
+class UploadLimitMiddleware:
+    """
+    Reject oversized upload requests before and while their body is read.
+
+    A declared Content-Length above the route's limit is answered with 413
+    without reading the body. Otherwise the body is counted as it streams
+    into the multipart parser, which spools file parts to temporary files
+    chunk by chunk, and parsing stops with 413 as soon as the limit is
+    crossed, so at most one chunk over the limit is ever received.
+    """
+
+    def __init__(self, app: ASGIApp, limits: Dict[str, int] = UPLOAD_BODY_LIMITS):
+        self.app = app
+        self.limits = {path.rstrip("/"): limit for path, limit in limits.items()}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = self._limit(scope) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = _content_length(scope)
+        if declared is not None and declared > limit:
+            logger.warning(
+                "Rejected %s: Content-Length %d over limit %d",
+                scope["path"],
+                declared,
+                limit,
+            )
+            await _send_too_large(send, limit)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    logger.warning(
+                        "Rejected %s: body over limit %d", scope["path"], limit
+                    )
+                    raise HTTPException(
+                        status_code=413, detail=size_limit_detail(limit)
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _limit(self, scope: Scope) -> Optional[int]:
+        """Limit of the requested route, if it is an upload endpoint."""
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        return self.limits.get(path.rstrip("/"))
+
+
+def _content_length(scope: Scope) -> Optional[int]:
+    """Declared body size, or None if absent or malformed."""
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def _send_too_large(send: Send, limit: int) -> None:
+    body = json.dumps({"detail": size_limit_detail(limit)}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+def check_upload_size(file: UploadFile, label: str, limit: int = MAX_FILE_SIZE) -> None:
+    """
+    Enforce a per-file limit without reading the file.
+
+    The multipart parser has already spooled the file and recorded its size.
+
+    Args:
+        file: Uploaded file.
+        label: Name used in error messages.
+        limit: Maximum size in bytes.
+
+    Raises:
+        HTTPException: If the file exceeds the limit.
+    """
+    if file.size is not None and file.size > limit:
+        logger.warning("%s too large: %s (%d bytes)", label, file.filename, file.size)
+        raise HTTPException(
+            status_code=413,
+            detail=f"{label} exceeds {limit // 1024 // 1024}MB limit",
+        )
+
+
+async def read_upload(
+    file: UploadFile, label: str, limit: int = MAX_FILE_SIZE
+) -> bytes:
+    """
+    Read an uploaded file into memory after checking its size.
+
+    Args:
+        file: Uploaded file.
+        label: Name used in error messages.
+        limit: Maximum size in bytes.
+
+    Returns:
+        bytes: File contents.
+
+    Raises:
+        HTTPException: If the file exceeds the limit.
+    """
+    check_upload_size(file, label, limit)
+    return await file.read()
@@ -8,11 +8,59 @@ load_dotenv()
 
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+# Кэш извлеченных мелодий эталонов (количество записей)
+MELODY_CACHE_SIZE = int(os.getenv("MELODY_CACHE_SIZE", "64"))
+
+# Выполнение сравнения мелодий: "process" (пул процессов) или "thread"
+COMPARE_EXECUTOR = os.getenv("COMPARE_EXECUTOR", "process")
+COMPARE_WORKERS = int(os.getenv("COMPARE_WORKERS", str(os.cpu_count() or 1)))
+COMPARE_MAX_TASKS_PER_CHILD = int(os.getenv("COMPARE_MAX_TASKS_PER_CHILD", "200"))
+COMPARE_QUEUE_SIZE = int(os.getenv("COMPARE_QUEUE_SIZE", "16"))
+COMPARE_TASK_TIMEOUT = float(os.getenv("COMPARE_TASK_TIMEOUT", "120"))
+COMPARE_RETRY_AFTER = int(os.getenv("COMPARE_RETRY_AFTER", "5"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "40"))
+COMPARE_JOB_TTL = int(os.getenv("COMPARE_JOB_TTL", "600"))
+# Кэш готовых результатов сравнения: количество записей и время жизни (секунды)
+COMPARE_RESULT_CACHE_SIZE = int(os.getenv("COMPARE_RESULT_CACHE_SIZE", "512"))
+COMPARE_RESULT_CACHE_TTL = int(os.getenv("COMPARE_RESULT_CACHE_TTL", "3600"))
+# Прогрев анализа (импорты, фильтры, JIT numba) при старте приложения и воркеров
+ANALYSIS_WARMUP = os.getenv("ANALYSIS_WARMUP", "true").lower() == "true"
+# Записи длиннее порога (секунды) анализируются блоками с ограниченной памятью
+ANALYSIS_IN_MEMORY_SECONDS = float(os.getenv("ANALYSIS_IN_MEMORY_SECONDS", "120"))
+ANALYSIS_BLOCK_SECONDS = float(os.getenv("ANALYSIS_BLOCK_SECONDS", "10"))
+# Одновременные потоковые сравнения через WebSocket
+COMPARE_MAX_STREAMS = int(os.getenv("COMPARE_MAX_STREAMS", "16"))
+
 # MinIO
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "your-bucket")
+# Регион задан явно, чтобы подпись ссылок не запрашивала его у сервера
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+# Размер пула соединений; столько же операций с хранилищем выполняется одновременно
+MINIO_POOL_SIZE = int(os.getenv("MINIO_POOL_SIZE", "32"))
+MINIO_CONNECT_TIMEOUT = float(os.getenv("MINIO_CONNECT_TIMEOUT", "5"))
+MINIO_READ_TIMEOUT = float(os.getenv("MINIO_READ_TIMEOUT", "60"))
+# Адрес MinIO, доступный браузеру, для прямой загрузки файлов. Обязателен:
+# внутренний MINIO_ENDPOINT из браузера недоступен, без адреса приложение не стартует
+MINIO_PUBLIC_URL = os.getenv("MINIO_PUBLIC_URL", "")
+# Время жизни подписанной формы прямой загрузки (секунды)
+UPLOAD_URL_EXPIRES = int(os.getenv("UPLOAD_URL_EXPIRES", "900"))
+# Время жизни ссылок на скачивание (секунды); подписанная ссылка выдаётся повторно,
+# пока до её истечения остаётся больше PRESIGNED_URL_MARGIN секунд
+PRESIGNED_URL_EXPIRES = int(os.getenv("PRESIGNED_URL_EXPIRES", "3600"))
+PRESIGNED_URL_MARGIN = int(os.getenv("PRESIGNED_URL_MARGIN", "300"))
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", "10000"))
+# Размеры миниатюр аватара по длинной стороне (пиксели), каждая в WebP и JPEG
+AVATAR_THUMBNAIL_SIZES = tuple(
+    int(size)
+    for size in os.getenv("AVATAR_THUMBNAIL_SIZES", "64,128,256,512").split(",")
+)
+# Сколько аватаров одновременно обрабатывается в фоне
+AVATAR_THUMBNAIL_WORKERS = int(os.getenv("AVATAR_THUMBNAIL_WORKERS", "2"))
+# Наибольшее число пикселей исходного аватара; изображения больше не декодируются
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", "25000000"))
 
 # База данных
 DATABASE_URL = os.getenv(
@@ -24,3 +72,7 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "SECRET_KEY")
 JWT_ACCESS_COOKIE_NAME = os.getenv("JWT_ACCESS_COOKIE_NAME", "access_token")
 JWT_REFRESH_COOKIE_NAME = os.getenv("JWT_REFRESH_COOKIE_NAME", "refresh_token")
 
+# Метрики Prometheus: /metrics отвечает только с заголовком
+# "Authorization: Bearer <METRICS_TOKEN>"; без токена маршрут выключен
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
@@ -0,0 +1,768 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import (
+    CancelledError,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from app.config import (
+    ANALYSIS_WARMUP,
+    COMPARE_EXECUTOR,
+    COMPARE_MAX_TASKS_PER_CHILD,
+    COMPARE_QUEUE_SIZE,
+    COMPARE_RESULT_CACHE_SIZE,
+    COMPARE_RESULT_CACHE_TTL,
+    COMPARE_TASK_TIMEOUT,
+    COMPARE_WORKERS,
+)
+from app.core.analysis_metrics import observe, run_measured
+from app.core.comparison_cache import ComparisonResultCache, comparison_key
+from app.core.compare_melodies import (
+    AudioConfig,
+    compare_signal_with_reference,
+    compare_with_reference,
+    extract_melody_from_audio,
+    extract_melody_from_signal,
+    melody_cache,
+    melody_cache_key,
+)
+from app.core.note_alignment import align_notes
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ComparisonResult = Tuple[float, List[int], List[int], List[int], List[float]]
+
+# A recording's contents, or a coroutine function reading them when needed
+RecordingSource = Union[bytes, Callable[[], Awaitable[bytes]]]
+
+# ProcessPoolExecutor recycles workers itself only since Python 3.11
+NATIVE_WORKER_RECYCLING = sys.version_info >= (3, 11)
+
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the analysis submission queue is full."""
+
+
+def warm_up_analysis() -> None:
+    """
+    Run a tiny synthetic comparison in the current process.
+
+    The first analysis in a process loads the librosa submodules, builds the
+    filter banks and compiles (or loads from the numba disk cache) the JIT
+    kernels, which takes seconds. Doing it up front keeps that stall out of
+    the first real request. Failures are logged and otherwise ignored.
+    """
+    start = time.perf_counter()
+    try:
+        sample_rate = AudioConfig.SAMPLE_RATE
+        t = np.arange(sample_rate // 2) / sample_rate
+        signal = np.concatenate(
+            [0.3 * np.sin(2 * np.pi * f * t) for f in (262, 330, 262)]
+        ).astype(np.float32)
+        melody, min_per = extract_melody_from_signal(signal, sample_rate)
+        compare_signal_with_reference(melody, min_per, signal, sample_rate)
+        if AudioConfig.ALIGNMENT == "dtw":
+            notes = np.array([0, 1])
+            align_notes(notes, notes + 5, notes, notes + 5, 1, 1.0)
+    except Exception as e:
+        logger.warning("Analysis warm-up failed: %s", e)
+        return
+    logger.info(
+        "Analysis warm-up finished in %.2fs (pid %d)",
+        time.perf_counter() - start,
+        os.getpid(),
+    )
+
+
+class AnalysisExecutor:
+    """
+    Runs CPU-bound melody analysis outside the event loop.
+
+    The "process" backend uses a fixed pool of worker processes that are
+    recycled after a number of tasks to contain librosa/numba memory growth.
+    Before Python 3.11 the whole pool is replaced once it has taken
+    ``workers * max_tasks_per_child`` tasks; the old pool finishes its queued
+    tasks and exits, and tasks submitted meanwhile wait in this process until
+    its workers are gone, so at most ``workers`` processes ever run at once.
+    If a worker dies (OOM kill, segfault) its tasks fail with
+    BrokenProcessPool, their slots are released and the pool is rebuilt.
+    The "thread" backend uses a dedicated thread pool instead of the default
+    asyncio executor. In both cases at most ``workers + queue_size`` tasks are
+    accepted at once; further submissions fail fast with ExecutorBusyError.
+    With ``warm_up`` every worker process runs warm_up_analysis() before it
+    takes its first task, including workers replacing recycled ones.
+    With a ``result_cache`` repeated comparisons of the same recording with
+    the same reference are answered from it, and identical comparisons in
+    flight at the same time are computed once.
+    A task whose caller gives up (timeout or cancellation) keeps a slot until
+    it actually finishes, so abandoned work cannot pile up behind the pool.
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        workers: int,
+        max_tasks_per_child: int,
+        queue_size: int,
+        task_timeout: float,
+        warm_up: bool = False,
+        result_cache: Optional[ComparisonResultCache] = None,
+    ):
+        if backend not in ("process", "thread"):
+            raise ValueError(f"Unknown analysis executor backend: {backend}")
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self.capacity = self.workers + max(0, queue_size)
+        self.task_timeout = task_timeout
+        self.warm_up_workers = warm_up
+        self.result_cache = result_cache
+        self.pending = 0
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_tasks = 0
+        # Thread waiting for a recycled pool to exit, and tasks held until then
+        self._retiring: Optional[threading.Thread] = None
+        self._deferred: List[Tuple[Future, Callable[..., Any], Tuple[Any, ...]]] = []
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        # Pools are created from the event loop, from warm_up()'s thread and
+        # replaced from the process pool's management and recycling threads
+        self._pool_lock = threading.RLock()
+
+    @contextmanager
+    def reserve(self, count: int = 1) -> Iterator[None]:
+        """
+        Reserve submission slots for the duration of the block.
+
+        Args:
+            count: Number of slots to reserve.
+
+        Raises:
+            ExecutorBusyError: If the queue cannot accept that many tasks.
+        """
+        self._acquire(count)
+        try:
+            yield
+        finally:
+            self.pending -= count
+
+    def _acquire(self, count: int) -> None:
+        """Take ``count`` submission slots or raise ExecutorBusyError."""
+        if self.pending + count > self.capacity:
+            logger.warning(
+                "Analysis queue full: %d pending, capacity %d",
+                self.pending,
+                self.capacity,
+            )
+            raise ExecutorBusyError("Analysis queue is full")
+        self.pending += count
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a picklable function on the configured backend.
+
+        Args:
+            fn: Module-level function to execute.
+            *args: Positional arguments for the function.
+
+        Returns:
+            Any: Value returned by the function.
+
+        Raises:
+            asyncio.TimeoutError: If the task does not finish within the timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        state = {"finished": False, "abandoned": False}
+
+        def finish(setter: Callable[[asyncio.Future, Any], None], value: Any) -> None:
+            # Runs on the event loop once the task has really ended
+            state["finished"] = True
+            if state["abandoned"]:
+                self.pending -= 1
+            setter(future, value)
+
+        if self.backend == "thread":
+            job = self._get_thread_pool().submit(fn, *args)
+        else:
+            job = self._submit_to_process_pool(fn, *args)
+        job.add_done_callback(
+            lambda done: loop.call_soon_threadsafe(finish, *_outcome(done))
+        )
+        try:
+            return await asyncio.wait_for(future, self.task_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if not state["finished"]:
+                # The caller's slot is released, but the task still occupies
+                # (or waits for) a worker: hold a slot until it ends
+                logger.warning("Analysis task abandoned; holding its slot")
+                state["abandoned"] = True
+                self.pending += 1
+                job.cancel()  # Drops it if it has not started yet
+            raise
+
+    async def run_measured(
+        self, fn: Callable[..., Any], file_format: str, *args: Any
+    ) -> Any:
+        """
+        Run an analysis function and export its stage metrics.
+
+        Timings are collected where the function runs (possibly a worker
+        process) and observed here, so all metrics live in this process.
+
+        Args:
+            fn: Module-level analysis function.
+            file_format: Input format the metrics are labelled with.
+            *args: Positional arguments for the function.
+
+        Returns:
+            Any: Value returned by the function.
+        """
+        result, stats = await self.run(run_measured, fn, file_format, *args)
+        observe(stats)
+        return result
+
+    async def extract_reference(
+        self, file_bytes: bytes, file_format: str = "mp3", reserve: bool = False
+    ) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        """
+        Extract a reference melody, using the cache of this (parent) process.
+
+        Keeping the cache here instead of in the workers means it survives
+        worker recycling and is shared by all worker processes.
+
+        Args:
+            file_bytes: Reference audio file contents.
+            file_format: Reference container format.
+            reserve: Take a submission slot while the melody is extracted;
+                cache hits never take one.
+
+        Returns:
+            Tuple[Optional[np.ndarray], Optional[float]]: Melody and minimal note
+            length, or (None, None) if extraction failed.
+
+        Raises:
+            ExecutorBusyError: If ``reserve`` is set and the queue is full.
+        """
+        key = await asyncio.to_thread(melody_cache_key, file_bytes, file_format)
+        cached = melody_cache.get(key)
+        if cached is not None:
+            logger.debug("Reference melody served from cache")
+            return cached
+
+        with self.reserve() if reserve else nullcontext():
+            melody, min_per = await self.run_measured(
+                extract_melody_from_audio, file_format, file_bytes, file_format
+            )
+        if melody is not None:
+            melody_cache.put(key, melody, min_per)
+        return melody, min_per
+
+    async def compare(
+        self,
+        file1: bytes,
+        file2: bytes,
+        file1_format: str = "mp3",
+        file2_format: str = "webm",
+    ) -> Optional[ComparisonResult]:
+        """
+        Compare a student recording with a reference on the executor.
+
+        Args:
+            file1: Reference audio file contents.
+            file2: Student recording contents.
+            file1_format: Reference container format.
+            file2_format: Recording container format.
+
+        Returns:
+            Optional[ComparisonResult]: Comparison result or None on failure.
+
+        Raises:
+            ExecutorBusyError: If the submission queue is full.
+        """
+        teacher_melody, min_per_t = await self.extract_reference(
+            file1, file1_format, reserve=True
+        )
+        if teacher_melody is None:
+            logger.error("Failed to extract reference melody")
+            return None
+        # Slots are taken only for the analysis itself, as in compare_with_melody
+        return await self.compare_with_melody(
+            teacher_melody, min_per_t, file2, file2_format
+        )
+
+    async def compare_with_melody(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file2: bytes,
+        file2_format: str = "webm",
+    ) -> Optional[ComparisonResult]:
+        """
+        Compare a student recording with an already analysed reference.
+
+        Args:
+            teacher_melody: Reference melody, e.g. from the reference catalog.
+            min_per_t: Minimal note length of the reference.
+            file2: Student recording contents.
+            file2_format: Recording container format.
+
+        Returns:
+            Optional[ComparisonResult]: Comparison result or None on failure.
+
+        Raises:
+            ExecutorBusyError: If the submission queue is full.
+        """
+
+        async def compute() -> Optional[ComparisonResult]:
+            with self.reserve():
+                return await self._run_comparison(
+                    teacher_melody, min_per_t, file2, file2_format
+                )
+
+        # Cache hits and callers joining an identical comparison take no slot
+        return await self._cached(
+            teacher_melody, min_per_t, file2, file2_format, compute
+        )
+
+    def start_compare(
+        self,
+        file1: bytes,
+        file2: bytes,
+        file1_format: str = "mp3",
+        file2_format: str = "webm",
+    ) -> "asyncio.Task[Optional[ComparisonResult]]":
+        """
+        Reserve a slot now and run the comparison in a background task.
+
+        Args:
+            file1: Reference audio file contents.
+            file2: Student recording contents.
+            file1_format: Reference container format.
+            file2_format: Recording container format.
+
+        Returns:
+            asyncio.Task: Task resolving to the comparison result or None.
+
+        Raises:
+            ExecutorBusyError: If the submission queue is full.
+        """
+        return self._start_reserved(
+            lambda: self._compare(file1, file2, file1_format, file2_format)
+        )
+
+    def start_compare_with_melody(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file2: bytes,
+        file2_format: str = "webm",
+    ) -> "asyncio.Task[Optional[ComparisonResult]]":
+        """
+        Reserve a slot now and compare with an analysed reference in the background.
+
+        Args:
+            teacher_melody: Reference melody, e.g. from the reference catalog.
+            min_per_t: Minimal note length of the reference.
+            file2: Student recording contents.
+            file2_format: Recording container format.
+
+        Returns:
+            asyncio.Task: Task resolving to the comparison result or None.
+
+        Raises:
+            ExecutorBusyError: If the submission queue is full.
+        """
+        return self._start_reserved(
+            lambda: self._compare_recording(
+                teacher_melody, min_per_t, file2, file2_format
+            )
+        )
+
+    def _start_reserved(
+        self, compute: Callable[[], Awaitable[Optional[ComparisonResult]]]
+    ) -> "asyncio.Task[Optional[ComparisonResult]]":
+        """Take a slot and run ``compute`` in a task that releases it when done."""
+        self._acquire(1)
+
+        async def run_reserved() -> Optional[ComparisonResult]:
+            try:
+                return await compute()
+            finally:
+                self.pending -= 1
+
+        return asyncio.create_task(run_reserved())
+
+    async def _compare(
+        self, file1: bytes, file2: bytes, file1_format: str, file2_format: str
+    ) -> Optional[ComparisonResult]:
+        """Compare two files without reserving a submission slot."""
+        teacher_melody, min_per_t = await self.extract_reference(file1, file1_format)
+        if teacher_melody is None:
+            logger.error("Failed to extract reference melody")
+            return None
+        return await self._compare_recording(
+            teacher_melody, min_per_t, file2, file2_format
+        )
+
+    async def _compare_recording(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file2: bytes,
+        file2_format: str,
+    ) -> Optional[ComparisonResult]:
+        """Compare a recording with a reference melody without reserving a slot."""
+
+        def compute() -> Awaitable[Optional[ComparisonResult]]:
+            return self._run_comparison(teacher_melody, min_per_t, file2, file2_format)
+
+        return await self._cached(
+            teacher_melody, min_per_t, file2, file2_format, compute
+        )
+
+    async def _cached(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file2: bytes,
+        file2_format: str,
+        compute: Callable[[], Awaitable[Optional[ComparisonResult]]],
+    ) -> Optional[ComparisonResult]:
+        """Serve a comparison from the result cache or compute it once."""
+        if self.result_cache is None:
+            return await compute()
+        key = await asyncio.to_thread(
+            comparison_key, teacher_melody, min_per_t, file2, file2_format
+        )
+        return await self.result_cache.run(key, compute)
+
+    async def _run_comparison(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file2: bytes,
+        file2_format: str,
+    ) -> Optional[ComparisonResult]:
+        """Run the comparison on the backend."""
+        return await self.run_measured(
+            compare_with_reference,
+            file2_format,
+            teacher_melody,
+            min_per_t,
+            file2,
+            file2_format,
+        )
+
+    async def compare_batch(
+        self,
+        file1: bytes,
+        recordings: Sequence[RecordingSource],
+        file1_format: str = "mp3",
+        file2_format: str = "webm",
+    ) -> List[Optional[ComparisonResult]]:
+        """
+        Compare many student recordings with one reference.
+
+        The reference is analysed once; the recordings are fanned out over at
+        most ``workers`` slots, so one batch cannot monopolise the queue.
+        Recordings given as loaders are read only when a slot is free for
+        them, so at most ``workers`` of them are held in memory at once.
+
+        Args:
+            file1: Reference audio file contents.
+            recordings: Student recording contents or loaders.
+            file1_format: Reference container format.
+            file2_format: Recordings container format.
+
+        Returns:
+            List[Optional[ComparisonResult]]: One result per recording, None for
+            recordings that could not be read, failed or timed out.
+
+        Raises:
+            ExecutorBusyError: If the submission queue is full.
+        """
+        if not recordings:
+            return []
+        with self.reserve(self._batch_slots(recordings)):
+            teacher_melody, min_per_t = await self.extract_reference(
+                file1, file1_format
+            )
+            if teacher_melody is None:
+                logger.error("Failed to extract reference melody")
+                return [None] * len(recordings)
+            return await self._compare_many(
+                teacher_melody, min_per_t, recordings, file2_format
+            )
+
+    async def compare_batch_with_melody(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        recordings: Sequence[RecordingSource],
+        file2_format: str = "webm",
+    ) -> List[Optional[ComparisonResult]]:
+        """
+        Compare many student recordings with an already analysed reference.
+
+        Args:
+            teacher_melody: Reference melody, e.g. from the reference catalog.
+            min_per_t: Minimal note length of the reference.
+            recordings: Student recording contents or loaders, read as in
+                compare_batch().
+            file2_format: Recordings container format.
+
+        Returns:
+            List[Optional[ComparisonResult]]: One result per recording, None for
+            recordings that could not be read, failed or timed out.
+
+        Raises:
+            ExecutorBusyError: If the submission queue is full.
+        """
+        if not recordings:
+            return []
+        with self.reserve(self._batch_slots(recordings)):
+            return await self._compare_many(
+                teacher_melody, min_per_t, recordings, file2_format
+            )
+
+    def _batch_slots(self, recordings: Sequence[RecordingSource]) -> int:
+        """Number of slots a batch occupies: at most one per worker."""
+        return min(len(recordings), self.workers)
+
+    async def _compare_many(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        recordings: Sequence[RecordingSource],
+        file2_format: str,
+    ) -> List[Optional[ComparisonResult]]:
+        """Fan recordings out over the reserved batch slots."""
+        semaphore = asyncio.Semaphore(self._batch_slots(recordings))
+
+        async def compare_one(index: int, source: RecordingSource):
+            async with semaphore:
+                if isinstance(source, bytes):
+                    recording = source
+                else:
+                    try:
+                        recording = await source()
+                    except Exception as e:
+                        logger.error("Failed to read recording %d: %s", index, e)
+                        return None
+                try:
+                    return await self._compare_recording(
+                        teacher_melody, min_per_t, recording, file2_format
+                    )
+                except asyncio.TimeoutError:
+                    logger.error("Comparison of recording %d timed out", index)
+                    return None
+                except Exception as e:
+                    # One failed recording must not discard the whole batch
+                    logger.error("Comparison of recording %d failed: %s", index, e)
+                    return None
+
+        return list(
+            await asyncio.gather(
+                *(compare_one(i, rec) for i, rec in enumerate(recordings))
+            )
+        )
+
+    async def warm_up(self) -> None:
+        """
+        Warm the analysis stack up; meant to run as a background startup task.
+
+        The process backend starts its pool right away so the workers warm
+        themselves up. This process is warmed up too: streaming comparisons
+        track notes here. The thread backend warms up on its own pool.
+        """
+        if self.backend == "process":
+            await asyncio.to_thread(self._get_process_pool)
+            await asyncio.to_thread(warm_up_analysis)
+        else:
+            await asyncio.get_running_loop().run_in_executor(
+                self._get_thread_pool(), warm_up_analysis
+            )
+
+    def shutdown(self) -> None:
+        """Stop worker processes and threads, waiting for running tasks."""
+        retiring = self._retiring
+        while retiring is not None:
+            # Tasks held back for the recycled pool are submitted once it exits
+            retiring.join()
+            retiring = self._retiring
+        with self._pool_lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            logger.info("Shutting down analysis process pool")
+            pool.shutdown(wait=True)
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=True)
+            self._thread_pool = None
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Create the worker process pool on first use."""
+        with self._pool_lock:
+            if self._process_pool is None:
+                logger.info(
+                    "Starting analysis process pool: %d workers, %s tasks per child",
+                    self.workers,
+                    self.max_tasks_per_child,
+                )
+                options = {}
+                if NATIVE_WORKER_RECYCLING:
+                    options["max_tasks_per_child"] = self.max_tasks_per_child
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=warm_up_analysis if self.warm_up_workers else None,
+                    **options,
+                )
+                self._pool_tasks = 0
+            return self._process_pool
+
+    def _submit_to_process_pool(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Submit a task to the process pool, recycling the pool when due."""
+        with self._pool_lock:
+            if self._retiring is not None:
+                # The recycled pool is still draining; a new one would run
+                # beside it, so the task waits until the old workers exit
+                job: Future = Future()
+                self._deferred.append((job, fn, args))
+                return job
+            pool = self._get_process_pool()
+            try:
+                job = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died and _check_pool() has not run yet
+                self._process_pool = None
+                pool = self._get_process_pool()
+                job = pool.submit(fn, *args)
+            self._pool_tasks += 1
+            if (
+                not NATIVE_WORKER_RECYCLING
+                and self.max_tasks_per_child
+                and self._pool_tasks >= self.workers * self.max_tasks_per_child
+            ):
+                # The old pool runs its queued tasks, then its workers exit
+                logger.info("Recycling analysis process pool")
+                self._process_pool = None
+                self._retiring = threading.Thread(
+                    target=self._retire,
+                    args=(pool,),
+                    name="analysis-pool-recycle",
+                    daemon=True,
+                )
+                self._retiring.start()
+        job.add_done_callback(lambda done: self._check_pool(pool, done))
+        return job
+
+    def _retire(self, pool: ProcessPoolExecutor) -> None:
+        """Wait for a recycled pool to exit, then submit the tasks held meanwhile."""
+        try:
+            pool.shutdown(wait=True)
+        finally:
+            self._resubmit_deferred()
+
+    def _resubmit_deferred(self) -> None:
+        """Submit the tasks held while a recycled pool was draining."""
+        with self._pool_lock:
+            self._retiring = None
+            deferred, self._deferred = self._deferred, []
+            for placeholder, fn, args in deferred:
+                # Callers that gave up while waiting have cancelled theirs
+                if not placeholder.set_running_or_notify_cancel():
+                    continue
+                try:
+                    job = self._submit_to_process_pool(fn, *args)
+                except Exception as e:
+                    placeholder.set_exception(e)
+                    continue
+                job.add_done_callback(
+                    lambda done, placeholder=placeholder: _transfer(done, placeholder)
+                )
+
+    def _check_pool(self, pool: ProcessPoolExecutor, job: Future) -> None:
+        """Replace the pool once a dead worker has broken it."""
+        if job.cancelled() or not isinstance(job.exception(), BrokenProcessPool):
+            return
+        # A broken pool has already terminated its workers; the next task
+        # starts a new one
+        with self._pool_lock:
+            if self._process_pool is pool:
+                logger.error("Analysis worker died; restarting the process pool")
+                self._process_pool = None
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        """Create the analysis thread pool on first use."""
+        with self._pool_lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="melody-analysis"
+                )
+            return self._thread_pool
+
+
+def _set_result(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error: BaseException) -> None:
+    if not future.done():
+        future.set_exception(error)
+
+
+def _transfer(job: Future, placeholder: Future) -> None:
+    """Pass the outcome of a submitted job on to the future handed out for it."""
+    if job.cancelled():
+        placeholder.set_exception(CancelledError())
+    elif job.exception() is not None:
+        placeholder.set_exception(job.exception())
+    else:
+        placeholder.set_result(job.result())
+
+
+def _outcome(job: Future) -> Tuple[Callable[[asyncio.Future, Any], None], Any]:
+    """Setter and value transferring a finished thread job to an asyncio future."""
+    if job.cancelled():
+        return _set_exception, CancelledError()
+    error = job.exception()
+    if error is not None:
+        return _set_exception, error
+    return _set_result, job.result()
+
+
+analysis_executor = AnalysisExecutor(
+    backend=COMPARE_EXECUTOR,
+    workers=COMPARE_WORKERS,
+    max_tasks_per_child=COMPARE_MAX_TASKS_PER_CHILD,
+    queue_size=COMPARE_QUEUE_SIZE,
+    task_timeout=COMPARE_TASK_TIMEOUT,
+    warm_up=ANALYSIS_WARMUP,
+    result_cache=ComparisonResultCache(
+        COMPARE_RESULT_CACHE_SIZE, COMPARE_RESULT_CACHE_TTL
+    ),
+)
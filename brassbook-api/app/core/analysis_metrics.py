@@ -0,0 +1,216 @@
+import logging
+import resource
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from prometheus_client import Histogram
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+INPUT_SECONDS_BUCKETS = (5, 10, 20, 30, 60, 90, 120, 180, 300, 600)
+FRAME_BUCKETS = (250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+RSS_BUCKETS = tuple(2**power for power in range(20, 34))  # 1 MiB .. 8 GiB
+
+analysis_stage_seconds = Histogram(
+    "brassbook_analysis_stage_seconds",
+    "Wall time of a melody analysis pipeline stage",
+    ["stage", "format"],
+    buckets=STAGE_BUCKETS,
+)
+analysis_input_seconds = Histogram(
+    "brassbook_analysis_input_duration_seconds",
+    "Duration of the decoded audio analysed by one task",
+    ["format"],
+    buckets=INPUT_SECONDS_BUCKETS,
+)
+analysis_frames = Histogram(
+    "brassbook_analysis_frames",
+    "Number of spectrogram frames analysed by one task",
+    ["format"],
+    buckets=FRAME_BUCKETS,
+)
+analysis_peak_rss_growth_bytes = Histogram(
+    "brassbook_analysis_peak_rss_growth_bytes",
+    "Peak resident set size reached during a task above the size at its start",
+    ["format"],
+    buckets=RSS_BUCKETS,
+)
+
+
+class AnalysisStats:
+    """Timings and sizes collected while one analysis task runs."""
+
+    def __init__(self, file_format: str):
+        self.file_format = file_format
+        self.stages: Dict[str, float] = {}
+        self.input_seconds: Optional[float] = None
+        self.frames: Optional[int] = None
+        self.peak_rss_growth_bytes: Optional[int] = None
+
+
+_current_stats: ContextVar[Optional[AnalysisStats]] = ContextVar(
+    "analysis_stats", default=None
+)
+
+
+@contextmanager
+def collect_stats(file_format: str) -> Iterator[AnalysisStats]:
+    """
+    Collect stage timings of the analysis code run inside the block.
+
+    Args:
+        file_format: Input format the collected metrics are labelled with.
+
+    Yields:
+        AnalysisStats: Statistics filled in while the block runs.
+    """
+    stats = AnalysisStats(file_format)
+    token = _current_stats.set(stats)
+    baseline = rss_baseline()
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.stages["total"] = time.perf_counter() - start
+        stats.peak_rss_growth_bytes = max(0, peak_rss_bytes() - baseline)
+        _current_stats.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a pipeline stage; a no-op when no statistics are being collected.
+
+    Args:
+        name: Stage name used as the metric label.
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.stages[name] = stats.stages.get(name, 0.0) + elapsed
+
+
+def record_input(samples: int, sample_rate: int, frames: int) -> None:
+    """
+    Record the size of the analysed audio for the current task.
+
+    Args:
+        samples: Number of decoded samples.
+        sample_rate: Sample rate of the decoded signal.
+        frames: Number of spectrogram frames analysed.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.input_seconds = samples / sample_rate
+        stats.frames = frames
+
+
+def rss_baseline() -> int:
+    """
+    Start measuring the peak resident set size of a task.
+
+    On Linux the kernel's peak RSS of the process (VmHWM) is reset to the
+    current RSS, so the peak read after the task is the task's own. Where
+    that is not possible, the process lifetime peak serves as the baseline
+    and only growth beyond it is seen. With the thread backend concurrent
+    tasks share the process, so their allocations overlap in the figure.
+
+    Returns:
+        int: Resident set size in bytes to subtract from peak_rss_bytes().
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return peak_rss_bytes()
+    rss = _proc_status_bytes("VmRSS")
+    return peak_rss_bytes() if rss is None else rss
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of this process in bytes."""
+    peak = _proc_status_bytes("VmHWM")
+    if peak is not None:
+        return peak
+    # On Linux ru_maxrss is reported in kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _proc_status_bytes(field: str) -> Optional[int]:
+    """Read a memory field of /proc/self/status in bytes, None if unavailable."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024  # Reported in kB
+    except OSError:
+        pass
+    return None
+
+
+def run_measured(
+    fn: Callable[..., Any], file_format: str, *args: Any
+) -> Tuple[Any, AnalysisStats]:
+    """
+    Run an analysis function and return its result with the collected statistics.
+
+    Intended to be submitted to worker processes: the statistics travel back
+    to the parent with the result and are exported there by observe().
+
+    Args:
+        fn: Module-level analysis function.
+        file_format: Input format label.
+        *args: Positional arguments for the function.
+
+    Returns:
+        Tuple[Any, AnalysisStats]: Function result and statistics.
+    """
+    with collect_stats(file_format) as stats:
+        result = fn(*args)
+    return result, stats
+
+
+def observe(stats: AnalysisStats) -> None:
+    """
+    Export collected statistics to the Prometheus metrics.
+
+    Args:
+        stats: Statistics of one finished analysis task.
+    """
+    for name, seconds in stats.stages.items():
+        analysis_stage_seconds.labels(name, stats.file_format).observe(seconds)
+    if stats.input_seconds is not None:
+        analysis_input_seconds.labels(stats.file_format).observe(stats.input_seconds)
+    if stats.frames is not None:
+        analysis_frames.labels(stats.file_format).observe(stats.frames)
+    if stats.peak_rss_growth_bytes is not None:
+        analysis_peak_rss_growth_bytes.labels(stats.file_format).observe(
+            stats.peak_rss_growth_bytes
+        )
+    logger.debug("Analysis stages (%s): %s", stats.file_format, stats.stages)
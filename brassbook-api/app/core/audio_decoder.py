@@ -0,0 +1,206 @@
+import io
+import logging
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+import av
+import numpy as np
+import soxr
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class AudioDecodeError(ValueError):
+    """Raised when the uploaded bytes cannot be decoded as audio."""
+
+
+def _open_container(file_bytes: bytes, file_format: Optional[str]):
+    """
+    Open an in-memory container, probing the content first.
+
+    Args:
+        file_bytes: Raw contents of the uploaded file.
+        file_format: Container name used when probing fails (e.g. "mp3", "webm").
+
+    Returns:
+        av.container.InputContainer: Opened input container.
+
+    Raises:
+        AudioDecodeError: If neither probing nor the format hint can open the data.
+    """
+    try:
+        return av.open(io.BytesIO(file_bytes), mode="r")
+    except av.error.FFmpegError as probe_error:
+        if not file_format:
+            raise AudioDecodeError(f"Unsupported audio data: {probe_error}")
+        logger.debug("Probing failed, retrying with format hint: %s", file_format)
+        try:
+            return av.open(io.BytesIO(file_bytes), mode="r", format=file_format)
+        except av.error.FFmpegError as e:
+            raise AudioDecodeError(f"Unsupported audio data: {e}")
+
+
+def decode_audio(
+    file_bytes: bytes,
+    file_format: Optional[str] = None,
+    sample_rate: Optional[int] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Decode MP3, WebM/Opus or WAV bytes into mono float32 PCM in-process.
+
+    The data is demuxed and decoded by the libav libraries bundled with PyAV,
+    so no ffmpeg subprocess is spawned and no intermediate WAV file is built.
+    Multichannel audio is downmixed by averaging the channels. When a target
+    sample rate is given, the mono signal is resampled once with soxr (HQ).
+
+    Args:
+        file_bytes: Raw contents of the uploaded file.
+        file_format: Container hint (e.g. "mp3", "webm").
+        sample_rate: Target sample rate; the native rate is kept if None.
+
+    Returns:
+        Tuple[np.ndarray, int]: Mono float32 samples and their sample rate.
+
+    Raises:
+        AudioDecodeError: If the data contains no decodable audio stream.
+    """
+    if not file_bytes:
+        raise AudioDecodeError("Empty audio data")
+
+    with _open_container(file_bytes, file_format) as container:
+        native_rate, chunks = iter_decoded_audio(container)
+        chunks = list(chunks)
+
+    if not chunks:
+        raise AudioDecodeError("Audio stream contains no samples")
+
+    samples = np.concatenate(chunks)
+    if sample_rate and sample_rate != native_rate:
+        samples = resample(samples, native_rate, sample_rate)
+    else:
+        sample_rate = native_rate
+
+    logger.debug(
+        "Decoded %d samples at %d Hz (native %d Hz, format hint: %s)",
+        len(samples),
+        sample_rate,
+        native_rate,
+        file_format,
+    )
+    return samples, sample_rate
+
+
+def iter_audio_blocks(
+    file_bytes: bytes,
+    file_format: Optional[str] = None,
+    sample_rate: Optional[int] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Decode audio bytes into consecutive blocks of mono float32 PCM.
+
+    The blocks concatenate to the same samples as decode_audio: resampling
+    goes through a streaming soxr resampler, whose output matches the
+    one-shot call, so only one decoded chunk is held at a time.
+
+    Args:
+        file_bytes: Raw contents of the uploaded file.
+        file_format: Container hint (e.g. "mp3", "webm").
+        sample_rate: Target sample rate; the native rate is kept if None.
+
+    Yields:
+        np.ndarray: Mono float32 samples at the target rate.
+
+    Raises:
+        AudioDecodeError: If the data contains no decodable audio stream.
+    """
+    if not file_bytes:
+        raise AudioDecodeError("Empty audio data")
+
+    with _open_container(file_bytes, file_format) as container:
+        native_rate, chunks = iter_decoded_audio(container)
+        resampler = None
+        if sample_rate and sample_rate != native_rate:
+            resampler = soxr.ResampleStream(
+                native_rate, sample_rate, 1, dtype="float32", quality="HQ"
+            )
+        empty = True
+        for chunk in chunks:
+            empty = False
+            yield chunk if resampler is None else resampler.resample_chunk(chunk)
+        if empty:
+            raise AudioDecodeError("Audio stream contains no samples")
+        if resampler is not None:
+            yield resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def open_audio_stream(source: BinaryIO, file_format: str):
+    """
+    Open a non-seekable audio stream that is still being written.
+
+    Probing is limited so that the demuxer starts decoding after the first
+    few kilobytes instead of waiting for several seconds of data.
+
+    Args:
+        source: File-like object whose reads block until data is available.
+        file_format: Container format of the stream (e.g. "webm").
+
+    Returns:
+        av.container.InputContainer: Opened input container.
+
+    Raises:
+        AudioDecodeError: If the stream cannot be opened.
+    """
+    try:
+        return av.open(
+            source,
+            mode="r",
+            format=file_format,
+            options={"probesize": "4096", "analyzeduration": "0"},
+        )
+    except av.error.FFmpegError as e:
+        raise AudioDecodeError(f"Unsupported audio stream: {e}")
+
+
+def resample(samples: np.ndarray, native_rate: int, sample_rate: int) -> np.ndarray:
+    """Resample a mono signal once with soxr (HQ)."""
+    return soxr.resample(samples, native_rate, sample_rate, quality="HQ")
+
+
+def iter_decoded_audio(container) -> Tuple[int, Iterator[np.ndarray]]:
+    """
+    Decode the first audio stream of an open container chunk by chunk.
+
+    Args:
+        container: Opened input container.
+
+    Returns:
+        Tuple[int, Iterator[np.ndarray]]: Native sample rate and an iterator
+        over mono float32 chunks at that rate.
+
+    Raises:
+        AudioDecodeError: If there is no audio stream or decoding fails.
+    """
+    if not container.streams.audio:
+        raise AudioDecodeError("No audio stream found")
+    stream = container.streams.audio[0]
+    native_rate = stream.codec_context.sample_rate
+    resampler = av.AudioResampler(format="fltp", rate=native_rate)
+
+    def chunks() -> Iterator[np.ndarray]:
+        try:
+            for frame in container.decode(stream):
+                for converted in resampler.resample(frame):
+                    yield _to_mono(converted.to_ndarray())
+            for converted in resampler.resample(None):
+                yield _to_mono(converted.to_ndarray())
+        except av.error.FFmpegError as e:
+            raise AudioDecodeError(f"Failed to decode audio: {e}")
+
+    return native_rate, chunks()
+
+
+def _to_mono(planes: np.ndarray) -> np.ndarray:
+    """Downmix planar float samples of shape (channels, n) to a mono vector."""
+    if planes.shape[0] == 1:
+        return planes[0]
+    return planes.mean(axis=0, dtype=np.float32)
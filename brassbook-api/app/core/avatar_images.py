@@ -0,0 +1,131 @@
+import io
+import warnings
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+
+# Output format -> (Pillow format name, content type, file extension, save options)
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 80, "method": 4}),
+    "jpeg": (
+        "JPEG",
+        "image/jpeg",
+        "jpg",
+        {"quality": 85, "optimize": True, "progressive": True},
+    ),
+}
+
+
+def thumbnail_name(object_name: str, size: int, fmt: str) -> str:
+    """
+    Return the object name of a thumbnail, stored next to the original.
+
+    Args:
+        object_name: Object name of the original image.
+        size: Longest side of the thumbnail in pixels.
+        fmt: "webp" or "jpeg".
+
+    Returns:
+        str: For example ``avatars/1_me.png@128.webp``.
+    """
+    return f"{object_name}@{size}.{THUMBNAIL_FORMATS[fmt][2]}"
+
+
+def parse_sizes(value: Optional[str]) -> List[int]:
+    """Parse the comma-separated sizes stored in ``User.photo_sizes``."""
+    if not value:
+        return []
+    return [int(size) for size in value.split(",")]
+
+
+def pick_variant(
+    object_name: str, ready_sizes: Sequence[int], size: Optional[int], fmt: str
+) -> str:
+    """
+    Choose the object to serve for a requested display size.
+
+    The smallest ready thumbnail at least ``size`` pixels large is used.
+    Without a requested size, or when no thumbnail is large enough (the
+    original is smaller or the thumbnails are not ready yet), the original
+    is served.
+
+    Args:
+        object_name: Object name of the original image.
+        ready_sizes: Thumbnail sizes that have been stored.
+        size: Requested longest side in pixels, or None for the original.
+        fmt: Preferred thumbnail format.
+
+    Returns:
+        str: Object name to serve.
+    """
+    if size is None:
+        return object_name
+    fitting = [ready for ready in ready_sizes if ready >= size]
+    if not fitting:
+        return object_name
+    return thumbnail_name(object_name, min(fitting), fmt)
+
+
+def render_thumbnails(
+    data: bytes, sizes: Iterable[int], max_pixels: int
+) -> Dict[Tuple[int, str], bytes]:
+    """
+    Resize an image and encode every size in every thumbnail format.
+
+    The dimensions in the header are checked against ``max_pixels`` before
+    any pixel data is decoded, so a small file cannot expand into a huge
+    bitmap. JPEG sources are decoded at a reduced scale when possible, EXIF
+    rotation is applied, and each size is downscaled from the previous
+    larger one. Sizes not smaller than the image itself are skipped, so
+    images are never upscaled.
+
+    Args:
+        data: Encoded source image.
+        sizes: Longest sides of the thumbnails in pixels.
+        max_pixels: Largest accepted width * height of the source.
+
+    Returns:
+        Dict[Tuple[int, str], bytes]: Encoded thumbnails by (size, format).
+
+    Raises:
+        PIL.UnidentifiedImageError: If the data is not a supported image.
+        PIL.Image.DecompressionBombError: If the source has too many pixels.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    with warnings.catch_warnings():
+        # Pillow only warns between MAX_IMAGE_PIXELS and twice that
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        with Image.open(io.BytesIO(data)) as source:
+            width, height = source.size
+            if width * height > max_pixels:
+                raise Image.DecompressionBombError(
+                    f"Image has {width * height} pixels, limit is {max_pixels}"
+                )
+            # The draft may shrink the image down to the largest size, so the
+            # sizes to skip are decided by the dimensions of the source
+            longest = max(width, height)
+            source.draft("RGB", (sizes[0], sizes[0]))
+            image = ImageOps.exif_transpose(source)
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    thumbnails = {}
+    for size in sizes:
+        if size >= longest:
+            continue
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in THUMBNAIL_FORMATS:
+            thumbnails[(size, fmt)] = _encode(image, fmt)
+    return thumbnails
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    pil_format, _, _, options = THUMBNAIL_FORMATS[fmt]
+    if pil_format == "JPEG" and image.mode == "RGBA":
+        # JPEG has no alpha channel; put transparent areas on white
+        flat = Image.new("RGB", image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel("A"))
+        image = flat
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
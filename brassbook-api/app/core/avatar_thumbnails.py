@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Callable, Optional, Sequence, Set
+
+from sqlalchemy.orm import Session
+
+from app.config import (
+    AVATAR_MAX_PIXELS,
+    AVATAR_THUMBNAIL_SIZES,
+    AVATAR_THUMBNAIL_WORKERS,
+)
+from app.core.avatar_images import (
+    THUMBNAIL_FORMATS,
+    parse_sizes,
+    pick_variant,
+    render_thumbnails,
+    thumbnail_name,
+)
+from app.data.database import SessionLocal
+from app.data.models import User
+from app.data.presigned_urls import object_name_from_reference
+from app.data.storage import (
+    LazySemaphore,
+    ObjectStorage,
+    object_storage,
+    presigned_urls,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class AvatarThumbnailer:
+    """
+    Background generation of resized avatar variants.
+
+    After an avatar upload the original is read back from object storage,
+    resized to ``sizes`` in every thumbnail format off the event loop and
+    stored next to it. The ready sizes are then recorded in
+    ``User.photo_sizes`` unless the user has uploaded another avatar in the
+    meantime. At most ``concurrency`` avatars are resized at once, and
+    sources larger than ``max_pixels`` are rejected before decoding.
+    """
+
+    def __init__(
+        self,
+        storage: ObjectStorage,
+        session_factory: Callable[[], Session],
+        sizes: Sequence[int],
+        concurrency: int,
+        max_pixels: int = AVATAR_MAX_PIXELS,
+    ):
+        self.storage = storage
+        self.session_factory = session_factory
+        self.sizes = tuple(sizes)
+        self.concurrency = concurrency
+        self.max_pixels = max_pixels
+        self._slots = LazySemaphore(concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, user_id: int, reference: str) -> "asyncio.Task":
+        """
+        Start generating thumbnails for a freshly uploaded avatar.
+
+        Args:
+            user_id: Owner of the avatar.
+            reference: Stored ``User.photo_url`` of the new avatar.
+
+        Returns:
+            asyncio.Task: The background task; failures are logged, not raised.
+        """
+        task = asyncio.create_task(self.process(user_id, reference))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def process(self, user_id: int, reference: str) -> None:
+        """Generate, store and record the thumbnails of one avatar."""
+        object_name = object_name_from_reference(reference, self.storage.bucket)
+        try:
+            async with self._slots:
+                data = await self.storage.get_bytes(object_name)
+                thumbnails = await asyncio.to_thread(
+                    render_thumbnails, data, self.sizes, self.max_pixels
+                )
+            for (size, fmt), content in thumbnails.items():
+                name = thumbnail_name(object_name, size, fmt)
+                await self.storage.put_bytes(name, content, THUMBNAIL_FORMATS[fmt][1])
+                # The key is reused when the same file name is uploaded again
+                presigned_urls.discard(name)
+            sizes = sorted({size for size, _ in thumbnails})
+            await asyncio.to_thread(self._mark_ready, user_id, reference, sizes)
+            logger.info("Avatar thumbnails stored for %s: %s", object_name, sizes)
+        except Exception as e:
+            logger.error("Failed to create thumbnails for %s: %s", object_name, str(e))
+
+    def _mark_ready(self, user_id: int, reference: str, sizes: Sequence[int]) -> None:
+        db = self.session_factory()
+        try:
+            user = db.get(User, user_id)
+            if user is None or user.photo_url != reference:
+                return
+            user.photo_sizes = ",".join(str(size) for size in sizes)
+            db.commit()
+        finally:
+            db.close()
+
+
+def avatar_object_name(
+    user: User, bucket: str, size: Optional[int], fmt: str
+) -> Optional[str]:
+    """
+    Return the object to serve as the user's avatar at the requested size.
+
+    Args:
+        user: Avatar owner.
+        bucket: Bucket holding the avatar.
+        size: Requested longest side in pixels, or None for the original.
+        fmt: Preferred thumbnail format, "webp" or "jpeg".
+
+    Returns:
+        Optional[str]: Object name, or None if the user has no avatar.
+    """
+    if user.photo_url is None:
+        return None
+    object_name = object_name_from_reference(user.photo_url, bucket)
+    return pick_variant(object_name, parse_sizes(user.photo_sizes), size, fmt)
+
+
+avatar_thumbnailer = AvatarThumbnailer(
+    object_storage, SessionLocal, AVATAR_THUMBNAIL_SIZES, AVATAR_THUMBNAIL_WORKERS
+)
+
+
+def get_avatar_thumbnailer() -> AvatarThumbnailer:
+    """FastAPI dependency providing the shared avatar thumbnailer."""
+    return avatar_thumbnailer
@@ -1,25 +1,174 @@
+import functools
+import hashlib
 import io
 import logging
-from math import floor
-from typing import List, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
 import librosa
 import numpy as np
-from pydub import AudioSegment
+from prometheus_client import Counter, Gauge
+
+from app.config import (ANALYSIS_BLOCK_SECONDS, ANALYSIS_IN_MEMORY_SECONDS,
+                        MELODY_CACHE_SIZE)
+from app.core.analysis_metrics import record_input, stage
+from app.core.audio_decoder import iter_audio_blocks
+from app.core.note_alignment import align_notes
 
 class AudioConfig:
+    SAMPLE_RATE = 22050
+    HOP_LENGTH_MS = 23.22
+    N_FFT = 2048
     N_MELS = 64
     FREQ_BANDS = slice(4, 9)
     TIME_FACTOR = 4
     TRIM_DB = 14
     LOUDNESS_THRESHOLD = 0.25
     RHYTHM_THRESHOLD = 0.25
+    # Выравнивание нот: "pattern" (пропуск одной ноты) или "dtw" (полоса Сакоэ-Чибы)
+    ALIGNMENT = "pattern"
+    DTW_BAND = 16
+    DTW_GAP_COST = 1.0
+
+
+# Порог librosa.amplitude_to_db(top_db=80) относительно максимума по всем полосам
+TOP_DB = 80.0
 
+# Покадровая мелодия: номер полосы максимума и его громкость в дБ
+MELODY_DTYPE = np.dtype([("band", np.uint8), ("db", np.int16)])
+
+melody_cache_requests = Counter(
+    "brassbook_melody_cache_requests_total",
+    "Reference melody lookups by cache outcome",
+    ["outcome"],
+)
+melody_cache_evictions = Counter(
+    "brassbook_melody_cache_evictions_total",
+    "Reference melodies evicted from the cache",
+)
+melody_cache_size = Gauge(
+    "brassbook_melody_cache_size",
+    "Number of reference melodies held in the cache",
+)
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
 
+def analysis_hop_length() -> int:
+    """Возвращает шаг анализа в отсчетах для частоты AudioConfig.SAMPLE_RATE."""
+    return max(1, round(AudioConfig.SAMPLE_RATE * AudioConfig.HOP_LENGTH_MS / 1000))
+
+
+def min_note_frames() -> float:
+    """Возвращает минимальную длительность ноты в кадрах анализа."""
+    frames_per_second = AudioConfig.SAMPLE_RATE / analysis_hop_length()
+    return frames_per_second / AudioConfig.TIME_FACTOR
+
+
+def audio_config_fingerprint() -> str:
+    """Возвращает отпечаток параметров AudioConfig для ключей кэша."""
+    params = sorted(
+        (name, repr(value))
+        for name, value in vars(AudioConfig).items()
+        if name.isupper()
+    )
+    return hashlib.sha256(repr(params).encode()).hexdigest()[:16]
+
+
+def melody_cache_key(file_bytes: bytes, file_format: str) -> str:
+    """Строит ключ кэша по SHA-256 содержимого файла и параметрам анализа."""
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    return f"{digest}:{file_format}:{audio_config_fingerprint()}"
+
+
+class MelodyCache:
+    """Ограниченный LRU-кэш результатов extract_melody_from_audio."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[np.ndarray, float]]:
+        """Возвращает мелодию (массив только для чтения) из кэша или None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                melody_cache_requests.labels("miss").inc()
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            melody_cache_requests.labels("hit").inc()
+        return entry
+
+    def put(self, key: Hashable, melody: np.ndarray, min_per: float) -> None:
+        """Сохраняет мелодию в кэш, вытесняя самые старые записи."""
+        if self.maxsize <= 0:
+            return
+        frozen = as_melody(melody).copy()
+        frozen.setflags(write=False)
+        with self._lock:
+            self._data[key] = (frozen, min_per)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+                melody_cache_evictions.inc()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        """Очищает кэш и сбрасывает счетчики."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает счетчики попаданий, промахов и вытеснений."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+melody_cache = MelodyCache(MELODY_CACHE_SIZE)
+melody_cache_size.set_function(lambda: len(melody_cache))
+
+
+def melody_to_bytes(melody: np.ndarray, min_per: float) -> bytes:
+    """Сериализует мелодию и параметры анализа в формат .npz."""
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        melody=as_melody(melody),
+        min_per=np.float64(min_per),
+        fingerprint=np.str_(audio_config_fingerprint()),
+    )
+    return buffer.getvalue()
+
+
+def melody_from_bytes(data: bytes) -> Tuple[np.ndarray, float, str]:
+    """Восстанавливает мелодию, минимальную длительность ноты и отпечаток AudioConfig."""
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        # Старые файлы хранят мелодию упакованной во float64
+        return (
+            as_melody(arrays["melody"]),
+            float(arrays["min_per"]),
+            str(arrays["fingerprint"]),
+        )
+
+
 def compare_melodies(
     file1: bytes, file2: bytes, file1_format: str = "mp3", file2_format: str = "webm"
 ) -> Optional[Tuple[float, List[int], List[int], List[int], List[float]]]:
@@ -31,112 +180,732 @@ def compare_melodies(
         if not file1 or not file2:
             raise ValueError("Входные файлы не могут быть пустыми")
 
-        teacher_melody, min_per_t = extract_melody_from_audio(file1, file_format=file1_format)
+        teacher_melody, min_per_t = extract_reference_melody(
+            file1, file_format=file1_format
+        )
         if teacher_melody is None:
             raise ValueError("Не удалось извлечь мелодию учителя")
 
-        children_melody, min_per_c = extract_melody_from_audio(file2, file_format=file2_format)
-        if children_melody is None:
-            raise ValueError("Не удалось извлечь мелодию ребенка")
+        result = _compare_with_reference(
+            teacher_melody, min_per_t, file2, file2_format
+        )
+        logging.info("Сравнение мелодий завершено")
+        return result
+
+    except Exception as e:
+        _log_comparison_error(e)
+        return None
+
 
+def compare_with_reference(
+    teacher_melody: np.ndarray,
+    min_per_t: float,
+    file2: bytes,
+    file2_format: str = "webm",
+) -> Optional[Tuple[float, List[int], List[int], List[int], List[float]]]:
+    """Сравнивает запись ребенка с заранее извлеченной мелодией эталона."""
+    logging.info("Начало сравнения записи с эталоном")
+    try:
+        if not isinstance(file2, bytes):
+            raise TypeError("Входные файлы должны быть в формате bytes")
+        if not file2:
+            raise ValueError("Входные файлы не могут быть пустыми")
+
+        result = _compare_with_reference(
+            teacher_melody, min_per_t, file2, file2_format
+        )
+        logging.info("Сравнение мелодий завершено")
+        return result
+
+    except Exception as e:
+        _log_comparison_error(e)
+        return None
+
+
+def _compare_with_reference(
+    teacher_melody: np.ndarray, min_per_t: float, file2: bytes, file2_format: str
+) -> Tuple[float, List[int], List[int], List[int], List[float]]:
+    """Извлекает мелодию ребенка и сравнивает ее с мелодией эталона."""
+    children_melody, min_per_c = extract_melody_from_audio(
+        file2, file_format=file2_format
+    )
+    if children_melody is None:
+        raise ValueError("Не удалось извлечь мелодию ребенка")
+    return _compare_melodies(teacher_melody, min_per_t, children_melody, min_per_c)
+
+
+def compare_signal_with_reference(
+    teacher_melody: np.ndarray, min_per_t: float, y: np.ndarray, sr: int
+) -> Optional[Tuple[float, List[int], List[int], List[int], List[float]]]:
+    """Сравнивает уже декодированную запись ребенка с мелодией эталона."""
+    logging.info("Начало сравнения декодированной записи с эталоном")
+    try:
+        if not len(y):
+            raise ValueError("Пустая запись")
+        children_melody, min_per_c = extract_melody_from_signal(y, sr)
+        result = _compare_melodies(
+            teacher_melody, min_per_t, children_melody, min_per_c
+        )
+        logging.info("Сравнение мелодий завершено")
+        return result
+
+    except Exception as e:
+        _log_comparison_error(e)
+        return None
+
+
+def compare_melody_with_reference(
+    teacher_melody: np.ndarray,
+    min_per_t: float,
+    children_melody: np.ndarray,
+    min_per_c: float,
+) -> Optional[Tuple[float, List[int], List[int], List[int], List[float]]]:
+    """Сравнивает уже извлеченную мелодию записи ребенка с мелодией эталона."""
+    logging.info("Начало сравнения мелодии записи с эталоном")
+    try:
+        result = _compare_melodies(
+            teacher_melody, min_per_t, children_melody, min_per_c
+        )
+        logging.info("Сравнение мелодий завершено")
+        return result
+
+    except Exception as e:
+        _log_comparison_error(e)
+        return None
+
+
+def _compare_melodies(
+    teacher_melody: np.ndarray,
+    min_per_t: float,
+    children_melody: np.ndarray,
+    min_per_c: float,
+) -> Tuple[float, List[int], List[int], List[int], List[float]]:
+    """Выравнивает ноты двух мелодий и вычисляет характеристики исполнения."""
+    with stage("extract_notes"):
         all_t, all_c, freq_t, freq_c, t_m, c_m = synchronize_melodies(
             teacher_melody, children_melody, min_per_t, min_per_c
         )
 
+    with stage("compare_melody_sequences"):
         teacher_melody, children_melody, freq_t, freq_c, t_m, c_m = (
-            compare_melody_sequences(
+            align_melody_sequences(
                 all_t, all_c, freq_t, freq_c, t_m, c_m, teacher_melody, children_melody
             )
         )
 
-        result = compare(t_m, c_m, freq_t, freq_c, teacher_melody, children_melody, 2)
-        logging.info("Сравнение мелодий завершено")
-        return result
+    return compare(t_m, c_m, freq_t, freq_c, teacher_melody, children_melody, 2)
 
-    except TypeError as te:
-        logging.error("Ошибка типа данных: %s", str(te))
-        return None
-    except ValueError as ve:
-        logging.error("Ошибка ввода: %s", str(ve))
-        return None
-    except librosa.LibrosaError as le:
-        logging.error("Ошибка обработки аудио: %s", str(le))
-        return None
-    except Exception as e:
-        logging.error("Непредвиденная ошибка в %s: %s", __name__, str(e))
-        return None
+
+def _log_comparison_error(error: Exception) -> None:
+    """Логирует ошибку сравнения в зависимости от ее типа."""
+    if isinstance(error, TypeError):
+        logging.error("Ошибка типа данных: %s", str(error))
+    elif isinstance(error, ValueError):
+        logging.error("Ошибка ввода: %s", str(error))
+    elif isinstance(error, librosa.LibrosaError):
+        logging.error("Ошибка обработки аудио: %s", str(error))
+    else:
+        logging.error("Непредвиденная ошибка в %s: %s", __name__, str(error))
 
 
 def extract_melody_from_audio(
     file_bytes: bytes, file_format: str = "mp3"
-) -> Tuple[Optional[List[float]], Optional[float]]:
+) -> Tuple[Optional[np.ndarray], Optional[float]]:
     """Извлекает мелодию из аудиофайла."""
     logging.info("Начало извлечения мелодии из аудиофайла")
     try:
         if not file_bytes:
             raise ValueError("Пустой файл")
 
-        # Convert input to WAV for librosa compatibility
-        audio_segment = AudioSegment.from_file(io.BytesIO(file_bytes), format=file_format)
-        wav_buffer = io.BytesIO()
-        audio_segment.export(wav_buffer, format="wav")
-        wav_buffer.seek(0)  # Reset buffer position
+        # Декодируем в моно float32 PCM с частотой анализа; длинные записи
+        # целиком в память не собираются и анализируются блоками
+        with stage("decode"):
+            tm, energy = decode_for_analysis(file_bytes, file_format)
+        if tm is None:
+            logging.info(
+                "Длинная запись (%d отсчетов), анализ блоками", energy.samples
+            )
+            return extract_melody_in_blocks(file_bytes, file_format, energy)
+        logging.debug("Аудиофайл загружен: длина %d", len(tm))
+        return extract_melody_from_signal(tm, AudioConfig.SAMPLE_RATE)
+
+    except ValueError as ve:
+        logging.error("Ошибка ввода: %s", str(ve))
+        return None, None
+    except librosa.LibrosaError as le:
+        logging.error("Ошибка librosa: %s", str(le))
+        return None, None
+    except Exception as e:
+        logging.error("Ошибка в extract_melody_from_audio: %s", str(e))
+        return None, None
+
+
+def extract_melody_from_signal(y: np.ndarray, sr: int) -> Tuple[np.ndarray, float]:
+    """Извлекает мелодию из декодированного сигнала с частотой анализа."""
+    with stage("trim"):
+        tmt = trim_silence(y)
+    with stage("mel_spectrogram"):
+        tmt_db_mel_transposed = mel_spectrogram_db(tmt, sr)
+    with stage("contour"):
+        result = melody_contour(tmt_db_mel_transposed)
+    record_input(len(y), sr, len(result))
+
+    # Минимальная длительность ноты зависит только от частоты и шага анализа
+    min_per_t = min_note_frames()
+
+    logging.info(
+        "Извлечение мелодии завершено, найдено %d нот",
+        np.count_nonzero(audible_frames(result)),
+    )
+    return result, min_per_t
+
+
+def decode_for_analysis(
+    file_bytes: bytes, file_format: str
+) -> Tuple[Optional[np.ndarray], Optional["SignalEnergy"]]:
+    """
+    Декодирует запись с частотой анализа.
+
+    Запись не длиннее ANALYSIS_IN_MEMORY_SECONDS возвращается целиком. Для
+    более длинной сигнал не сохраняется: возвращается только энергия кадров,
+    по которой обрезается тишина перед вторым проходом декодирования.
+    """
+    limit = ANALYSIS_IN_MEMORY_SECONDS * AudioConfig.SAMPLE_RATE
+    blocks: List[np.ndarray] = []
+    size = 0
+    energy = None
+    for block in iter_audio_blocks(file_bytes, file_format, AudioConfig.SAMPLE_RATE):
+        if energy is not None:
+            energy.feed(block)
+            continue
+        blocks.append(block)
+        size += len(block)
+        if size > limit:
+            energy = SignalEnergy()
+            for kept in blocks:
+                energy.feed(kept)
+            blocks = []
+    if energy is not None:
+        return None, energy
+    return np.concatenate(blocks), None
+
+
+def extract_melody_in_blocks(
+    file_bytes: bytes, file_format: str, energy: "SignalEnergy"
+) -> Tuple[np.ndarray, float]:
+    """
+    Извлекает мелодию длинной записи, не держа сигнал в памяти целиком.
+
+    Звучащая часть декодируется повторно и проходит через BlockContour
+    блоками по ANALYSIS_BLOCK_SECONDS, поэтому пиковая память не зависит от
+    длины записи. Результат совпадает с extract_melody_from_signal.
+    """
+    sr = AudioConfig.SAMPLE_RATE
+    with stage("trim"):
+        start, end = trim_frame_bounds(energy.frame_energy(), energy.samples)
+    if start == end:
+        raise ValueError("Запись не содержит звука")
+
+    with stage("mel_spectrogram"):
+        contour = BlockContour(sr, end - start)
+        position = 0
+        for block in iter_audio_blocks(file_bytes, file_format, sr):
+            lo, hi = max(start - position, 0), min(end - position, len(block))
+            if lo < hi:
+                contour.feed(block[lo:hi])
+            position += len(block)
+            if position >= end:
+                break
+    with stage("contour"):
+        result = contour.finish()
+    record_input(energy.samples, sr, len(result))
+
+    logging.info(
+        "Извлечение мелодии завершено, найдено %d нот",
+        np.count_nonzero(audible_frames(result)),
+    )
+    return result, min_note_frames()
+
+
+def trim_silence(y: np.ndarray) -> np.ndarray:
+    """Обрезает тишину в начале и конце сигнала."""
+    start, end = trim_bounds(y)
+    return y[start:end]
+
+
+def trim_bounds(y: np.ndarray) -> Tuple[int, int]:
+    """
+    Находит границы звучащей части сигнала, как librosa.effects.trim.
+
+    RMS кадров librosa.feature.rms (центрированные кадры N_FFT с нулевым
+    дополнением на сетке шага анализа) считается через префиксные суммы
+    квадратов сигнала, без разбиения на кадры.
+    """
+    n_fft, hop_length = AudioConfig.N_FFT, analysis_hop_length()
+    energy = np.concatenate(([0.0], np.cumsum(np.square(y, dtype=np.float64))))
+    starts = np.arange(1 + len(y) // hop_length) * hop_length - n_fft // 2
+    frame_energy = (
+        energy[np.clip(starts + n_fft, 0, len(y))] - energy[np.clip(starts, 0, len(y))]
+    )
+    return trim_frame_bounds(frame_energy, len(y))
+
+
+def trim_frame_bounds(frame_energy: np.ndarray, n_samples: int) -> Tuple[int, int]:
+    """Находит границы звучащей части по энергии центрированных кадров N_FFT."""
+    hop_length = analysis_hop_length()
+    rms = np.sqrt(np.maximum(frame_energy, 0) / AudioConfig.N_FFT)
+    db = librosa.amplitude_to_db(rms, ref=np.max, top_db=None)
+    audible = np.flatnonzero(db > -AudioConfig.TRIM_DB)
+    if not len(audible):
+        return 0, 0
+    start = int(audible[0]) * hop_length
+    end = min(n_samples, (int(audible[-1]) + 1) * hop_length)
+    return start, end
+
+
+def mel_spectrogram_db(y: np.ndarray, sr: int) -> np.ndarray:
+    """Вычисляет мелспектрограмму в дБ по полосам FREQ_BANDS (кадры x полосы)."""
+    power = (
+        np.abs(
+            librosa.stft(y, n_fft=AudioConfig.N_FFT, hop_length=analysis_hop_length())
+        )
+        ** 2
+    )
+    db_mel, floor = band_power_db(power, sr)
+    return np.transpose(np.maximum(db_mel, floor))
+
+
+@functools.lru_cache(maxsize=8)
+def _band_filterbank(
+    sr: int, n_fft: int, n_mels: int, bands: Tuple[int, int, int]
+) -> Tuple[np.ndarray, np.ndarray, slice, np.ndarray]:
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+    band_basis = mel_basis[slice(*bands)]
+    nonzero = np.flatnonzero(band_basis.any(axis=0))
+    bins = slice(int(nonzero[0]), int(nonzero[-1]) + 1)
+    band_basis = np.ascontiguousarray(band_basis[:, bins])
+    envelope = mel_basis.max(axis=0)
+    for array in (mel_basis, band_basis, envelope):
+        array.setflags(write=False)
+    return mel_basis, band_basis, bins, envelope
+
+
+def band_filterbank(sr: int) -> Tuple[np.ndarray, np.ndarray, slice, np.ndarray]:
+    """
+    Возвращает мел-фильтры для частоты sr: все полосы, полосы FREQ_BANDS на
+    отрезке частотных бинов bins, где они ненулевые, и поточечный максимум
+    всех фильтров (верхнюю оценку любой полосы).
+    """
+    bands = AudioConfig.FREQ_BANDS.indices(AudioConfig.N_MELS)
+    return _band_filterbank(sr, AudioConfig.N_FFT, AudioConfig.N_MELS, bands)
+
+
+def band_power_db(power: np.ndarray, sr: int) -> Tuple[np.ndarray, np.floating]:
+    """
+    Вычисляет дБ полос FREQ_BANDS (без порога) и порог top_db мелспектрограммы.
+
+    Остальные полосы нужны только для порога: он равен максимуму по всем
+    полосам минус TOP_DB. Если даже верхняя оценка этого максимума через
+    огибающую фильтров дает порог ниже максимума FREQ_BANDS в каждом кадре,
+    порог не влияет на контур и берется по FREQ_BANDS. Иначе мелспектрограмма
+    проецируется полностью и порог совпадает с librosa.amplitude_to_db.
+    """
+    mel_basis, band_basis, bins, envelope = band_filterbank(sr)
+    mel = band_basis @ power[bins]
+    db_mel = librosa.amplitude_to_db(mel, top_db=None)
+    frame_max = db_mel.max(axis=0)
 
-        # Load audio with librosa
-        try:
-            tm, srt = librosa.load(wav_buffer, sr=None, mono=True)
-        except librosa.util.exceptions.ParameterError as e:
-            logging.error("Ошибка при загрузке аудиофайла с librosa: %s", str(e))
-            raise ValueError("Невозможно загрузить аудиофайл")
+    # Запас на погрешность суммирования float32
+    bound = (envelope @ power).max() * np.float32(1 + 1e-3)
+    bound_db = librosa.amplitude_to_db(np.asarray([bound]), top_db=None)[0]
+    if frame_max.min() > bound_db - TOP_DB:
+        return db_mel, frame_max.max() - TOP_DB
 
-        logging.debug("Аудиофайл загружен: длина %d, частота %d", len(tm), srt)
+    peak = (mel_basis @ power).max()
+    peak_db = librosa.amplitude_to_db(np.asarray([peak]), top_db=None)[0]
+    return db_mel, peak_db - TOP_DB
 
-        # Применяем обрезку на основе порога
-        tmt, _ = librosa.effects.trim(tm, top_db=AudioConfig.TRIM_DB)
 
-        # Вычисляем мелспектрограмму
-        tmt_mel = librosa.feature.melspectrogram(
-            y=tmt, sr=srt, n_mels=AudioConfig.N_MELS
+def melody_contour(db_mel: np.ndarray) -> np.ndarray:
+    """Строит покадровую мелодию (MELODY_DTYPE): полоса максимума и его громкость."""
+    # Получаем индексы и значения максимума по спектрограмме
+    mask = np.all(db_mel < 0, axis=1)
+    audible = db_mel[~mask]
+
+    # Тихие кадры остаются нулевыми
+    result = np.zeros(len(db_mel), dtype=MELODY_DTYPE)
+    result["band"][~mask] = np.argmax(audible, axis=1)
+    result["db"][~mask] = np.round(np.max(audible, axis=1))
+    return result
+
+
+class SignalEnergy:
+    """
+    Энергия центрированных кадров N_FFT сигнала, поступающего блоками.
+
+    Как и в trim_bounds, энергия кадра — разность префиксных сумм квадратов,
+    но суммы запоминаются только в точках начала и конца кадров на сетке
+    шага анализа: 16 байт на кадр вместо всего сигнала.
+    """
+
+    def __init__(self):
+        self.n_fft, self.hop_length = AudioConfig.N_FFT, analysis_hop_length()
+        half = self.n_fft // 2
+        self._residues = sorted({-half % self.hop_length, half % self.hop_length})
+        # Префиксная сумма в точке residue + j * hop_length
+        self._sums: Dict[int, List[np.ndarray]] = {r: [] for r in self._residues}
+        if 0 in self._sums:
+            self._sums[0].append(np.zeros(1))
+        self.total = 0.0
+        self.samples = 0
+
+    def feed(self, samples: np.ndarray) -> None:
+        """Добавляет очередной блок сигнала."""
+        if not len(samples):
+            return
+        cumulative = self.total + np.cumsum(np.square(samples, dtype=np.float64))
+        for residue in self._residues:
+            first = self.samples + (residue - self.samples - 1) % self.hop_length + 1
+            points = np.arange(first, self.samples + len(samples) + 1, self.hop_length)
+            self._sums[residue].append(cumulative[points - self.samples - 1])
+        self.total = float(cumulative[-1])
+        self.samples += len(samples)
+
+    def frame_energy(self) -> np.ndarray:
+        """Возвращает энергию кадров librosa.feature.rms всего сигнала."""
+        n = self.samples
+        starts = np.arange(1 + n // self.hop_length) * self.hop_length - self.n_fft // 2
+        return self._prefix(starts + self.n_fft) - self._prefix(starts)
+
+    def _prefix(self, points: np.ndarray) -> np.ndarray:
+        result = np.where(points <= 0, 0.0, self.total)
+        inner = (points > 0) & (points < self.samples)
+        for residue, sums in self._sums.items():
+            selected = inner & (points % self.hop_length == residue)
+            if selected.any():
+                index = (points[selected] - residue) // self.hop_length
+                result[selected] = np.concatenate(sums)[index]
+        return result
+
+
+class BlockContour:
+    """
+    Покадровая мелодия (MELODY_DTYPE) сигнала, поступающего блоками.
+
+    Кадры совпадают с librosa.stft(center=True): сигнал дополняется нулями на
+    N_FFT // 2 с обеих сторон, соседние блоки перекрываются на N_FFT - шаг.
+    Для каждого кадра сразу сохраняются полоса максимума и его громкость
+    (5 байт); порог top_db зависит от максимума всей мелспектрограммы,
+    поэтому контур достраивается в finish, когда этот максимум известен.
+    """
+
+    def __init__(self, sr: int, n_samples: int):
+        self.sr = sr
+        self.n_fft, self.hop_length = AudioConfig.N_FFT, analysis_hop_length()
+        self.n_frames = 1 + n_samples // self.hop_length
+        self.block_frames = max(
+            1, round(ANALYSIS_BLOCK_SECONDS * sr / self.hop_length)
         )
-        tmt_db_mel = librosa.amplitude_to_db(tmt_mel)[AudioConfig.FREQ_BANDS]
-        tmt_db_mel_transposed = np.transpose(tmt_db_mel)
+        self.frames = 0
+        self._window = librosa.filters.get_window("hann", self.n_fft, fftbins=True)
+        self._pending = [np.zeros(self.n_fft // 2, dtype=np.float32)]
+        self._size = self.n_fft // 2
+        self._bands: List[np.ndarray] = []
+        self._peaks: List[np.ndarray] = []
+        self._mel_max = np.float32(0)
 
-        # Рассчитываем длительность и минимальную продолжительность времени для временного шага
-        time_t = librosa.get_duration(y=tmt, sr=srt)
-        min_per_t = round(len(tmt_db_mel_transposed)) / (time_t * AudioConfig.TIME_FACTOR)
+    def feed(self, samples: np.ndarray) -> None:
+        """Добавляет очередной блок сигнала и обрабатывает полные блоки кадров."""
+        self._pending.append(samples)
+        self._size += len(samples)
+        block_size = (self.block_frames - 1) * self.hop_length + self.n_fft
+        while self._size >= block_size:
+            self._process(self.block_frames)
 
-        # Получаем индексы и значения максимума по спектрограмме
-        mask = np.all(tmt_db_mel_transposed < 0, axis=1)
-        max_indices = np.argmax(tmt_db_mel_transposed[~mask], axis=1)
-        max_values = np.max(tmt_db_mel_transposed[~mask], axis=1)
+    def finish(self) -> np.ndarray:
+        """Обрабатывает оставшиеся кадры и возвращает мелодию."""
+        self._pending.append(np.zeros(self.n_fft // 2, dtype=np.float32))
+        if self.n_frames > self.frames:
+            self._process(self.n_frames - self.frames)
 
-        # Формируем результат
-        result = np.zeros(len(tmt_db_mel_transposed))
-        nonzero_indices = np.where(~mask)[0]
-        result[nonzero_indices] = max_indices + (np.round(max_values) / 100)
+        return floored_contour(
+            np.concatenate(self._bands), np.concatenate(self._peaks), self._mel_max
+        )
 
-        logging.info(
-            "Извлечение мелодии завершено, найдено %d нот", len(nonzero_indices)
+    def _process(self, count: int) -> None:
+        buffer = np.concatenate(self._pending)
+        frames = librosa.util.frame(
+            buffer[: (count - 1) * self.hop_length + self.n_fft],
+            frame_length=self.n_fft,
+            hop_length=self.hop_length,
         )
-        return result.tolist(), min_per_t
+        rest = buffer[count * self.hop_length:]
+        self._pending, self._size = [rest], len(rest)
 
-    except ValueError as ve:
-        logging.error("Ошибка ввода: %s", str(ve))
-        return None, None
-    except librosa.LibrosaError as le:
-        logging.error("Ошибка librosa: %s", str(le))
-        return None, None
-    except Exception as e:
-        logging.error("Ошибка в extract_melody_from_audio: %s", str(e))
-        return None, None
+        power = frame_power(frames, self._window)
+        mel_basis, band_basis, bins, envelope = band_filterbank(self.sr)
+        mel = band_basis @ power[bins]
+        bands, peaks = band_peaks(mel)
+        self._bands.append(bands)
+        self._peaks.append(peaks)
+
+        # Максимум всей мелспектрограммы уточняется только по кадрам, чья
+        # верхняя оценка через огибающую фильтров может его превысить
+        self._mel_max = max(self._mel_max, mel.max())
+        bound = (envelope @ power) * np.float32(1 + 1e-3)
+        candidates = bound >= self._mel_max
+        if candidates.any():
+            full = mel_basis @ power[:, candidates]
+            self._mel_max = max(self._mel_max, full.max())
+        self.frames += count
+
+
+class StreamingContour:
+    """
+    Покадровая мелодия (MELODY_DTYPE) записи, которая еще продолжается.
+
+    Границы обрезки тишины зависят от громкости всей записи, поэтому кадры
+    считаются сразу по мере поступления сигнала на сетке необрезанного
+    сигнала: границы обрезки лежат на этой же сетке, и внутренние кадры
+    обрезанного сигнала совпадают с ними. Для каждого кадра хранятся полоса
+    максимума, его громкость и максимум всей мелспектрограммы (9 байт).
+    Отличаются только кадры у границ, где обрезанный сигнал дополняется
+    нулями; для них сохраняются отсчеты тех кадров, которые еще могут
+    оказаться первым или последним звучащим кадром. Поэтому finish только
+    пересчитывает несколько граничных кадров, а результат совпадает с
+    extract_melody_from_signal для всей записи.
+    """
+
+    # Запас к порогу TRIM_DB на погрешность энергии кадров, дБ
+    TRIM_MARGIN_DB = 1.0
+
+    def __init__(self, sr: int):
+        self.sr = sr
+        self.n_fft, self.hop_length = AudioConfig.N_FFT, analysis_hop_length()
+        self.frames = 0
+        self.energy = SignalEnergy()
+        self._window = librosa.filters.get_window("hann", self.n_fft, fftbins=True)
+        self._pending = np.zeros(self.n_fft // 2, dtype=np.float32)
+        self._bands: List[np.ndarray] = []
+        self._peaks: List[np.ndarray] = []
+        self._mel_peaks: List[np.ndarray] = []
+        self._mel_max = np.float32(0)
+        self._loudest = 0.0
+        # Возможные первые звучащие кадры (рекорды энергии) и возможные
+        # последние (энергия строго убывает): номер кадра и его энергия
+        self._starts: List[Tuple[int, float]] = []
+        self._ends: List[Tuple[int, float]] = []
+        # Отсчеты кадров, нужные для пересчета граничных кадров
+        self._windows: Dict[int, np.ndarray] = {}
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Добавляет очередной блок сигнала.
+
+        Возвращает мелодию законченных этим блоком кадров с порогом top_db
+        по текущему, а не итоговому максимуму: для обратной связи во время
+        игры.
+        """
+        self.energy.feed(samples)
+        self._pending = np.concatenate((self._pending, samples))
+        if len(self._pending) < self.n_fft:
+            return np.zeros(0, dtype=MELODY_DTYPE)
+        count = (len(self._pending) - self.n_fft) // self.hop_length + 1
+        bands, peaks = self._process(count)
+        return floored_contour(bands, peaks, self._mel_max)
+
+    def finish(self) -> np.ndarray:
+        """Обрабатывает оставшиеся кадры и возвращает мелодию обрезанной записи."""
+        self._pending = np.concatenate(
+            (self._pending, np.zeros(self.n_fft // 2, dtype=np.float32))
+        )
+        n_frames = 1 + self.energy.samples // self.hop_length
+        if n_frames > self.frames:
+            self._process(n_frames - self.frames)
+
+        start, end = trim_frame_bounds(self.energy.frame_energy(), self.energy.samples)
+        if start == end:
+            raise ValueError("Запись не содержит звука")
+        first = start // self.hop_length
+        frames = slice(first, first + 1 + (end - start) // self.hop_length)
+        bands = np.concatenate(self._bands)[frames]
+        peaks = np.concatenate(self._peaks)[frames]
+        mel_peaks = np.concatenate(self._mel_peaks)[frames]
+
+        # Кадры, чье окно выходит за границу обрезки внутри сигнала
+        half = self.n_fft // 2
+        centers = start + np.arange(len(bands)) * self.hop_length
+        boundary = np.flatnonzero(
+            ((centers - half < start) & (start > 0))
+            | ((centers + half > end) & (end < self.energy.samples))
+        )
+        if len(boundary):
+            trimmed = np.stack(
+                [self._trimmed_frame(c, start, end) for c in centers[boundary]],
+                axis=1,
+            )
+            bands[boundary], peaks[boundary], mel_peaks[boundary] = self._features(
+                frame_power(trimmed, self._window)
+            )
+        return floored_contour(bands, peaks, mel_peaks.max())
+
+    def _process(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        frames = librosa.util.frame(
+            self._pending[: (count - 1) * self.hop_length + self.n_fft],
+            frame_length=self.n_fft,
+            hop_length=self.hop_length,
+        )
+        self._track_bounds(frames)
+        self._pending = self._pending[count * self.hop_length:]
+        self.frames += count
+
+        bands, peaks, mel_peaks = self._features(frame_power(frames, self._window))
+        self._bands.append(bands)
+        self._peaks.append(peaks)
+        self._mel_peaks.append(mel_peaks)
+        self._mel_max = max(self._mel_max, mel_peaks.max())
+        return bands, peaks
+
+    def _features(
+        self, power: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Полоса максимума FREQ_BANDS, его громкость и максимум всех полос."""
+        mel_basis, band_basis, bins, envelope = band_filterbank(self.sr)
+        bands, peaks = band_peaks(band_basis @ power[bins])
+        return bands, peaks, (mel_basis @ power).max(axis=0)
+
+    def _track_bounds(self, frames: np.ndarray) -> None:
+        """Обновляет кадры, которые еще могут стать границами обрезки."""
+        energies = np.sum(np.square(frames, dtype=np.float64), axis=0)
+        for offset, energy in enumerate(energies.tolist()):
+            index = self.frames + offset
+            louder = energy > self._loudest
+            if louder:
+                self._loudest = energy
+                self._starts.append((index, energy))
+            # Кадр не последний звучащий, если за ним есть не тише
+            while self._ends and self._ends[-1][1] <= energy:
+                self._ends.pop()
+            self._ends.append((index, energy))
+            if louder:
+                while self._starts and not self._may_be_audible(self._starts[0][1]):
+                    self._starts.pop(0)
+            while self._ends and not self._may_be_audible(self._ends[-1][1]):
+                self._ends.pop()
+
+            # Граничным кадрам начала нужны отсчеты этого кадра и следующего
+            recent = [i for i, _ in self._starts[-2:]]
+            if (
+                index in recent
+                or index - 1 in recent
+                or (self._ends and self._ends[-1][0] == index)
+            ):
+                self._windows[index] = frames[:, offset].copy()
+        needed = {i for i, _ in self._ends}
+        needed.update(i + shift for i, _ in self._starts for shift in (0, 1))
+        self._windows = {i: w for i, w in self._windows.items() if i in needed}
+
+    def _may_be_audible(self, energy: float) -> bool:
+        """Может ли кадр с такой энергией оказаться выше порога TRIM_DB."""
+
+        def rms_db(value: float) -> float:
+            # Как librosa.amplitude_to_db(rms) с amin=1e-5
+            return 10 * np.log10(max(1e-10, value / self.n_fft))
+
+        margin = AudioConfig.TRIM_DB + self.TRIM_MARGIN_DB
+        return rms_db(energy) > rms_db(self._loudest) - margin
+
+    def _trimmed_frame(self, center: int, start: int, end: int) -> np.ndarray:
+        """Собирает кадр обрезанного сигнала y[start:end] из сохраненных отсчетов."""
+        half = self.n_fft // 2
+        frame = np.zeros(self.n_fft, dtype=np.float32)
+        lo, hi = max(center - half, start), min(center + half, end)
+        for index, window in self._windows.items():
+            offset = index * self.hop_length - half
+            a, b = max(lo, offset), min(hi, offset + self.n_fft)
+            if a < b:
+                frame[a - center + half : b - center + half] = window[
+                    a - offset : b - offset
+                ]
+        return frame
+
+
+def frame_power(frames: np.ndarray, window: np.ndarray) -> np.ndarray:
+    """Спектр мощности кадров (столбцов) так же, как в librosa.stft."""
+    # Окно float64 и спектр complex64 в порядке F, как в librosa.stft
+    spectrum = np.fft.rfft(window[:, np.newaxis] * frames, axis=0)
+    return np.abs(spectrum.astype(np.complex64, order="F")) ** 2
+
+
+def band_peaks(mel: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Номер полосы FREQ_BANDS с максимумом и его громкость в дБ для каждого кадра."""
+    db_mel = librosa.amplitude_to_db(mel, top_db=None)
+    return np.argmax(db_mel, axis=0).astype(np.uint8), db_mel.max(axis=0)
+
+
+def floored_contour(
+    bands: np.ndarray, peaks: np.ndarray, mel_max: np.floating
+) -> np.ndarray:
+    """
+    Строит мелодию по полосам и громкости максимумов кадров.
+
+    То же, что melody_contour по мелспектрограмме с порогом top_db от
+    максимума всей мелспектрограммы mel_max.
+    """
+    peak_db = librosa.amplitude_to_db(np.asarray([mel_max]), top_db=None)
+    floor = peak_db[0] - TOP_DB
+    loudest = np.maximum(peaks, floor)
+    audible = loudest >= 0
+    result = np.zeros(len(peaks), dtype=MELODY_DTYPE)
+    result["band"][audible] = np.where(peaks > floor, bands, 0)[audible]
+    result["db"][audible] = np.round(loudest[audible])
+    return result
+
+
+def melody_from_packed(melody: Sequence[float]) -> np.ndarray:
+    """Переводит упакованную мелодию (полоса + громкость / 100) в MELODY_DTYPE."""
+    packed = np.asarray(melody, dtype=np.float64)
+    result = np.empty(len(packed), dtype=MELODY_DTYPE)
+    result["band"] = np.floor(packed)
+    result["db"] = np.rint((packed % 1) * 100)
+    return result
+
+
+def as_melody(melody) -> np.ndarray:
+    """Возвращает мелодию в MELODY_DTYPE, распаковывая старый формат float."""
+    if isinstance(melody, np.ndarray) and melody.dtype == MELODY_DTYPE:
+        return melody
+    return melody_from_packed(melody)
+
+
+def audible_frames(melody: np.ndarray) -> np.ndarray:
+    """Возвращает маску кадров мелодии, в которых найден звук."""
+    melody = as_melody(melody)
+    return (melody["band"] != 0) | (melody["db"] != 0)
+
+
+def extract_reference_melody(
+    file_bytes: bytes, file_format: str = "mp3"
+) -> Tuple[Optional[np.ndarray], Optional[float]]:
+    """Извлекает мелодию эталона, используя кэш по содержимому файла."""
+    key = melody_cache_key(file_bytes, file_format)
+    cached = melody_cache.get(key)
+    if cached is not None:
+        logging.info("Мелодия эталона взята из кэша")
+        return cached
+
+    melody, min_per = extract_melody_from_audio(file_bytes, file_format=file_format)
+    if melody is not None:
+        melody_cache.put(key, melody, min_per)
+    return melody, min_per
 
 
 def synchronize_melodies(
-    teacher_melody: List[float],
-    children_melody: List[float],
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
     min_per_t: float,
     min_per_c: float,
-) -> Tuple[List[float], List[float], List[int], List[int], List[int], List[int]]:
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """Синхронизирует две мелодии."""
     logging.info("Начало синхронизации мелодий")
     try:
@@ -149,66 +918,175 @@ def synchronize_melodies(
 
 
 def extract_notes(
-    melody: List[float], min_per: float
-) -> Tuple[List[float], List[int], List[int]]:
+    melody: np.ndarray, min_per: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """Извлекает ноты из мелодии."""
     logging.debug("Начало извлечения нот")
-    counter = 0
-    all_notes = []
-    freq = []
-    lengths = []
-
     try:
-        for i in range(len(melody) - 1):
-            if floor(melody[i]) == floor(melody[i + 1]):
-                counter += 1
-            elif counter >= min_per:
-                all_notes.append(floor(melody[i]) + counter / 100)
-                freq.append(floor(melody[i]))
-                lengths.append(counter)
-                counter = 0
-
+        freq, lengths = segment_notes(melody, min_per)
+        all_notes = freq + lengths / 100
         logging.debug("Извлечение нот завершено, найдено %d нот", len(all_notes))
         return all_notes, freq, lengths
     except Exception as e:
         logging.error("Ошибка в extract_notes: %s", str(e))
-        return [], [], []
+        empty = np.zeros(0, dtype=np.int32)
+        return empty.astype(np.float64), empty, empty
+
+
+def segment_notes(melody: np.ndarray, min_per: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Выделяет ноты кодированием длин серий: возвращает полосы и длительности."""
+    freq, lengths, _ = segment_notes_with_ends(melody, min_per)
+    return freq, lengths
+
+
+def segment_notes_with_ends(
+    melody: np.ndarray, min_per: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    То же, что segment_notes, плюс номер последнего кадра каждой ноты.
+
+    Решение о ноте зависит только от кадров до ее конца, поэтому ноты,
+    следующие за нотой с концом end, совпадают с нотами melody[end + 1:].
+    """
+    bands = as_melody(melody)["band"].astype(np.int32)
+    empty = np.zeros(0, dtype=np.int32)
+    if len(bands) < 2:
+        return empty, empty, empty.astype(np.intp)
+
+    same = bands[:-1] == bands[1:]
+    boundaries = np.flatnonzero(~same)
+    if len(boundaries) == 0:
+        return empty, empty, empty.astype(np.intp)
+
+    # Накопленное число совпадений соседних кадров на каждой границе серии.
+    # Короткие серии (меньше min_per) не сбрасывают счетчик и прибавляются
+    # к следующей ноте, поэтому ноты ищем двоичным поиском по накоплениям.
+    steps = np.cumsum(same, dtype=np.int64)[boundaries]
+
+    emitted = []
+    start = 0
+    last_steps = 0
+    while start < len(boundaries):
+        k = max(start, int(np.searchsorted(steps, last_steps + min_per, side="left")))
+        if k >= len(boundaries):
+            break
+        emitted.append(k)
+        last_steps = steps[k]
+        start = k + 1
+
+    emitted = np.asarray(emitted, dtype=np.intp)
+    ends = boundaries[emitted]
+    freq = bands[ends]
+    lengths = np.diff(steps[emitted], prepend=0).astype(np.int32)
+    return freq, lengths, ends
+
+
+def align_melody_sequences(
+    all_t: np.ndarray,
+    all_c: np.ndarray,
+    freq_t: np.ndarray,
+    freq_c: np.ndarray,
+    t_m: np.ndarray,
+    c_m: np.ndarray,
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Выравнивает ноты способом, выбранным в AudioConfig.ALIGNMENT."""
+    if AudioConfig.ALIGNMENT == "dtw":
+        return dtw_melody_sequences(
+            freq_t, freq_c, t_m, c_m, teacher_melody, children_melody
+        )
+    if AudioConfig.ALIGNMENT != "pattern":
+        raise ValueError(f"Неизвестный режим выравнивания: {AudioConfig.ALIGNMENT}")
+    return compare_melody_sequences(
+        all_t, all_c, freq_t, freq_c, t_m, c_m, teacher_melody, children_melody
+    )
+
+
+def dtw_melody_sequences(
+    freq_t: np.ndarray,
+    freq_c: np.ndarray,
+    t_m: np.ndarray,
+    c_m: np.ndarray,
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Выравнивает ноты DTW в полосе Сакоэ-Чибы, заменяя пропуски заглушками."""
+    logging.info("Начало выравнивания нот DTW")
+    try:
+        freq_t, freq_c = np.asarray(freq_t), np.asarray(freq_c)
+        t_m, c_m = np.asarray(t_m), np.asarray(c_m)
+        teacher_melody = as_melody(teacher_melody)
+        children_melody = as_melody(children_melody)
+
+        index_t, index_c = align_notes(
+            freq_t, t_m, freq_c, c_m, AudioConfig.DTW_BAND, AudioConfig.DTW_GAP_COST
+        )
+        # Пропущенная или лишняя нота заменяется заглушкой длины 1 с полосой 6,
+        # как в compare_melody_sequences
+        t_m, freq_t = _take_aligned(t_m, index_t, 1), _take_aligned(freq_t, index_t, 6)
+        c_m, freq_c = _take_aligned(c_m, index_c, 1), _take_aligned(freq_c, index_c, 6)
+
+        teacher_melody, children_melody = extend_to_max_length(
+            teacher_melody, children_melody, 0
+        )
+        return teacher_melody, children_melody, freq_t, freq_c, t_m, c_m
+    except Exception as e:
+        logging.error("Ошибка в dtw_melody_sequences: %s", str(e))
+        return teacher_melody, children_melody, freq_t, freq_c, t_m, c_m
+
+
+def _take_aligned(values: np.ndarray, index: np.ndarray, gap_value: int) -> np.ndarray:
+    """Берет значения по индексам выравнивания, подставляя gap_value вместо -1."""
+    if not len(values):
+        return np.full(len(index), gap_value, dtype=np.int32)
+    return np.where(index < 0, gap_value, values[index])
 
 
 def compare_melody_sequences(
-    all_t: List[float],
-    all_c: List[float],
-    freq_t: List[int],
-    freq_c: List[int],
-    t_m: List[int],
-    c_m: List[int],
-    teacher_melody: List[float],
-    children_melody: List[float],
-) -> Tuple[List[float], List[float], List[int], List[int], List[int], List[int]]:
+    all_t: np.ndarray,
+    all_c: np.ndarray,
+    freq_t: np.ndarray,
+    freq_c: np.ndarray,
+    t_m: np.ndarray,
+    c_m: np.ndarray,
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """Сравнивает последовательности нот."""
     logging.info("Начало проверки последовательностей нот")
     exec_t, exec_c = [], []
 
     try:
+        all_t, all_c = np.asarray(all_t), np.asarray(all_c)
+        freq_t, freq_c = np.asarray(freq_t), np.asarray(freq_c)
+        t_m, c_m = np.asarray(t_m), np.asarray(c_m)
+        teacher_melody = as_melody(teacher_melody)
+        children_melody = as_melody(children_melody)
+
         if len(all_t) != len(all_c):
             for i in range(min(len(all_t), len(all_c)) - 3):
-                if all_c[i] != all_t[i] and all_c[i + 1 : i + 3] == all_t[i : i + 2]:
-                    exec_c.append(i + all_c[i] % 1)
-                elif all_c[i] != all_t[i] and all_c[i : i + 2] == all_t[i + 1 : i + 3]:
-                    exec_t.append(i + all_t[i] % 1)
+                if all_c[i] == all_t[i]:
+                    continue
+                if np.array_equal(all_c[i + 1 : i + 3], all_t[i : i + 2]):
+                    exec_c.append(i)
+                elif np.array_equal(all_c[i : i + 2], all_t[i + 1 : i + 3]):
+                    exec_t.append(i)
 
-        for idx in exec_c:
-            idx = floor(idx)
-            t_m.insert(idx, 1)
-            freq_t.insert(idx, 6)
+        # Позиции вставки заданы для списка, в который уже вставлены
+        # предыдущие элементы, поэтому переводим их в индексы исходного массива
+        if exec_c:
+            positions = np.asarray(exec_c) - np.arange(len(exec_c))
+            t_m = np.insert(t_m, positions, 1)
+            freq_t = np.insert(freq_t, positions, 6)
 
-        for idx in exec_t:
-            idx = floor(idx)
-            c_m.insert(idx, 1)
-            freq_c.insert(idx, 6)
+        if exec_t:
+            positions = np.asarray(exec_t) - np.arange(len(exec_t))
+            c_m = np.insert(c_m, positions, 1)
+            freq_c = np.insert(freq_c, positions, 6)
 
         teacher_melody, children_melody = extend_to_max_length(
-            teacher_melody, children_melody, 0.0
+            teacher_melody, children_melody, 0
         )
         freq_t, freq_c = extend_to_max_length(freq_t, freq_c, 0)
         t_m, c_m = extend_to_max_length(t_m, c_m, 1)
@@ -224,14 +1102,33 @@ def extend_to_max_length(
 ) -> Tuple[List, List]:
     """Расширяет списки до одинаковой максимальной длины."""
     max_length = max(len(list1), len(list2))
+    if isinstance(list1, np.ndarray) or isinstance(list2, np.ndarray):
+        return (
+            _pad_array(np.asarray(list1), max_length, fill_value),
+            _pad_array(np.asarray(list2), max_length, fill_value),
+        )
     list1.extend([fill_value] * (max_length - len(list1)))
     list2.extend([fill_value] * (max_length - len(list2)))
     return list1, list2
 
 
-def normalize_melody(melody: List[float]) -> List[int]:
+def _pad_array(array: np.ndarray, length: int, fill_value: float) -> np.ndarray:
+    """Дополняет массив значением fill_value до длины length."""
+    if len(array) >= length:
+        return array
+    return np.concatenate(
+        [array, np.full(length - len(array), fill_value, dtype=array.dtype)]
+    )
+
+
+def normalize_melody(melody: np.ndarray) -> List[int]:
     """Нормализует мелодию в целые числа."""
-    return [round((y % 1) * 100) for y in melody]
+    return normalize_melody_array(melody).tolist()
+
+
+def normalize_melody_array(melody: np.ndarray) -> np.ndarray:
+    """Выделяет покадровую громкость мелодии как целые числа."""
+    return as_melody(melody)["db"].astype(np.int64)
 
 
 def calculate_loudness(
@@ -241,43 +1138,67 @@ def calculate_loudness(
     children_melody: List[int],
 ) -> List[int]:
     """Вычисляет метрику громкости."""
-    res_loud = []
-    counter_t, counter_c = 0, 0
-    for i in range(len(t_m)):
-        t_sum = sum(teacher_melody[counter_t : counter_t + t_m[i]])
-        c_sum = sum(children_melody[counter_c : counter_c + c_m[i]])
-        if (
-            t_sum != 0
-            and abs(1 - (c_sum / c_m[i]) / (t_sum / t_m[i]))
-            <= AudioConfig.LOUDNESS_THRESHOLD
-        ):
-            res_loud.extend([0] * c_m[i])
-        else:
-            res_loud.extend([1] * c_m[i])
-        counter_t += t_m[i]
-        counter_c += c_m[i]
-    return res_loud
+    return calculate_loudness_array(t_m, c_m, teacher_melody, children_melody).tolist()
 
 
 def calculate_rhythm(t_m: List[int], c_m: List[int]) -> List[int]:
     """Вычисляет метрику ритма."""
-    res_rhythm = []
-    for i in range(len(t_m)):
-        if abs((t_m[i] - c_m[i]) / t_m[i]) <= AudioConfig.RHYTHM_THRESHOLD:
-            res_rhythm += [0] * c_m[i]
-        else:
-            res_rhythm += [0] * min(t_m[i], c_m[i]) + [1] * abs(c_m[i] - t_m[i])
-    return res_rhythm
+    return calculate_rhythm_array(t_m, c_m).tolist()
 
 
 def calculate_frequency(
     freq_t: List[int], freq_c: List[int], c_m: List[int]
 ) -> List[int]:
     """Вычисляет метрику частоты."""
-    res_frequency = []
-    for i in range(len(freq_t)):
-        res_frequency += [0] * c_m[i] if freq_t[i] == freq_c[i] else [1] * c_m[i]
-    return res_frequency
+    return calculate_frequency_array(freq_t, freq_c, c_m).tolist()
+
+
+def _segment_sums(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Суммирует подряд идущие отрезки values заданных длин через префиксные суммы."""
+    prefix = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    n = len(values)
+    return prefix[np.minimum(ends, n)] - prefix[np.minimum(starts, n)]
+
+
+def calculate_loudness_array(
+    t_m: np.ndarray,
+    c_m: np.ndarray,
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
+) -> np.ndarray:
+    """Вычисляет покадровые ошибки громкости для каждой ноты ребенка."""
+    t_m = np.asarray(t_m, dtype=np.int64)
+    c_m = np.asarray(c_m, dtype=np.int64)[: len(t_m)]
+    t_sum = _segment_sums(np.asarray(teacher_melody, dtype=np.int64), t_m)
+    c_sum = _segment_sums(np.asarray(children_melody, dtype=np.int64), c_m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = np.abs(1 - (c_sum / c_m) / (t_sum / t_m))
+    matches = (t_sum != 0) & (deviation <= AudioConfig.LOUDNESS_THRESHOLD)
+    return np.repeat((~matches).astype(np.int8), c_m)
+
+
+def calculate_rhythm_array(t_m: np.ndarray, c_m: np.ndarray) -> np.ndarray:
+    """Вычисляет покадровые ошибки ритма: лишние или недостающие кадры ноты."""
+    t_m = np.asarray(t_m, dtype=np.int64)
+    c_m = np.asarray(c_m, dtype=np.int64)[: len(t_m)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matches = np.abs((t_m - c_m) / t_m) <= AudioConfig.RHYTHM_THRESHOLD
+    correct = np.where(matches, c_m, np.minimum(t_m, c_m))
+    wrong = np.where(matches, 0, np.abs(c_m - t_m))
+    values = np.tile(np.array([0, 1], dtype=np.int8), len(t_m))
+    return np.repeat(values, np.column_stack((correct, wrong)).ravel())
+
+
+def calculate_frequency_array(
+    freq_t: np.ndarray, freq_c: np.ndarray, c_m: np.ndarray
+) -> np.ndarray:
+    """Вычисляет покадровые ошибки высоты для каждой ноты ребенка."""
+    freq_t = np.asarray(freq_t)
+    n = len(freq_t)
+    mismatches = (freq_t != np.asarray(freq_c)[:n]).astype(np.int8)
+    return np.repeat(mismatches, np.asarray(c_m, dtype=np.int64)[:n])
 
 
 def calculate_average_volume(children_melody: List[int]) -> List[float]:
@@ -289,8 +1210,8 @@ def calculate_average_volume(children_melody: List[int]) -> List[float]:
 def calculate_integral_indicator(total_errors: List[int]) -> float:
     """Вычисляет интегральный показатель."""
     integral_indicator = 1
-    if total_errors:
-        integral_indicator -= round(sum(total_errors) / len(total_errors), 2)
+    if len(total_errors):
+        integral_indicator -= round(int(np.sum(total_errors)) / len(total_errors), 2)
     return integral_indicator
 
 
@@ -299,27 +1220,24 @@ def compare(
     c_m: List[int],
     freq_t: List[int],
     freq_c: List[int],
-    teacher_melody: List[float],
-    children_melody: List[float],
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
     time_c: float,
 ) -> Tuple[float, List[int], List[int], List[int], List[float]]:
     """Сравнивает мелодии и возвращает метрики."""
     logging.info("Начало финального сравнения мелодий")
     try:
-        teacher_melody = normalize_melody(teacher_melody)
-        children_melody = normalize_melody(children_melody)
-
-        res_loud = calculate_loudness(t_m, c_m, teacher_melody, children_melody)
-        res_rhythm = calculate_rhythm(t_m, c_m)
-        res_frequency = calculate_frequency(freq_t, freq_c, c_m)
-        res_average = calculate_average_volume(children_melody)
-
-        total_errors = res_rhythm + res_frequency
-        integral_indicator = calculate_integral_indicator(total_errors)
+        with stage("scoring"):
+            integral_indicator, res_rhythm, res_frequency, res_loud, res_average = (
+                score_melodies(
+                    t_m, c_m, freq_t, freq_c, teacher_melody, children_melody
+                )
+            )
 
-        rhythm = process_characteristics(res_rhythm, time_c)
-        height = process_characteristics(res_frequency, time_c)
-        volume1 = process_characteristics(res_loud, time_c)
+        with stage("process_characteristics"):
+            rhythm, height, volume1 = process_characteristics_batch(
+                (res_rhythm, res_frequency, res_loud), time_c
+            )
 
         logging.info("Финальное сравнение завершено")
         return integral_indicator, rhythm, height, volume1, res_average
@@ -328,31 +1246,70 @@ def compare(
         return 0.0, [], [], [], []
 
 
-def process_characteristics(x: List[int], time: float) -> List[int]:
-    """Обрабатывает характеристики во временные интервалы."""
-    logging.debug("Начало обработки характеристик")
-    y = []
-    time = round(time, 2)
-    count_of_values = round(time * AudioConfig.TIME_FACTOR)
+def score_melodies(
+    t_m: np.ndarray,
+    c_m: np.ndarray,
+    freq_t: np.ndarray,
+    freq_c: np.ndarray,
+    teacher_melody: np.ndarray,
+    children_melody: np.ndarray,
+) -> Tuple[float, np.ndarray, np.ndarray, np.ndarray, List[float]]:
+    """Вычисляет покадровые ошибки ритма, высоты и громкости и интегральный показатель."""
+    teacher_melody = normalize_melody_array(teacher_melody)
+    children_melody = normalize_melody_array(children_melody)
 
-    try:
-        if count_of_values == 0:
-            logging.warning("Время равно нулю, возвращаем пустой список")
-            return y
+    res_loud = calculate_loudness_array(t_m, c_m, teacher_melody, children_melody)
+    res_rhythm = calculate_rhythm_array(t_m, c_m)
+    res_frequency = calculate_frequency_array(freq_t, freq_c, c_m)
+    res_average = calculate_average_volume(children_melody.tolist())
 
-        while len(x) >= count_of_values:
-            c = sum(x[:count_of_values]) / count_of_values
-            y.append(1 if c > 0.5 else 0)
-            x = x[count_of_values:]
+    total_errors = np.concatenate((res_rhythm, res_frequency))
+    integral_indicator = calculate_integral_indicator(total_errors)
+    return integral_indicator, res_rhythm, res_frequency, res_loud, res_average
 
-        if x:
-            c = sum(x) / len(x)
-            y.append(1 if c > 0.5 else 0)
 
+def process_characteristics(x: List[int], time: float) -> List[int]:
+    """Обрабатывает характеристики во временные интервалы."""
+    logging.debug("Начало обработки характеристик")
+    try:
+        y = process_characteristics_batch([x], time)[0]
         logging.debug(
             "Обработка характеристик завершена, результат: %d значений", len(y)
         )
         return y
     except Exception as e:
         logging.error("Ошибка в process_characteristics: %s", str(e))
-        return []
\ No newline at end of file
+        return []
+
+
+def process_characteristics_batch(
+    series: Sequence[Sequence[int]], time: float
+) -> List[List[int]]:
+    """Обрабатывает несколько характеристик во временные интервалы за один проход."""
+    time = round(time, 2)
+    count_of_values = round(time * AudioConfig.TIME_FACTOR)
+    if count_of_values <= 0:
+        logging.warning("Время равно нулю, возвращаем пустой список")
+        return [[] for _ in series]
+
+    arrays = [np.asarray(x) for x in series]
+    lengths = np.array([len(x) for x in arrays], dtype=np.int64)
+    if not lengths.sum():
+        return [[] for _ in series]
+
+    # Начала окон каждой характеристики в общем массиве; последнее окно
+    # характеристики может быть неполным
+    offsets = np.cumsum(lengths) - lengths
+    windows = -(-lengths // count_of_values)
+    window_owner = np.repeat(np.arange(len(arrays)), windows)
+    window_index = np.arange(windows.sum()) - np.repeat(
+        np.cumsum(windows) - windows, windows
+    )
+    starts = offsets[window_owner] + window_index * count_of_values
+    sizes = np.minimum(
+        count_of_values, lengths[window_owner] - window_index * count_of_values
+    )
+
+    sums = np.add.reduceat(np.concatenate(arrays), starts, dtype=np.int64)
+    flags = (sums / sizes > 0.5).astype(np.int8)
+    return [chunk.tolist() for chunk in np.split(flags, np.cumsum(windows)[:-1])]
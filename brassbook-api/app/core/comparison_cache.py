@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+import numpy as np
+from prometheus_client import Counter
+
+from app.core.compare_melodies import as_melody, audio_config_fingerprint
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ComparisonKey = Tuple[str, str, str]
+
+comparison_cache_requests = Counter(
+    "brassbook_comparison_cache_requests_total",
+    "Comparison requests by cache outcome",
+    ["outcome"],
+)
+
+
+def melody_digest(melody: np.ndarray, min_per: float) -> str:
+    """
+    Hash an analysed reference melody.
+
+    Catalog references and uploaded references both reach the comparison
+    as a melody, so hashing it identifies the reference either way.
+
+    Args:
+        melody: Reference melody.
+        min_per: Minimal note length of the reference.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256(as_melody(melody).tobytes())
+    digest.update(np.float64(min_per).tobytes())
+    return digest.hexdigest()
+
+
+def comparison_key(
+    teacher_melody: np.ndarray, min_per_t: float, recording: bytes, file_format: str
+) -> ComparisonKey:
+    """
+    Build the cache key of a comparison.
+
+    Args:
+        teacher_melody: Reference melody.
+        min_per_t: Minimal note length of the reference.
+        recording: Student recording contents.
+        file_format: Recording container format.
+
+    Returns:
+        ComparisonKey: Reference hash, recording hash and AudioConfig version.
+    """
+    recording_digest = hashlib.sha256(recording).hexdigest()
+    return (
+        melody_digest(teacher_melody, min_per_t),
+        f"{recording_digest}:{file_format}",
+        audio_config_fingerprint(),
+    )
+
+
+class ComparisonResultCache(Generic[T]):
+    """
+    TTL- and size-bounded cache of comparison results with request coalescing.
+
+    Identical comparisons submitted while one is running wait for that
+    computation instead of starting their own. The computation runs as a
+    separate task, so a caller that goes away does not cancel it for the
+    others. Only non-None results are cached; failures reach every waiter
+    and are not remembered.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[ComparisonKey, Tuple[float, T]]" = OrderedDict()
+        self._inflight: Dict[ComparisonKey, "asyncio.Task[Optional[T]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    async def run(
+        self, key: ComparisonKey, compute: Callable[[], Awaitable[Optional[T]]]
+    ) -> Optional[T]:
+        """
+        Return the cached result for ``key`` or compute it once.
+
+        Args:
+            key: Key built by comparison_key().
+            compute: Coroutine factory producing the result.
+
+        Returns:
+            Optional[T]: Result shared by all callers with the same key.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            comparison_cache_requests.labels("hit").inc()
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            comparison_cache_requests.labels("miss").inc()
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            comparison_cache_requests.labels("coalesced").inc()
+            logger.debug("Joining in-flight comparison")
+        return await asyncio.shield(task)
+
+    def get(self, key: ComparisonKey) -> Optional[T]:
+        """Return a fresh cached result or None."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return result
+
+    def put(self, key: ComparisonKey, result: T) -> None:
+        """Store a result, evicting the least recently used entries."""
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic(), result)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop cached results and reset the counters."""
+        self._data.clear()
+        self.hits = self.misses = self.coalesced = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss, coalescing and eviction counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "inflight": len(self._inflight),
+            "maxsize": self.maxsize,
+        }
+
+    def _finish(self, key: ComparisonKey, task: "asyncio.Task[Optional[T]]") -> None:
+        """Cache the outcome of a finished computation."""
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.debug("Comparison failed, not cached: %s", task.exception())
+            return
+        if task.result() is not None:
+            self.put(key, task.result())
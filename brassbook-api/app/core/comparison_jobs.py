@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.config import COMPARE_JOB_TTL
+from app.core.analysis_executor import (
+    AnalysisExecutor,
+    ComparisonResult,
+    analysis_executor,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class ComparisonJob:
+    """State of a background melody comparison, visible only to its owner."""
+
+    def __init__(self, job_id: str, owner_id: int, task: "asyncio.Task"):
+        self.id = job_id
+        self.owner_id = owner_id
+        self.task = task
+        self.status = JOB_PENDING
+        self.result: Optional[ComparisonResult] = None
+        self.finished_at: Optional[float] = None
+
+
+class ComparisonJobStore:
+    """
+    In-memory registry of background comparisons.
+
+    Jobs are submitted to the analysis executor immediately; finished jobs
+    are kept for ``ttl`` seconds after completion and then forgotten. A job
+    is only returned to the user who submitted it.
+    """
+
+    def __init__(self, executor: AnalysisExecutor, ttl: float):
+        self.executor = executor
+        self.ttl = ttl
+        self._jobs: Dict[str, ComparisonJob] = {}
+
+    def submit(
+        self,
+        owner_id: int,
+        file1: bytes,
+        file2: bytes,
+        file1_format: str = "mp3",
+        file2_format: str = "webm",
+    ) -> ComparisonJob:
+        """
+        Start a comparison in the background.
+
+        Args:
+            owner_id: Id of the submitting user.
+            file1: Reference audio file contents.
+            file2: Student recording contents.
+            file1_format: Reference container format.
+            file2_format: Recording container format.
+
+        Returns:
+            ComparisonJob: The new pending job.
+
+        Raises:
+            ExecutorBusyError: If the analysis queue is full.
+        """
+        self._purge_expired()
+        task = self.executor.start_compare(file1, file2, file1_format, file2_format)
+        return self._track(owner_id, task)
+
+    def submit_with_melody(
+        self,
+        owner_id: int,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file2: bytes,
+        file2_format: str = "webm",
+    ) -> ComparisonJob:
+        """
+        Start a comparison with an already analysed reference in the background.
+
+        Args:
+            owner_id: Id of the submitting user.
+            teacher_melody: Reference melody, e.g. from the reference catalog.
+            min_per_t: Minimal note length of the reference.
+            file2: Student recording contents.
+            file2_format: Recording container format.
+
+        Returns:
+            ComparisonJob: The new pending job.
+
+        Raises:
+            ExecutorBusyError: If the analysis queue is full.
+        """
+        self._purge_expired()
+        task = self.executor.start_compare_with_melody(
+            teacher_melody, min_per_t, file2, file2_format
+        )
+        return self._track(owner_id, task)
+
+    def get(self, job_id: str, owner_id: int) -> Optional[ComparisonJob]:
+        """
+        Look up a job of a user by id.
+
+        Args:
+            job_id: Identifier returned by submit().
+            owner_id: Id of the user asking for the job.
+
+        Returns:
+            Optional[ComparisonJob]: The job, or None if unknown, expired or
+            submitted by another user.
+        """
+        self._purge_expired()
+        job = self._jobs.get(job_id)
+        if job is None or job.owner_id != owner_id:
+            return None
+        return job
+
+    def _track(self, owner_id: int, task: "asyncio.Task") -> ComparisonJob:
+        """Register a started comparison task as a new job."""
+        job = ComparisonJob(str(uuid.uuid4()), owner_id, task)
+        task.add_done_callback(lambda done: self._finish(job, done))
+        self._jobs[job.id] = job
+        logger.info("Comparison job submitted: %s", job.id)
+        return job
+
+    def _finish(self, job: ComparisonJob, task: "asyncio.Task") -> None:
+        """Record the outcome of a finished job."""
+        job.finished_at = time.monotonic()
+        if task.cancelled():
+            job.status = JOB_FAILED
+        elif task.exception() is not None:
+            logger.error("Comparison job %s failed: %s", job.id, task.exception())
+            job.status = JOB_FAILED
+        else:
+            job.result = task.result()
+            job.status = JOB_FAILED if job.result is None else JOB_DONE
+        logger.info("Comparison job %s finished: %s", job.id, job.status)
+
+    def _purge_expired(self) -> None:
+        """Drop finished jobs older than the TTL."""
+        deadline = time.monotonic() - self.ttl
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+comparison_jobs = ComparisonJobStore(analysis_executor, COMPARE_JOB_TTL)
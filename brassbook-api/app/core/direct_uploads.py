@@ -0,0 +1,240 @@
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import MAX_FILE_SIZE, MINIO_PUBLIC_URL, UPLOAD_URL_EXPIRES
+from app.data.models import Recording, User
+from app.data.storage import ObjectStorage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class UploadKind:
+    """Where uploads of one kind go and what they may contain."""
+
+    prefix: str
+    content_types: Dict[str, str]  # MIME type -> file extension
+    max_size: int
+
+
+UPLOAD_KINDS = {
+    "avatar": UploadKind(
+        prefix="avatars",
+        content_types={"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"},
+        max_size=MAX_FILE_SIZE,
+    ),
+    "recording": UploadKind(
+        prefix="recordings",
+        content_types={"audio/webm": "webm", "audio/mpeg": "mp3", "audio/wav": "wav"},
+        max_size=MAX_FILE_SIZE,
+    ),
+}
+
+
+def upload_kind(kind: str) -> UploadKind:
+    """
+    Look up an upload kind.
+
+    Raises:
+        HTTPException: If the kind is unknown.
+    """
+    if kind not in UPLOAD_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown upload kind: {kind}")
+    return UPLOAD_KINDS[kind]
+
+
+def object_name_for(kind: str, user_id: int, content_type: str) -> str:
+    """
+    Choose the object name of a new direct upload.
+
+    The name is generated by the server and scoped to the user, so a client
+    can only confirm uploads it was allowed to make.
+
+    Raises:
+        HTTPException: If the kind or the content type is not allowed.
+    """
+    settings = upload_kind(kind)
+    extension = settings.content_types.get(content_type)
+    if extension is None:
+        raise HTTPException(
+            status_code=400, detail=f"Content type not allowed: {content_type}"
+        )
+    return f"{settings.prefix}/{user_id}/{uuid.uuid4().hex}.{extension}"
+
+
+def kind_of(object_name: str, user_id: int) -> str:
+    """
+    Return the kind of an object uploaded by the user.
+
+    Raises:
+        HTTPException: If the object is not a direct upload of this user.
+    """
+    for kind, settings in UPLOAD_KINDS.items():
+        if object_name.startswith(f"{settings.prefix}/{user_id}/"):
+            return kind
+    logger.warning("User %s cannot confirm object %s", user_id, object_name)
+    raise HTTPException(status_code=403, detail="Upload does not belong to the user")
+
+
+async def start_upload(
+    storage: ObjectStorage, user: User, kind: str, content_type: str
+) -> Dict[str, Union[str, int, Dict[str, str]]]:
+    """
+    Issue a presigned form for uploading straight to MinIO.
+
+    Args:
+        storage: Object storage the file is uploaded to.
+        user: Uploading user.
+        kind: "avatar" or "recording".
+        content_type: MIME type of the file.
+
+    Returns:
+        dict: Form ``url`` and ``fields``, the ``object_name`` to confirm
+        afterwards and the policy expiry as a Unix timestamp.
+
+    Raises:
+        HTTPException: If the kind or the content type is not allowed.
+    """
+    object_name = object_name_for(kind, user.id, content_type)
+    fields = await storage.presigned_post(
+        object_name, content_type, upload_kind(kind).max_size, UPLOAD_URL_EXPIRES
+    )
+    logger.info("Direct %s upload issued: %s", kind, object_name)
+    return {
+        "url": f"{MINIO_PUBLIC_URL.rstrip('/')}/{storage.bucket}",
+        "fields": fields,
+        "object_name": object_name,
+        "expires_at": int(time.time()) + UPLOAD_URL_EXPIRES,
+    }
+
+
+async def confirm_upload(
+    db: Session, storage: ObjectStorage, user: User, object_name: str
+) -> Dict[str, Optional[Union[str, int]]]:
+    """
+    Record a finished direct upload in the database.
+
+    An avatar becomes the user's photo; a recording gets a row in the
+    ``recordings`` table. Confirming the same recording again returns the
+    existing row.
+
+    Args:
+        db: SQLAlchemy database session.
+        storage: Object storage holding the upload.
+        user: Uploading user.
+        object_name: Name returned by start_upload().
+
+    Returns:
+        dict: ``kind``, ``object_name`` and, for recordings, ``recording_id``.
+
+    Raises:
+        HTTPException: If the object belongs to another user, was not
+            uploaded, or does not match the allowed types and size.
+    """
+    kind = kind_of(object_name, user.id)
+    settings = UPLOAD_KINDS[kind]
+    stat = await storage.stat(object_name)
+    if stat is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if stat.content_type not in settings.content_types or stat.size > settings.max_size:
+        logger.warning("Rejected direct upload %s: %s", object_name, stat.content_type)
+        raise HTTPException(status_code=400, detail="Uploaded file is not allowed")
+
+    recording = None
+    if kind == "avatar":
+        user.photo_url = f"/{storage.bucket}/{object_name}"
+        user.photo_sizes = None
+    else:
+        recording = (
+            db.query(Recording).filter(Recording.object_name == object_name).first()
+        )
+        if recording is None:
+            recording = Recording(
+                user_id=user.id,
+                object_name=object_name,
+                content_type=stat.content_type,
+                size=stat.size,
+            )
+            db.add(recording)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent confirm recorded the same recording after our lookup
+        db.rollback()
+        recording = (
+            db.query(Recording).filter(Recording.object_name == object_name).first()
+        )
+        if recording is None:
+            raise HTTPException(status_code=500, detail="Database commit failed")
+        logger.info("Recording confirmed concurrently: %d", recording.id)
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Database commit failed")
+    logger.info("Direct %s upload confirmed: %s", kind, object_name)
+    return {
+        "kind": kind,
+        "object_name": object_name,
+        "recording_id": None if recording is None else recording.id,
+    }
+
+
+def find_recording(db: Session, user: User, recording_id: int) -> Tuple[str, str]:
+    """
+    Look up a confirmed recording of the user without reading it.
+
+    Args:
+        db: SQLAlchemy database session.
+        user: User asking for the recording.
+        recording_id: Id returned by confirm_upload().
+
+    Returns:
+        Tuple[str, str]: Object name and container format ("webm", "mp3" or
+        "wav").
+
+    Raises:
+        HTTPException: If the recording does not exist or belongs to another
+            user.
+    """
+    recording = db.get(Recording, recording_id)
+    if recording is None:
+        logger.warning("Recording not found: %s", recording_id)
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if recording.user_id != user.id:
+        logger.warning("User %s cannot read recording %s", user.id, recording_id)
+        raise HTTPException(
+            status_code=403, detail="Recording does not belong to the user"
+        )
+    file_format = UPLOAD_KINDS["recording"].content_types[recording.content_type]
+    return recording.object_name, file_format
+
+
+async def load_recording(
+    db: Session, storage: ObjectStorage, user: User, recording_id: int
+) -> Tuple[bytes, str]:
+    """
+    Read a confirmed recording of the user, e.g. to compare it with a reference.
+
+    Args:
+        db: SQLAlchemy database session.
+        storage: Object storage holding the recording.
+        user: User asking for the recording.
+        recording_id: Id returned by confirm_upload().
+
+    Returns:
+        Tuple[bytes, str]: File contents and container format ("webm", "mp3"
+        or "wav").
+
+    Raises:
+        HTTPException: If the recording does not exist or belongs to another
+            user.
+    """
+    object_name, file_format = find_recording(db, user, recording_id)
+    return await storage.get_bytes(object_name), file_format
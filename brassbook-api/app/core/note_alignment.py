@@ -0,0 +1,145 @@
+import functools
+import math
+from typing import Callable, Tuple
+
+import numpy as np
+
+# Backtracking moves stored for every cell of the band
+_MATCH, _SKIPPED, _EXTRA = 1, 2, 3
+
+
+def band_radius(n_teacher: int, n_children: int, band: int) -> int:
+    """
+    Return the Sakoe-Chiba radius used for two note sequences.
+
+    The band follows the diagonal from (0, 0) to (n_teacher, n_children), so
+    it is widened to the slope of that line to keep neighbouring rows
+    connected when one sequence has many more notes than the other.
+
+    Args:
+        n_teacher: Number of reference notes.
+        n_children: Number of recorded notes.
+        band: Configured radius in notes.
+
+    Returns:
+        int: Radius in notes.
+    """
+    slope = n_children / n_teacher if n_teacher else n_children
+    return max(1, band, math.ceil(slope))
+
+
+def _banded_dtw(freq_t, len_t, freq_c, len_c, radius, gap_cost):
+    n, m = len(freq_t), len(freq_c)
+    lo = np.empty(n + 1, dtype=np.int64)
+    hi = np.empty(n + 1, dtype=np.int64)
+    for i in range(n + 1):
+        center = i * m / n
+        lo[i] = max(0, int(math.floor(center - radius)))
+        hi[i] = min(m, int(math.ceil(center + radius)))
+    width = int((hi - lo).max()) + 1
+
+    cost = np.full((n + 1, width), np.inf)
+    moves = np.zeros((n + 1, width), dtype=np.uint8)
+    cost[0, 0] = 0.0
+    for i in range(n + 1):
+        for j in range(lo[i], hi[i] + 1):
+            if i == 0 and j == 0:
+                continue
+            best = np.inf
+            move = 0
+            if i > 0 and j > 0 and lo[i - 1] <= j - 1 <= hi[i - 1]:
+                note_cost = 0.0 if freq_t[i - 1] == freq_c[j - 1] else 1.0
+                note_cost += min(
+                    1.0, abs(len_t[i - 1] - len_c[j - 1]) / max(len_t[i - 1], 1)
+                )
+                candidate = cost[i - 1, j - 1 - lo[i - 1]] + note_cost
+                if candidate < best:
+                    best, move = candidate, _MATCH
+            if i > 0 and lo[i - 1] <= j <= hi[i - 1]:
+                candidate = cost[i - 1, j - lo[i - 1]] + gap_cost
+                if candidate < best:
+                    best, move = candidate, _SKIPPED
+            if j > lo[i]:
+                candidate = cost[i, j - 1 - lo[i]] + gap_cost
+                if candidate < best:
+                    best, move = candidate, _EXTRA
+            cost[i, j - lo[i]] = best
+            moves[i, j - lo[i]] = move
+
+    teacher_index = np.empty(n + m, dtype=np.int64)
+    children_index = np.empty(n + m, dtype=np.int64)
+    size = 0
+    i, j = n, m
+    while i > 0 or j > 0:
+        move = moves[i, j - lo[i]]
+        if move == _MATCH:
+            i -= 1
+            j -= 1
+            teacher_index[size], children_index[size] = i, j
+        elif move == _SKIPPED:
+            i -= 1
+            teacher_index[size], children_index[size] = i, -1
+        else:
+            j -= 1
+            teacher_index[size], children_index[size] = -1, j
+        size += 1
+    return teacher_index[:size][::-1].copy(), children_index[:size][::-1].copy()
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_kernel() -> Callable:
+    """
+    Compile the DTW kernel on first use.
+
+    numba is imported here rather than at module load so processes that never
+    align notes do not pay for it; ``cache=True`` stores the machine code on
+    disk (NUMBA_CACHE_DIR or __pycache__), so new and recycled workers load it
+    instead of compiling again.
+    """
+    import numba
+
+    return numba.njit(nogil=True, cache=True)(_banded_dtw)
+
+
+def align_notes(
+    freq_t: np.ndarray,
+    len_t: np.ndarray,
+    freq_c: np.ndarray,
+    len_c: np.ndarray,
+    band: int,
+    gap_cost: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Align two note sequences with Sakoe-Chiba banded dynamic time warping.
+
+    A note pair costs 1 for a different band plus the relative length error
+    (capped at 1); leaving a note unmatched costs ``gap_cost``. Only cells
+    within ``band`` notes of the diagonal are evaluated, so time and memory
+    are O(n * band).
+
+    Args:
+        freq_t: Reference note bands.
+        len_t: Reference note lengths in frames.
+        freq_c: Recorded note bands.
+        len_c: Recorded note lengths in frames.
+        band: Sakoe-Chiba radius in notes.
+        gap_cost: Cost of a skipped or an extra note.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Indices of the aligned reference and
+        recorded notes, -1 where the other sequence has no counterpart.
+    """
+    n, m = len(freq_t), len(freq_c)
+    if n == 0 or m == 0:
+        return (
+            np.concatenate((np.arange(n), np.full(m, -1))).astype(np.int64),
+            np.concatenate((np.full(n, -1), np.arange(m))).astype(np.int64),
+        )
+    return _compiled_kernel()(
+        np.ascontiguousarray(freq_t, dtype=np.int64),
+        np.ascontiguousarray(len_t, dtype=np.int64),
+        np.ascontiguousarray(freq_c, dtype=np.int64),
+        np.ascontiguousarray(len_c, dtype=np.int64),
+        band_radius(n, m, band),
+        float(gap_cost),
+    )
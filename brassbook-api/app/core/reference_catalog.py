@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.analysis_executor import AnalysisExecutor, analysis_executor
+from app.core.compare_melodies import (
+    audio_config_fingerprint,
+    melody_cache,
+    melody_from_bytes,
+    melody_to_bytes,
+)
+from app.data.models import ReferenceTrack
+from app.data.storage import ObjectStorage, object_storage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+AUDIO_CONTENT_TYPES = {"mp3": "audio/mpeg", "webm": "audio/webm", "wav": "audio/wav"}
+
+
+class ReferenceAnalysisError(ValueError):
+    """Raised when a reference track cannot be analysed."""
+
+
+def reference_cache_key(reference_id: int) -> str:
+    """Key of a catalog reference in the melody cache."""
+    return f"reference:{reference_id}:{audio_config_fingerprint()}"
+
+
+def features_object_name(digest: str) -> str:
+    """MinIO object holding the melody extracted with the current AudioConfig."""
+    return f"references/{digest}/{audio_config_fingerprint()}.npz"
+
+
+def list_references(db: Session) -> List[ReferenceTrack]:
+    """
+    Return all registered reference tracks, newest first.
+
+    Args:
+        db: SQLAlchemy database session.
+
+    Returns:
+        List[ReferenceTrack]: Registered references.
+    """
+    return db.query(ReferenceTrack).order_by(ReferenceTrack.id.desc()).all()
+
+
+def get_reference(db: Session, reference_id: int) -> Optional[ReferenceTrack]:
+    """
+    Look up a reference track by id.
+
+    Args:
+        db: SQLAlchemy database session.
+        reference_id: Reference track id.
+
+    Returns:
+        Optional[ReferenceTrack]: The reference, or None if it does not exist.
+    """
+    return db.query(ReferenceTrack).filter(ReferenceTrack.id == reference_id).first()
+
+
+async def register_reference(
+    db: Session,
+    title: str,
+    file_bytes: bytes,
+    file_format: str = "mp3",
+    executor: AnalysisExecutor = analysis_executor,
+    storage: ObjectStorage = object_storage,
+) -> ReferenceTrack:
+    """
+    Analyse a reference track once and add it to the catalog.
+
+    The source file and the extracted melody are stored in MinIO and the
+    metadata in the database. Registering the same file again, including
+    concurrently, returns the existing entry.
+
+    Args:
+        db: SQLAlchemy database session.
+        title: Human readable title of the exercise.
+        file_bytes: Reference audio file contents.
+        file_format: Reference container format.
+        executor: Executor running the analysis.
+        storage: Object storage receiving the file and the features.
+
+    Returns:
+        ReferenceTrack: The new or existing catalog entry.
+
+    Raises:
+        ExecutorBusyError: If the analysis queue is full.
+        ReferenceAnalysisError: If no melody can be extracted from the file.
+    """
+    digest = await asyncio.to_thread(_sha256, file_bytes)
+    existing = db.query(ReferenceTrack).filter(ReferenceTrack.sha256 == digest).first()
+    if existing is not None:
+        logger.info("Reference already registered: %d", existing.id)
+        return existing
+
+    with executor.reserve():
+        melody, min_per = await executor.extract_reference(file_bytes, file_format)
+    if melody is None:
+        raise ReferenceAnalysisError("Failed to extract the reference melody")
+
+    audio_object = f"references/{digest}.{file_format}"
+    features_object = features_object_name(digest)
+    content_type = AUDIO_CONTENT_TYPES.get(file_format, "application/octet-stream")
+    await storage.put_bytes(audio_object, file_bytes, content_type)
+    await storage.put_bytes(
+        features_object, melody_to_bytes(melody, min_per), "application/octet-stream"
+    )
+
+    reference = ReferenceTrack(
+        title=title,
+        sha256=digest,
+        file_format=file_format,
+        audio_object=audio_object,
+        features_object=features_object,
+        config_fingerprint=audio_config_fingerprint(),
+    )
+    db.add(reference)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request registered the same file after our lookup
+        db.rollback()
+        existing = (
+            db.query(ReferenceTrack).filter(ReferenceTrack.sha256 == digest).first()
+        )
+        if existing is None:
+            raise
+        logger.info("Reference registered concurrently: %d", existing.id)
+        return existing
+    db.refresh(reference)
+    melody_cache.put(reference_cache_key(reference.id), melody, min_per)
+    logger.info("Reference registered: %d (%s)", reference.id, title)
+    return reference
+
+
+async def load_reference_melody(
+    db: Session,
+    reference: ReferenceTrack,
+    executor: AnalysisExecutor = analysis_executor,
+    storage: ObjectStorage = object_storage,
+) -> Tuple[np.ndarray, float]:
+    """
+    Return the analysed melody of a catalog reference.
+
+    The melody is served from the in-process cache or read from MinIO. If it
+    was extracted with a different AudioConfig, the stored source file is
+    analysed again and the new features replace the old ones.
+
+    Args:
+        db: SQLAlchemy database session.
+        reference: Catalog entry.
+        executor: Executor running a re-analysis if one is needed.
+        storage: Object storage holding the source file and the features.
+
+    Returns:
+        Tuple[np.ndarray, float]: Reference melody and minimal note length.
+
+    Raises:
+        ExecutorBusyError: If a re-analysis is needed and the queue is full.
+        ReferenceAnalysisError: If the stored file can no longer be analysed.
+    """
+    key = reference_cache_key(reference.id)
+    cached = melody_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if reference.config_fingerprint == audio_config_fingerprint():
+        data = await storage.get_bytes(reference.features_object)
+        melody, min_per, _ = melody_from_bytes(data)
+    else:
+        melody, min_per = await _reanalyse(db, reference, executor, storage)
+
+    melody_cache.put(key, melody, min_per)
+    return melody, min_per
+
+
+async def _reanalyse(
+    db: Session,
+    reference: ReferenceTrack,
+    executor: AnalysisExecutor,
+    storage: ObjectStorage,
+) -> Tuple[np.ndarray, float]:
+    """Extract the melody of a stored reference with the current AudioConfig."""
+    logger.info(
+        "Re-analysing reference %d: config %s -> %s",
+        reference.id,
+        reference.config_fingerprint,
+        audio_config_fingerprint(),
+    )
+    file_bytes = await storage.get_bytes(reference.audio_object)
+    with executor.reserve():
+        melody, min_per = await executor.extract_reference(
+            file_bytes, reference.file_format
+        )
+    if melody is None:
+        raise ReferenceAnalysisError("Failed to extract the reference melody")
+
+    features_object = features_object_name(reference.sha256)
+    await storage.put_bytes(
+        features_object, melody_to_bytes(melody, min_per), "application/octet-stream"
+    )
+    reference.features_object = features_object
+    reference.config_fingerprint = audio_config_fingerprint()
+    try:
+        db.commit()
+    except Exception as e:
+        # The melody is still valid; the next load re-analyses the reference
+        db.rollback()
+        logger.error(
+            "Failed to record re-analysis of reference %d: %s", reference.id, str(e)
+        )
+    return melody, min_per
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
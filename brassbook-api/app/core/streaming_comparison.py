@@ -0,0 +1,322 @@
+import asyncio
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import soxr
+
+from app.config import COMPARE_MAX_STREAMS
+from app.core.analysis_executor import (
+    AnalysisExecutor,
+    ComparisonResult,
+    ExecutorBusyError,
+    analysis_executor,
+)
+from app.core.audio_decoder import iter_decoded_audio, open_audio_stream
+from app.core.compare_melodies import (
+    MELODY_DTYPE,
+    AudioConfig,
+    StreamingContour,
+    analysis_hop_length,
+    audible_frames,
+    compare_melody_with_reference,
+    min_note_frames,
+    segment_notes,
+    segment_notes_with_ends,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Decoding threads of open streaming sessions, one per session
+_stream_threads = ThreadPoolExecutor(
+    max_workers=COMPARE_MAX_STREAMS, thread_name_prefix="melody-stream"
+)
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Blocking, non-seekable byte stream fed from another thread.
+
+    Reads wait until data is fed or the stream is finished, so a demuxer can
+    consume a recording that is still being uploaded.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._finished = False
+        self._condition = threading.Condition()
+
+    def feed(self, data: bytes) -> None:
+        """Append a chunk of the encoded stream."""
+        with self._condition:
+            self._buffer.extend(data)
+            self._condition.notify_all()
+
+    def finish(self) -> None:
+        """Mark the end of the stream; pending reads return what is left."""
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        with self._condition:
+            while not self._buffer and not self._finished:
+                self._condition.wait()
+            size = min(len(buffer), len(self._buffer))
+            buffer[:size] = self._buffer[:size]
+            del self._buffer[:size]
+            return size
+
+
+class LiveMelodyTracker:
+    """
+    Incremental melody contour and per-note verdicts for a growing recording.
+
+    Samples are resampled to the analysis rate as they arrive and fed to a
+    StreamingContour, which computes every spectrogram frame once and keeps
+    what the exact contour of the whole take needs. The live notes use a dB
+    floor that follows the running maximum instead of the global one, and
+    leading silence is skipped until the first audible frame, so they
+    approximate the final result closely but not exactly. Only the frames
+    after the last completed note are segmented again, so a session costs
+    time linear in the length of the take.
+    """
+
+    def __init__(self, teacher_melody: np.ndarray, min_per_t: float, native_rate: int):
+        self.sample_rate = AudioConfig.SAMPLE_RATE
+        self.hop_length = analysis_hop_length()
+        self.min_per = min_per_t
+        self._resampler = None
+        if native_rate != self.sample_rate:
+            self._resampler = soxr.ResampleStream(
+                native_rate, self.sample_rate, 1, dtype="float32", quality="HQ"
+            )
+        self.contour = StreamingContour(self.sample_rate)
+        # Frames after the end of the last completed note
+        self._tail = np.zeros(0, dtype=MELODY_DTYPE)
+        self._audible = False
+        self.reported = 0
+        self.expected_bands, self.expected_lengths = segment_notes(
+            teacher_melody, min_per_t
+        )
+
+    def feed(self, samples: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Analyse newly decoded samples at the native rate.
+
+        Args:
+            samples: Mono float32 samples.
+
+        Returns:
+            List[Dict[str, Any]]: Verdicts for the notes completed by these samples.
+        """
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples)
+        contour = self.contour.feed(samples)
+        if not len(contour):
+            return []
+
+        if not self._audible:
+            audible = np.flatnonzero(audible_frames(contour))
+            if not len(audible):
+                return []
+            self._audible = True
+            contour = contour[audible[0] :]
+        self._tail = np.concatenate((self._tail, contour))
+        return self._new_verdicts()
+
+    def finish(self) -> np.ndarray:
+        """
+        Flush the resampler and return the exact melody of the whole take.
+
+        Returns:
+            np.ndarray: Melody (MELODY_DTYPE) equal to the one extracted from
+            the uploaded recording.
+
+        Raises:
+            ValueError: If the take contains no sound.
+        """
+        if self._resampler is not None:
+            self.contour.feed(
+                self._resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+            )
+        return self.contour.finish()
+
+    def _new_verdicts(self) -> List[Dict[str, Any]]:
+        """Compare notes completed since the last call with the reference."""
+        bands, lengths, ends = segment_notes_with_ends(self._tail, self.min_per)
+        if len(ends):
+            self._tail = self._tail[ends[-1] + 1 :]
+        verdicts = []
+        for offset in range(len(bands)):
+            index = self.reported + offset
+            verdict = {
+                "index": index,
+                "band": int(bands[offset]),
+                "length": int(lengths[offset]),
+                "expected_band": None,
+                "pitch_ok": False,
+                "rhythm_ok": False,
+            }
+            if index < len(self.expected_bands):
+                expected_length = int(self.expected_lengths[index])
+                verdict["expected_band"] = int(self.expected_bands[index])
+                verdict["pitch_ok"] = verdict["band"] == verdict["expected_band"]
+                verdict["rhythm_ok"] = (
+                    abs(verdict["length"] - expected_length) / expected_length
+                    <= AudioConfig.RHYTHM_THRESHOLD
+                )
+            verdicts.append(verdict)
+        self.reported += len(bands)
+        return verdicts
+
+    @property
+    def seconds(self) -> float:
+        """Duration of the audio analysed so far."""
+        return round(self.contour.frames * self.hop_length / self.sample_rate, 2)
+
+
+class StreamingComparison:
+    """
+    Comparison of a recording uploaded in chunks while the student plays.
+
+    Chunks are demuxed and decoded on a session thread as they arrive and
+    fed to a LiveMelodyTracker; its verdicts are put on ``events``. The
+    tracker builds the exact melody contour of the take while it is played,
+    without keeping the decoded signal, so when the recording stops only
+    note segmentation and scoring remain. The final result matches
+    /api/v1/compare_melodies for the same take; the live verdicts are only
+    approximate.
+    """
+
+    active = 0
+
+    def __init__(
+        self,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file_format: str = "webm",
+        executor: AnalysisExecutor = analysis_executor,
+    ):
+        self.teacher_melody = teacher_melody
+        self.min_per_t = min_per_t
+        self.file_format = file_format
+        self.executor = executor
+        self.received = 0
+        self.events: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self._stream = ChunkStream()
+        self._closed = False
+        self._decoded: Optional[asyncio.Future] = None
+
+    @classmethod
+    def open(
+        cls,
+        teacher_melody: np.ndarray,
+        min_per_t: float,
+        file_format: str = "webm",
+        executor: AnalysisExecutor = analysis_executor,
+    ) -> "StreamingComparison":
+        """
+        Start a streaming session if the limit of open sessions allows it.
+
+        Args:
+            teacher_melody: Pre-analysed reference melody.
+            min_per_t: Minimal note length of the reference.
+            file_format: Container format of the recording stream.
+            executor: Executor running the final analysis.
+
+        Returns:
+            StreamingComparison: The started session.
+
+        Raises:
+            ExecutorBusyError: If COMPARE_MAX_STREAMS sessions are open.
+        """
+        if cls.active >= COMPARE_MAX_STREAMS:
+            logger.warning("Streaming comparison limit reached: %d", cls.active)
+            raise ExecutorBusyError("Too many streaming comparisons")
+        session = cls(teacher_melody, min_per_t, file_format, executor)
+        cls.active += 1
+        session._decoded = session._loop.run_in_executor(
+            _stream_threads, session._decode
+        )
+        # Aborted sessions never await the decoder; keep its error from being logged
+        session._decoded.add_done_callback(
+            lambda done: done.cancelled() or done.exception()
+        )
+        return session
+
+    def feed(self, data: bytes) -> None:
+        """Append a chunk of the encoded recording."""
+        self.received += len(data)
+        self._stream.feed(data)
+
+    async def finish(self) -> Optional[ComparisonResult]:
+        """
+        Finish the recording and compute the final comparison result.
+
+        Returns:
+            Optional[ComparisonResult]: Same result as the upload endpoint, or
+            None if the recording could not be analysed.
+
+        Raises:
+            ExecutorBusyError: If the analysis queue is full.
+            asyncio.TimeoutError: If the final analysis times out.
+        """
+        self._stream.finish()
+        try:
+            melody = await self._decoded
+        except Exception as e:
+            logger.error("Streaming recording could not be analysed: %s", e)
+            return None
+        finally:
+            self.close()
+
+        with self.executor.reserve():
+            return await self.executor.run_measured(
+                compare_melody_with_reference,
+                self.file_format,
+                self.teacher_melody,
+                self.min_per_t,
+                melody,
+                min_note_frames(),
+            )
+
+    def close(self) -> None:
+        """Release the session slot; unblocks the decoder if still running."""
+        if self._closed:
+            return
+        self._closed = True
+        self._stream.finish()
+        StreamingComparison.active -= 1
+
+    def _decode(self) -> np.ndarray:
+        """Decode the stream as it arrives and track the melody (worker thread)."""
+        with open_audio_stream(self._stream, self.file_format) as container:
+            native_rate, chunks = iter_decoded_audio(container)
+            tracker = LiveMelodyTracker(
+                self.teacher_melody, self.min_per_t, native_rate
+            )
+            for chunk in chunks:
+                verdicts = tracker.feed(chunk)
+                if verdicts:
+                    self._post(
+                        {
+                            "type": "notes",
+                            "notes": verdicts,
+                            "seconds": tracker.seconds,
+                        }
+                    )
+        return tracker.finish()
+
+    def _post(self, event: Dict[str, Any]) -> None:
+        """Hand an event over to the event loop."""
+        self._loop.call_soon_threadsafe(self.events.put_nowait, event)
@@ -1,4 +1,6 @@
-from sqlalchemy import Boolean, Column, DateTime, Integer, String
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
 
 from app.data.database import Base
 
@@ -18,3 +20,28 @@ class User(Base):
     photo_url = Column(
         String, nullable=True
     )  # Путь к фото в MinIO (формат: 'photos/avatars/{user_id}.png')
+    photo_sizes = Column(String, nullable=True)  # Готовые миниатюры фото: '64,128'
+
+
+class ReferenceTrack(Base):
+    __tablename__ = "reference_tracks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String)
+    sha256 = Column(String, unique=True, index=True)  # Хэш исходного аудиофайла
+    file_format = Column(String, default="mp3")
+    audio_object = Column(String)  # Исходный файл в MinIO
+    features_object = Column(String)  # Извлеченная мелодия в MinIO (.npz)
+    config_fingerprint = Column(String)  # Версия AudioConfig при извлечении
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Recording(Base):
+    __tablename__ = "recordings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    object_name = Column(String, unique=True)  # Запись в MinIO
+    content_type = Column(String)
+    size = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
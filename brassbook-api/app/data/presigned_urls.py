@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from prometheus_client import Counter
+
+presigned_url_requests = Counter(
+    "brassbook_presigned_url_requests_total",
+    "Presigned download URL lookups by cache outcome",
+    ["outcome"],
+)
+
+
+def object_name_from_reference(reference: str, bucket: str) -> str:
+    """
+    Extract the object name from a stored file reference.
+
+    Rows hold ``/bucket/key`` paths; older rows may hold a full (possibly
+    presigned and long expired) URL or a bare object name.
+
+    Args:
+        reference: Stored reference, e.g. ``User.photo_url``.
+        bucket: Bucket the object lives in.
+
+    Returns:
+        str: Object name in the bucket.
+    """
+    path = unquote(urlsplit(reference).path)
+    prefix = f"/{bucket}/"
+    if path.startswith(prefix):
+        return path[len(prefix) :]
+    return path.lstrip("/")
+
+
+class PresignedUrlCache:
+    """
+    Presigned download URLs by object name, reused until shortly before expiry.
+
+    A URL signed for ``expires`` seconds is handed out again while it stays
+    valid for at least ``margin`` more seconds (capped at half its lifetime),
+    so a client never receives a link that is about to expire. Entries are
+    evicted in LRU order beyond ``maxsize``. An index from object name to
+    the cached lifetimes makes discard() independent of the cache size. Safe
+    to use from worker threads.
+    """
+
+    def __init__(
+        self, maxsize: int, margin: float, clock: Callable[[], float] = time.time
+    ):
+        self.maxsize = maxsize
+        self.margin = margin
+        self.clock = clock
+        self._data: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+        # Object name -> lifetimes of its cached URLs
+        self._lifetimes: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, object_name: str, expires: int) -> Optional[str]:
+        """
+        Return a cached URL that is still valid long enough, or None.
+
+        Args:
+            object_name: Object name in the bucket.
+            expires: Lifetime the URL was signed with, in seconds.
+
+        Returns:
+            Optional[str]: The cached URL or None.
+        """
+        key = (object_name, expires)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] - self.clock() > self._margin(expires):
+                self._data.move_to_end(key)
+                self.hits += 1
+                presigned_url_requests.labels("hit").inc()
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            presigned_url_requests.labels("miss").inc()
+            return None
+
+    def put(self, object_name: str, expires: int, url: str, signed_at: float) -> None:
+        """
+        Remember a URL signed at ``signed_at`` for ``expires`` seconds.
+
+        Args:
+            object_name: Object name in the bucket.
+            expires: Lifetime of the URL in seconds.
+            url: Presigned URL.
+            signed_at: Clock value taken before signing.
+        """
+        if self.maxsize <= 0:
+            return
+        key = (object_name, expires)
+        with self._lock:
+            self._data[key] = (url, signed_at + expires)
+            self._data.move_to_end(key)
+            self._lifetimes.setdefault(object_name, set()).add(expires)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def discard(self, object_name: str) -> None:
+        """Forget all URLs of an object, e.g. after it was deleted."""
+        with self._lock:
+            for expires in self._lifetimes.pop(object_name, ()):
+                del self._data[(object_name, expires)]
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit and miss counters and the current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def _remove(self, key: Tuple[str, int]) -> None:
+        del self._data[key]
+        lifetimes = self._lifetimes[key[0]]
+        lifetimes.discard(key[1])
+        if not lifetimes:
+            del self._lifetimes[key[0]]
+
+    def _margin(self, expires: int) -> float:
+        return min(self.margin, expires / 2)
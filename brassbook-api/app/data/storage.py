@@ -1,14 +1,73 @@
+import asyncio
+import io
 import logging
-import uuid
-from fastapi import HTTPException, UploadFile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, BinaryIO, Callable, Dict, Optional, TypeVar
+
+import urllib3
+from fastapi import HTTPException
 from minio import Minio
+from minio.datatypes import Object, PostPolicy
 from minio.error import S3Error
+from prometheus_client import Gauge, Histogram
 
-from app.config import (MINIO_ACCESS_KEY, MINIO_BUCKET_NAME, MINIO_ENDPOINT, MINIO_SECRET_KEY, MAX_FILE_SIZE)
+from app.config import (MINIO_ACCESS_KEY, MINIO_BUCKET_NAME,
+                        MINIO_CONNECT_TIMEOUT, MINIO_ENDPOINT, MINIO_POOL_SIZE,
+                        MINIO_READ_TIMEOUT, MINIO_REGION, MINIO_SECRET_KEY,
+                        PRESIGNED_URL_CACHE_SIZE, PRESIGNED_URL_EXPIRES,
+                        PRESIGNED_URL_MARGIN)
+from app.data.presigned_urls import PresignedUrlCache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+storage_pool_size = Gauge(
+    "brassbook_storage_pool_size",
+    "Connections in the MinIO pool, also the limit of concurrent operations",
+)
+storage_requests_in_flight = Gauge(
+    "brassbook_storage_requests_in_flight",
+    "MinIO operations currently holding a pool slot",
+)
+storage_slot_wait_seconds = Histogram(
+    "brassbook_storage_slot_wait_seconds",
+    "Time a MinIO operation waited for a free pool slot",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+storage_request_seconds = Histogram(
+    "brassbook_storage_request_seconds",
+    "Wall time of a MinIO operation",
+    ["operation"],
+)
+
+
+def build_http_client(pool_size: int) -> urllib3.PoolManager:
+    """
+    Build the connection pool shared by all MinIO calls.
+
+    The pool blocks instead of opening throw-away connections when all
+    ``pool_size`` connections are busy, and connect/read timeouts are short
+    enough that a stuck MinIO fails requests instead of hanging them.
+
+    Args:
+        pool_size: Number of keep-alive connections to the MinIO endpoint.
+
+    Returns:
+        urllib3.PoolManager: Configured pool manager.
+    """
+    return urllib3.PoolManager(
+        maxsize=pool_size,
+        block=True,
+        timeout=urllib3.Timeout(connect=MINIO_CONNECT_TIMEOUT, read=MINIO_READ_TIMEOUT),
+        retries=urllib3.Retry(
+            total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+        ),
+    )
+
+
 # Initialize MinIO client
 try:
     minio_client = Minio(
@@ -16,12 +75,17 @@ try:
         access_key=MINIO_ACCESS_KEY,
         secret_key=MINIO_SECRET_KEY,
         secure=False,  # Enable HTTPS by default
+        region=MINIO_REGION,
+        http_client=build_http_client(MINIO_POOL_SIZE),
     )
     logger.info("MinIO client initialized successfully for endpoint: %s", MINIO_ENDPOINT)
 except Exception as e:
     logger.error("Failed to initialize MinIO client: %s", str(e))
     raise RuntimeError(f"Failed to initialize MinIO client: {str(e)}")
 
+# Presigned download URLs shared by all requests of the process
+presigned_urls = PresignedUrlCache(PRESIGNED_URL_CACHE_SIZE, PRESIGNED_URL_MARGIN)
+
 # Check and create bucket if it doesn't exist
 try:
     if not minio_client.bucket_exists(MINIO_BUCKET_NAME):
@@ -51,84 +115,263 @@ def get_minio_client() -> Minio:
     return minio_client
 
 
-def save_file(file: UploadFile) -> str:
+def sign_file_url(filename: str, expires: int) -> str:
+    """
+    Sign a new download URL and remember it in ``presigned_urls``.
+
+    Raises:
+        HTTPException: If URL generation fails.
+    """
+    logger.debug("Generating presigned URL for file: %s", filename)
+    try:
+        signed_at = presigned_urls.clock()
+        url = minio_client.presigned_get_object(
+            bucket_name=MINIO_BUCKET_NAME,
+            object_name=filename,
+            expires=timedelta(seconds=expires),
+        )
+        presigned_urls.put(filename, expires, url, signed_at)
+        logger.info("Presigned URL generated for file: %s", filename)
+        return url
+    except S3Error as e:
+        logger.error("Failed to generate presigned URL for %s: %s", filename, str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to generate file URL: {str(e)}")
+    except Exception as e:
+        logger.error("Unexpected error while generating URL for %s: %s", filename, str(e))
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def put_bytes(object_name: str, data: bytes, content_type: str) -> None:
     """
-    Save an uploaded file to MinIO and return its object name.
+    Store in-memory data in MinIO under the given object name.
 
     Args:
-        file: Uploaded file to save.
+        object_name: Object name in the bucket.
+        data: Object contents.
+        content_type: MIME type of the object.
 
-    Returns:
-        str: Object name of the saved file in MinIO.
+    Raises:
+        HTTPException: If the upload fails.
+    """
+    put_stream(object_name, io.BytesIO(data), len(data), content_type)
+
+
+def put_stream(
+    object_name: str, stream: BinaryIO, length: int, content_type: str
+) -> None:
+    """
+    Store a file-like object in MinIO under the given object name.
+
+    Args:
+        object_name: Object name in the bucket.
+        stream: Readable object positioned at the start of the data.
+        length: Number of bytes to store.
+        content_type: MIME type of the object.
 
     Raises:
-        HTTPException: If file is invalid, too large, or upload fails.
-    """
-    logger.info("Saving file: %s", file.filename)
-    
-    if not file.filename:
-        logger.warning("No filename provided")
-        raise HTTPException(status_code=400, detail="No filename provided")
-    
-    if file.size > MAX_FILE_SIZE:
-        logger.warning("File too large: %s (size: %d bytes)", file.filename, file.size)
-        raise HTTPException(
-            status_code=413, detail=f"File size exceeds limit of {MAX_FILE_SIZE // 1024 // 1024}MB"
+        HTTPException: If the upload fails.
+    """
+    logger.debug("Storing object: %s (%d bytes)", object_name, length)
+    try:
+        minio_client.put_object(
+            bucket_name=MINIO_BUCKET_NAME,
+            object_name=object_name,
+            data=stream,
+            length=length,
+            content_type=content_type,
         )
+    except S3Error as e:
+        logger.error("Failed to store object %s: %s", object_name, str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
 
-    # Sanitize filename to prevent path injection
-    safe_filename = file.filename.replace("/", "_").replace("\\", "_")
-    object_name = f"{uuid.uuid4()}_{safe_filename}"
 
+def get_bytes(object_name: str) -> bytes:
+    """
+    Read a whole object from MinIO.
+
+    Args:
+        object_name: Object name in the bucket.
+
+    Returns:
+        bytes: Object contents.
+
+    Raises:
+        HTTPException: If the object cannot be read.
+    """
+    logger.debug("Reading object: %s", object_name)
+    response = None
     try:
-        with file.file as f:
-            file.file.seek(0, 2)
-            file_size = file.file.tell()
-            file.file.seek(0)
-            minio_client.put_object(
-                bucket_name=MINIO_BUCKET_NAME,
-                object_name=object_name,
-                data=f,
-                length=file_size,
-                part_size=10 * 1024 * 1024,  # 10MB part size for multipart upload
-                content_type=file.content_type or "application/octet-stream",
-            )
-        logger.info("File saved successfully: %s as %s", file.filename, object_name)
-        return object_name
+        response = minio_client.get_object(MINIO_BUCKET_NAME, object_name)
+        return response.read()
     except S3Error as e:
-        logger.error("Failed to save file %s to MinIO: %s", file.filename, str(e))
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
-    except Exception as e:
-        logger.error("Unexpected error while saving file %s: %s", file.filename, str(e))
-        raise HTTPException(status_code=500, detail="Internal server error")
+        logger.error("Failed to read object %s: %s", object_name, str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+    finally:
+        if response is not None:
+            response.close()
+            response.release_conn()
+
+
+def presign_post(
+    object_name: str, content_type: str, max_size: int, expires: int
+) -> Dict[str, str]:
+    """
+    Sign a browser form upload of exactly one object.
+
+    MinIO rejects the upload unless the key, the Content-Type and a size of
+    1..max_size bytes match the signed policy.
+
+    Args:
+        object_name: Object name the form may create.
+        content_type: Required Content-Type of the upload.
+        max_size: Maximum object size in bytes.
+        expires: Validity of the policy in seconds.
+
+    Returns:
+        Dict[str, str]: Form fields to send along with the file.
+    """
+    policy = PostPolicy(
+        MINIO_BUCKET_NAME, datetime.now(timezone.utc) + timedelta(seconds=expires)
+    )
+    policy.add_equals_condition("key", object_name)
+    policy.add_equals_condition("Content-Type", content_type)
+    policy.add_content_length_range_condition(1, max_size)
+    fields = minio_client.presigned_post_policy(policy)
+    fields.update({"key": object_name, "Content-Type": content_type})
+    return fields
 
 
-def get_file_url(filename: str, expires: int = 3600) -> str:
+def stat_file(object_name: str) -> Optional[Object]:
     """
-    Generate a presigned URL for accessing a file in MinIO.
+    Look up the metadata of an object.
 
     Args:
-        filename: Object name of the file in MinIO.
-        expires: URL expiration time in seconds (default: 1 hour).
+        object_name: Object name in the bucket.
 
     Returns:
-        str: Presigned URL for accessing the file.
+        Optional[Object]: Object metadata, or None if it does not exist.
 
     Raises:
-        HTTPException: If URL generation fails.
+        HTTPException: If MinIO fails for another reason.
     """
-    logger.debug("Generating presigned URL for file: %s", filename)
     try:
-        url = minio_client.presigned_get_object(
-            bucket_name=MINIO_BUCKET_NAME,
-            object_name=filename,
-            expires=expires
-        )
-        logger.info("Presigned URL generated for file: %s", filename)
-        return url
+        return minio_client.stat_object(MINIO_BUCKET_NAME, object_name)
     except S3Error as e:
-        logger.error("Failed to generate presigned URL for %s: %s", filename, str(e))
-        raise HTTPException(status_code=500, detail=f"Failed to generate file URL: {str(e)}")
-    except Exception as e:
-        logger.error("Unexpected error while generating URL for %s: %s", filename, str(e))
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        if e.code == "NoSuchKey":
+            return None
+        logger.error("Failed to stat object %s: %s", object_name, str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+
+
+class LazySemaphore:
+    """
+    Async context manager limiting concurrency with a semaphore made on first use.
+
+    On Python 3.9 a semaphore binds to the loop current at creation, which for
+    objects built at import time is not the server's loop.
+    """
+
+    def __init__(self, value: int):
+        self.value = value
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def created(self) -> bool:
+        """Whether the semaphore has been created in a running loop."""
+        return self._semaphore is not None
+
+    async def __aenter__(self) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.value)
+        await self._semaphore.acquire()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._semaphore.release()
+
+
+class ObjectStorage:
+    """
+    Async access to the bucket through the shared MinIO client.
+
+    Blocking MinIO calls run in worker threads. At most ``concurrency`` of
+    them run at once, matching the connection pool, so callers queue here
+    (and the wait is measured) instead of blocking threads inside urllib3.
+    """
+
+    def __init__(self, client: Minio, bucket: str, concurrency: int):
+        self.client = client
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self._slots = LazySemaphore(concurrency)
+        storage_pool_size.set(concurrency)
+
+    async def run(
+        self, operation: str, fn: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> T:
+        """
+        Run a blocking storage call off the event loop within the pool limit.
+
+        Args:
+            operation: Label of the operation in the metrics.
+            fn: Blocking function to call.
+            *args: Positional arguments for the function.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            T: Value returned by the function.
+        """
+        queued = time.perf_counter()
+        async with self._slots:
+            started = time.perf_counter()
+            storage_slot_wait_seconds.observe(started - queued)
+            storage_requests_in_flight.inc()
+            try:
+                return await asyncio.to_thread(fn, *args, **kwargs)
+            finally:
+                storage_requests_in_flight.dec()
+                storage_request_seconds.labels(operation).observe(
+                    time.perf_counter() - started
+                )
+
+    async def put_bytes(self, object_name: str, data: bytes, content_type: str) -> None:
+        """Store in-memory data; see put_bytes()."""
+        await self.run("put", put_bytes, object_name, data, content_type)
+
+    async def put_file(
+        self, object_name: str, stream: BinaryIO, length: int, content_type: str
+    ) -> None:
+        """Store a file-like object without reading it into memory first."""
+        await self.run("put", put_stream, object_name, stream, length, content_type)
+
+    async def get_bytes(self, object_name: str) -> bytes:
+        """Read a whole object; see get_bytes()."""
+        return await self.run("get", get_bytes, object_name)
+
+    async def get_url(
+        self, object_name: str, expires: int = PRESIGNED_URL_EXPIRES
+    ) -> str:
+        """Presign a download URL; a cached one skips the worker thread."""
+        cached = presigned_urls.get(object_name, expires)
+        if cached is not None:
+            return cached
+        return await self.run("presign", sign_file_url, object_name, expires)
+
+    async def presigned_post(
+        self, object_name: str, content_type: str, max_size: int, expires: int
+    ) -> Dict[str, str]:
+        """Sign a browser form upload; see presign_post()."""
+        return await self.run(
+            "presign", presign_post, object_name, content_type, max_size, expires
+        )
+
+    async def stat(self, object_name: str) -> Optional[Object]:
+        """Look up object metadata; see stat_file()."""
+        return await self.run("stat", stat_file, object_name)
+
+
+object_storage = ObjectStorage(minio_client, MINIO_BUCKET_NAME, MINIO_POOL_SIZE)
+
+
+def get_object_storage() -> ObjectStorage:
+    """FastAPI dependency providing the shared object storage."""
+    return object_storage
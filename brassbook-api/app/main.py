@@ -1,30 +1,118 @@
+import asyncio
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
+from app import BOOT_STARTED
 from app.api.routes.auth_routes import auth_router
 from app.api.routes.compare_routes import compare_router
+from app.api.routes.reference_routes import reference_router
+from app.api.routes.upload_routes import upload_router
 from app.api.routes.user_routes import avatar_user_router, current_user_router
 from app.api.routes.legacy_router import router as legacy_router
+from app.api.uploads import UploadLimitMiddleware
+from app.config import ANALYSIS_WARMUP, METRICS_TOKEN, MINIO_PUBLIC_URL
+from app.core.analysis_executor import analysis_executor
 
 
-import logging
-
 logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s | %(levelname)s | %(name)s | %(filename)s:%(lineno)d | %(message)s",
     )
+# authx уже вызвал basicConfig() при импорте, и вызов выше ничего не меняет.
+# Уровень INFO задается только логгерам приложения, чужие обработчики не трогаем
+logging.getLogger("app").setLevel(logging.INFO)
+
+logger = logging.getLogger(__name__)
+
+
+class FirstRequestLogMiddleware:
+    """
+    Логирует задержку первого HTTP-запроса воркера и время от его загрузки.
+
+    После первого запроса остается только проверка флага: запросы не
+    оборачиваются, как в BaseHTTPMiddleware.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.logged = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.logged or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.logged = True
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            now = time.perf_counter()
+            logger.info(
+                "First request %s served in %.3fs, %.2fs after boot",
+                scope["path"],
+                now - start,
+                now - BOOT_STARTED,
+            )
 
-app = FastAPI(root_path="/api")
+
+async def warm_up_worker() -> None:
+    """Прогревает анализ и логирует, когда воркер отвечает без задержки."""
+    await analysis_executor.warm_up()
+    logger.info("Worker warmed up %.2fs after boot", time.perf_counter() - BOOT_STARTED)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not MINIO_PUBLIC_URL:
+        # Иначе браузеры получат формы прямой загрузки на недоступный адрес
+        raise RuntimeError("MINIO_PUBLIC_URL must be set to the MinIO URL browsers use")
+    logger.info("Worker booted in %.2fs", time.perf_counter() - BOOT_STARTED)
+    # Прогрев идет в фоне и не задерживает прием запросов
+    warm_up = None
+    if ANALYSIS_WARMUP:
+        warm_up = asyncio.create_task(warm_up_worker())
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    analysis_executor.shutdown()
+
+
+app = FastAPI(root_path="/api", lifespan=lifespan)
 #app.include_router(auth_router) # TODO: добработкть эти контроллеры
 #app.include_router(current_user_router)
 #app.include_router(avatar_user_router)
 
 app.include_router(compare_router)
+app.include_router(reference_router)
+app.include_router(upload_router)
 app.include_router(legacy_router)
 app.include_router(avatar_user_router)
 app.include_router(current_user_router)
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(authorization: Optional[str] = Header(None)) -> Response:
+    """Метрики приложения в текстовом формате Prometheus, только с токеном."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {METRICS_TOKEN}".encode()
+    if not secrets.compare_digest((authorization or "").encode(), expected):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+# Лимит тела запроса проверяется до разбора multipart
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,5 +121,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Внешний слой: задержка первого запроса включает все остальные
+app.add_middleware(FirstRequestLogMiddleware)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,49 @@
+"""recordings
+
+Revision ID: 3b8d5e1c2f4a
+Revises: 7c2f4e9a1b3d
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3b8d5e1c2f4a"
+down_revision: Union[str, None] = "7c2f4e9a1b3d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "recordings",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("object_name", sa.String(), nullable=True),
+        sa.Column("content_type", sa.String(), nullable=True),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("object_name"),
+    )
+    op.create_index(op.f("ix_recordings_id"), "recordings", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_recordings_user_id"), "recordings", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_recordings_user_id"), table_name="recordings")
+    op.drop_index(op.f("ix_recordings_id"), table_name="recordings")
+    op.drop_table("recordings")
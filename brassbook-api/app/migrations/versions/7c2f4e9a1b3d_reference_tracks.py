@@ -0,0 +1,48 @@
+"""reference tracks
+
+Revision ID: 7c2f4e9a1b3d
+Revises: 01650d3671bd
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c2f4e9a1b3d"
+down_revision: Union[str, None] = "01650d3671bd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "reference_tracks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("sha256", sa.String(), nullable=True),
+        sa.Column("file_format", sa.String(), nullable=True),
+        sa.Column("audio_object", sa.String(), nullable=True),
+        sa.Column("features_object", sa.String(), nullable=True),
+        sa.Column("config_fingerprint", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_reference_tracks_id"), "reference_tracks", ["id"], unique=False
+    )
+    op.create_index(
+        op.f("ix_reference_tracks_sha256"), "reference_tracks", ["sha256"], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_reference_tracks_sha256"), table_name="reference_tracks")
+    op.drop_index(op.f("ix_reference_tracks_id"), table_name="reference_tracks")
+    op.drop_table("reference_tracks")
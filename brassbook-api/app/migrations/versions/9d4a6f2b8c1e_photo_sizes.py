@@ -0,0 +1,29 @@
+"""photo sizes
+
+Revision ID: 9d4a6f2b8c1e
+Revises: 3b8d5e1c2f4a
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4a6f2b8c1e"
+down_revision: Union[str, None] = "3b8d5e1c2f4a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("photo_sizes", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "photo_sizes")
@@ -0,0 +1,302 @@
+"""
+Stage-level benchmark of the compare_melodies pipeline.
+
+Synthesises reference (MP3) / student (WebM/Opus) pairs of 10, 60 and 180
+seconds, times every pipeline stage separately and writes the medians as
+JSON. With --baseline the run is checked against a previous JSON report and
+the script exits with status 1 if any stage got slower than the threshold.
+
+Melodies are extracted through extract_melody_from_audio, as in production:
+takes longer than ANALYSIS_IN_MEMORY_SECONDS are analysed in blocks. With
+--analysis memory or --analysis blocks every take uses that path instead.
+
+Usage (from brassbook-api/):
+    python -m benchmarks.compare_melodies_benchmark --output bench.json
+    python -m benchmarks.compare_melodies_benchmark --baseline bench.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import av
+import librosa
+import numpy as np
+
+from app.core import compare_melodies
+from app.core.analysis_metrics import collect_stats
+from app.core.compare_melodies import (
+    AudioConfig,
+    align_melody_sequences,
+    extract_melody_from_audio,
+    extract_notes,
+    min_note_frames,
+    process_characteristics_batch,
+    score_melodies,
+)
+
+DURATIONS = (10, 60, 180)
+# Стадии быстрее этого порога не проверяются на регрессию: их время — шум
+MIN_CHECKED_SECONDS = 0.002
+
+
+def band_frequencies() -> np.ndarray:
+    """Центральные частоты мел-полос, по которым строится мелодия."""
+    mel_f = librosa.mel_frequencies(
+        n_mels=AudioConfig.N_MELS + 2, fmax=AudioConfig.SAMPLE_RATE / 2
+    )
+    bands = np.arange(AudioConfig.N_MELS)[AudioConfig.FREQ_BANDS]
+    return mel_f[bands + 1]
+
+
+def synthesize_take(
+    notes: List[Tuple[int, float]], sr: int, detune: float, gain: float, seed: int
+) -> np.ndarray:
+    """Синтезирует исполнение: ноты с гармониками, атакой, затуханием и шумом."""
+    rng = np.random.default_rng(seed)
+    freqs = band_frequencies()
+    parts = [np.zeros(int(0.5 * sr), dtype=np.float32)]
+    for band, duration in notes:
+        t = np.arange(int(duration * sr)) / sr
+        f0 = freqs[band] * (1 + detune * rng.standard_normal())
+        tone = sum(np.sin(2 * np.pi * f0 * k * t) / k**1.5 for k in range(1, 5))
+        envelope = np.minimum(1, t / 0.03) * np.exp(-1.5 * t)
+        parts.append((gain * 0.3 * tone * envelope).astype(np.float32))
+    parts.append(np.zeros(int(0.5 * sr), dtype=np.float32))
+    signal = np.concatenate(parts)
+    signal += 0.002 * rng.standard_normal(len(signal)).astype(np.float32)
+    return signal
+
+
+def make_pair(duration: float, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Строит эталон и исполнение ученика с неточностями ритма, высоты и нот."""
+    rng = np.random.default_rng(seed)
+    n_bands = len(band_frequencies())
+    notes: List[Tuple[int, float]] = []
+    total = 1.0
+    while total < duration:
+        note = (int(rng.integers(0, n_bands)), float(rng.choice([0.25, 0.5, 1.0])))
+        notes.append(note)
+        total += note[1]
+
+    student: List[Tuple[int, float]] = []
+    for band, length in notes:
+        roll = rng.random()
+        if roll < 0.03:
+            continue  # пропущенная нота
+        if roll < 0.06:
+            band = int(rng.integers(0, n_bands))  # фальшивая нота
+        student.append((band, length * rng.uniform(0.85, 1.15)))
+        if rng.random() < 0.02:
+            student.append((int(rng.integers(0, n_bands)), 0.25))  # лишняя нота
+
+    reference = synthesize_take(notes, 44100, 0.0, 1.0, seed)
+    recording = synthesize_take(student, 48000, 0.01, 0.7, seed + 1)
+    return reference, recording
+
+
+def encode(signal: np.ndarray, sr: int, container: str, codec: str) -> bytes:
+    """Кодирует моно сигнал в MP3 или WebM/Opus средствами PyAV."""
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format=container) as output:
+        stream = output.add_stream(codec, rate=sr)
+        stream.layout = "mono"
+        for start in range(0, len(signal), 4800):
+            frame = av.AudioFrame.from_ndarray(
+                signal[np.newaxis, start : start + 4800], format="flt", layout="mono"
+            )
+            frame.sample_rate = sr
+            for packet in stream.encode(frame):
+                output.mux(packet)
+        for packet in stream.encode(None):
+            output.mux(packet)
+    return buffer.getvalue()
+
+
+def timed(fn: Callable, repeat: int):
+    """Возвращает медианное время выполнения и результат последнего вызова."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), result
+
+
+def extract_timed(
+    file_bytes: bytes, file_format: str, repeat: int
+) -> Tuple[Dict[str, float], np.ndarray, str]:
+    """
+    Извлекает мелодию боевым путем и возвращает медианы его стадий и мелодию.
+
+    Время стадий берется из замеров stage() самого пайплайна. При анализе
+    блоками повторное декодирование входит в стадию mel_spectrogram. Третий
+    элемент результата — путь анализа: "memory" или "blocks".
+    """
+    runs = []
+    for _ in range(repeat):
+        with collect_stats(file_format) as stats:
+            melody, _ = extract_melody_from_audio(file_bytes, file_format)
+        if melody is None:
+            raise RuntimeError(f"Failed to extract the {file_format} melody")
+        runs.append(stats.stages)
+    in_blocks = stats.input_seconds > compare_melodies.ANALYSIS_IN_MEMORY_SECONDS
+    stages = ("decode", "trim", "mel_spectrogram", "contour")
+    medians = {
+        name: float(np.median([run.get(name, 0.0) for run in runs])) for name in stages
+    }
+    return medians, melody, "blocks" if in_blocks else "memory"
+
+
+def run_pipeline(
+    mp3: bytes, webm: bytes, repeat: int
+) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """
+    Прогоняет пайплайн по стадиям.
+
+    Returns:
+        Медианы времени стадий и путь анализа эталона и записи ученика.
+    """
+    teacher_stages, teacher, teacher_path = extract_timed(mp3, "mp3", repeat)
+    student_stages, student, student_path = extract_timed(webm, "webm", repeat)
+    timings: Dict[str, float] = {
+        "decode_mp3": teacher_stages["decode"],
+        "decode_webm": student_stages["decode"],
+    }
+    for name in ("trim", "mel_spectrogram", "contour"):
+        timings[name] = teacher_stages[name] + student_stages[name]
+
+    min_per = min_note_frames()
+    notes_t, (all_t, freq_t, t_m) = timed(
+        lambda: extract_notes(teacher, min_per), repeat
+    )
+    notes_c, (all_c, freq_c, c_m) = timed(
+        lambda: extract_notes(student, min_per), repeat
+    )
+    timings["extract_notes"] = notes_t + notes_c
+
+    timings["compare_melody_sequences"], aligned = timed(
+        lambda: align_melody_sequences(
+            all_t, all_c, freq_t, freq_c, t_m, c_m, teacher, student
+        ),
+        repeat,
+    )
+    teacher, student, freq_t, freq_c, t_m, c_m = aligned
+
+    timings["scoring"], scores = timed(
+        lambda: score_melodies(t_m, c_m, freq_t, freq_c, teacher, student), repeat
+    )
+    _, res_rhythm, res_frequency, res_loud, _ = scores
+    timings["process_characteristics"], _ = timed(
+        lambda: process_characteristics_batch((res_rhythm, res_frequency, res_loud), 2),
+        repeat,
+    )
+    timings["total"] = sum(timings.values())
+    return timings, {"mp3": teacher_path, "webm": student_path}
+
+
+def check_regressions(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Сравнивает отчет с базовым и возвращает описания регрессий."""
+    regressions = []
+    for duration, stages in report["results"].items():
+        base_stages = baseline.get("results", {}).get(duration, {})
+        for stage, seconds in stages.items():
+            base = base_stages.get(stage)
+            if base is None or max(base, seconds) < MIN_CHECKED_SECONDS:
+                continue
+            if seconds > base * (1 + threshold):
+                regressions.append(
+                    f"{duration}/{stage}: {seconds:.4f}s vs {base:.4f}s "
+                    f"(+{(seconds / base - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to check regressions against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown per stage (default: 0.2)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage")
+    parser.add_argument(
+        "--durations",
+        type=int,
+        nargs="+",
+        default=list(DURATIONS),
+        help="pair durations in seconds",
+    )
+    parser.add_argument(
+        "--analysis",
+        choices=("auto", "memory", "blocks"),
+        default="auto",
+        help="melody extraction path: as in production (auto, the default), "
+        "always in memory or always in blocks",
+    )
+    parser.add_argument(
+        "--alignment",
+        choices=("pattern", "dtw"),
+        default=AudioConfig.ALIGNMENT,
+        help="note alignment mode (default: AudioConfig.ALIGNMENT)",
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    AudioConfig.ALIGNMENT = args.alignment
+    if args.analysis != "auto":
+        compare_melodies.ANALYSIS_IN_MEMORY_SECONDS = (
+            float("inf") if args.analysis == "memory" else 0
+        )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "librosa": librosa.__version__,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "alignment": args.alignment,
+            "analysis": args.analysis,
+        },
+        "paths": {},
+        "results": {},
+    }
+    for duration in args.durations:
+        reference, recording = make_pair(duration, seed=duration)
+        mp3 = encode(reference, 44100, "mp3", "libmp3lame")
+        webm = encode(recording, 48000, "webm", "libopus")
+        # Прогрев: JIT numba и кэши фильтров librosa не должны попадать в замеры
+        run_pipeline(mp3, webm, 1)
+        timings, paths = run_pipeline(mp3, webm, args.repeat)
+        report["results"][f"{duration}s"] = {k: round(v, 6) for k, v in timings.items()}
+        report["paths"][f"{duration}s"] = paths
+        print(
+            f"{duration}s ({paths['webm']}): "
+            + ", ".join(f"{k}={v:.4f}" for k, v in timings.items())
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = check_regressions(report, baseline, args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import numpy as np
+import soundfile as sf
+
+from prometheus_client import REGISTRY
+
+from app.core.analysis_executor import AnalysisExecutor, ExecutorBusyError
+from app.core.comparison_cache import ComparisonResultCache
+from app.core.comparison_jobs import JOB_DONE, JOB_FAILED, ComparisonJobStore
+from app.core.compare_melodies import extract_melody_from_audio, melody_cache
+
+
+def kill_worker(delay: float) -> None:
+    """Убивает процесс воркера, как это сделал бы OOM killer."""
+    time.sleep(delay)
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def worker_pid(delay: float) -> int:
+    """Занимает воркер на delay секунд и возвращает его pid."""
+    time.sleep(delay)
+    return os.getpid()
+
+
+class TestAnalysisExecutor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        sample_rate = 22050
+        t = np.linspace(0, 1.0, sample_rate)
+        buffer = io.BytesIO()
+        sf.write(
+            buffer,
+            0.5 * np.sin(2 * np.pi * 440 * t),
+            sample_rate,
+            format="WAV",
+            subtype="PCM_16",
+        )
+        self.sine_bytes = buffer.getvalue()
+        self.executor = AnalysisExecutor(
+            backend="thread",
+            workers=1,
+            max_tasks_per_child=0,
+            queue_size=1,
+            task_timeout=60,
+        )
+        melody_cache.clear()
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_compare_uses_reference_cache(self):
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        hits = sample("brassbook_melody_cache_requests_total", outcome="hit")
+        misses = sample("brassbook_melody_cache_requests_total", outcome="miss")
+        for _ in range(2):
+            result = await self.executor.compare(
+                self.sine_bytes, self.sine_bytes, "wav", "wav"
+            )
+            self.assertEqual(result[0], 1)
+        stats = melody_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(self.executor.pending, 0)
+
+        # Счетчики кэша эталонов экспортируются на /metrics
+        self.assertEqual(
+            sample("brassbook_melody_cache_requests_total", outcome="hit"), hits + 1
+        )
+        self.assertEqual(
+            sample("brassbook_melody_cache_requests_total", outcome="miss"),
+            misses + 1,
+        )
+        self.assertEqual(sample("brassbook_melody_cache_size"), 1)
+
+    async def test_warm_up(self):
+        with self.assertLogs("app.core.analysis_executor", "INFO") as logs:
+            await self.executor.warm_up()
+        self.assertIn("Analysis warm-up finished", logs.output[-1])
+        result = await self.executor.compare(
+            self.sine_bytes, self.sine_bytes, "wav", "wav"
+        )
+        self.assertEqual(result[0], 1)
+
+    async def test_compare_exports_stage_metrics(self):
+        def sample(name, **labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        before = sample(
+            "brassbook_analysis_stage_seconds_count", stage="scoring", format="wav"
+        )
+        await self.executor.compare(self.sine_bytes, self.sine_bytes, "wav", "wav")
+
+        for stage in ("decode", "trim", "mel_spectrogram", "scoring", "total"):
+            self.assertGreater(
+                sample(
+                    "brassbook_analysis_stage_seconds_count", stage=stage, format="wav"
+                ),
+                0,
+            )
+        self.assertEqual(
+            sample(
+                "brassbook_analysis_stage_seconds_count", stage="scoring", format="wav"
+            ),
+            before + 1,
+        )
+        self.assertGreater(
+            sample("brassbook_analysis_input_duration_seconds_sum", format="wav"), 0
+        )
+        self.assertGreater(
+            sample("brassbook_analysis_peak_rss_growth_bytes_count", format="wav"),
+            0,
+        )
+
+    async def test_reserve_rejects_when_full(self):
+        with self.executor.reserve(2):
+            with self.assertRaises(ExecutorBusyError):
+                with self.executor.reserve():
+                    pass
+        self.assertEqual(self.executor.pending, 0)
+
+    async def test_abandoned_task_keeps_its_slot(self):
+        self.executor.task_timeout = 0.05
+        release = threading.Event()
+        try:
+            with self.executor.reserve():
+                with self.assertRaises(asyncio.TimeoutError):
+                    await self.executor.run(release.wait)
+            # Задача все еще занимает поток: слот не возвращается
+            self.assertEqual(self.executor.pending, 1)
+
+            # Вторая задача ждет в очереди пула и отменяется вместе с запросом
+            with self.executor.reserve():
+                with self.assertRaises(asyncio.TimeoutError):
+                    await self.executor.run(time.sleep, 0)
+            await asyncio.sleep(0.01)
+            self.assertEqual(self.executor.pending, 1)
+            with self.assertRaises(ExecutorBusyError):
+                with self.executor.reserve(2):
+                    pass
+        finally:
+            release.set()
+        for _ in range(100):
+            if self.executor.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.executor.pending, 0)
+
+    def test_pool_created_once_from_many_threads(self):
+        executor = AnalysisExecutor(
+            backend="process",
+            workers=1,
+            max_tasks_per_child=0,
+            queue_size=1,
+            task_timeout=60,
+        )
+        created = []
+
+        def slow_pool(**kwargs):
+            time.sleep(0.05)
+            pool = mock.Mock()
+            created.append(pool)
+            return pool
+
+        with mock.patch(
+            "app.core.analysis_executor.ProcessPoolExecutor", side_effect=slow_pool
+        ):
+            threads = [
+                threading.Thread(target=executor._get_process_pool) for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+        executor._process_pool = None
+
+    async def test_dead_worker_releases_its_slot(self):
+        executor = AnalysisExecutor(
+            backend="process",
+            workers=1,
+            max_tasks_per_child=0,
+            queue_size=0,
+            task_timeout=0.1,
+        )
+        try:
+            # Запрос уходит по таймауту, затем воркер погибает
+            with executor.reserve():
+                with self.assertRaises(asyncio.TimeoutError):
+                    await executor.run(kill_worker, 0.5)
+            self.assertEqual(executor.pending, 1)
+            for _ in range(1000):
+                if executor.pending == 0:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(executor.pending, 0)
+
+            # Пул пересоздан, следующие задачи выполняются
+            executor.task_timeout = 60
+            with executor.reserve():
+                self.assertEqual(await executor.run(abs, -3), 3)
+        finally:
+            executor.shutdown()
+
+    async def test_manual_recycling_never_doubles_the_workers(self):
+        executor = AnalysisExecutor(
+            backend="process",
+            workers=2,
+            max_tasks_per_child=1,
+            queue_size=4,
+            task_timeout=60,
+        )
+        running = []
+        sampling = threading.Event()
+
+        def sample():
+            while not sampling.is_set():
+                running.append(len(multiprocessing.active_children()))
+                time.sleep(0.005)
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        try:
+            # Ручная замена пула, как на Python 3.9 в Docker-образе
+            with mock.patch(
+                "app.core.analysis_executor.NATIVE_WORKER_RECYCLING", False
+            ):
+                pids = await asyncio.gather(
+                    *(executor.run(worker_pid, 0.2) for _ in range(6))
+                )
+        finally:
+            sampling.set()
+            sampler.join()
+            executor.shutdown()
+        # Каждый пул принял по две задачи и был заменен
+        self.assertGreaterEqual(len(set(pids)), 3)
+        self.assertLessEqual(max(running), 2)
+
+    async def test_comparison_jobs(self):
+        jobs = ComparisonJobStore(self.executor, ttl=60)
+        melody, min_per = extract_melody_from_audio(self.sine_bytes, "wav")
+        job = jobs.submit(1, self.sine_bytes, self.sine_bytes, "wav", "wav")
+        failed = jobs.submit(1, self.sine_bytes, b"not audio", "wav", "webm")
+        await asyncio.gather(job.task, failed.task)
+        catalog = jobs.submit_with_melody(1, melody, min_per, self.sine_bytes, "wav")
+        await catalog.task
+
+        self.assertEqual(jobs.get(job.id, 1).status, JOB_DONE)
+        self.assertEqual(jobs.get(job.id, 1).result[0], 1)
+        self.assertEqual(jobs.get(failed.id, 1).status, JOB_FAILED)
+        self.assertEqual(jobs.get(catalog.id, 1).result, jobs.get(job.id, 1).result)
+        self.assertIsNone(jobs.get("unknown", 1))
+        # Результат виден только отправившему задачу пользователю
+        self.assertIsNone(jobs.get(job.id, 2))
+        self.assertEqual(self.executor.pending, 0)
+
+        jobs.ttl = -1
+        self.assertIsNone(jobs.get(job.id, 1))
+
+    async def test_identical_comparisons_are_computed_once(self):
+        self.executor.result_cache = ComparisonResultCache(maxsize=8, ttl=60)
+        melody, min_per = extract_melody_from_audio(self.sine_bytes, "wav")
+        calls = []
+        run_comparison = self.executor._run_comparison
+
+        async def counted(*args):
+            calls.append(args)
+            return await run_comparison(*args)
+
+        self.executor._run_comparison = counted
+        # Очередь вмещает два сравнения, третье ждет уже запущенное
+        results = await asyncio.gather(
+            *(
+                self.executor.compare_with_melody(
+                    melody, min_per, self.sine_bytes, "wav"
+                )
+                for _ in range(3)
+            )
+        )
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+        again = await self.executor.compare(
+            self.sine_bytes, self.sine_bytes, "wav", "wav"
+        )
+        self.assertIs(again, results[0])
+        failed = await self.executor.compare_with_melody(
+            melody, min_per, b"not audio", "webm"
+        )
+        self.assertIsNone(failed)
+        stats = self.executor.result_cache.stats()
+        self.assertEqual(
+            (stats["hits"], stats["misses"], stats["coalesced"], stats["size"]),
+            (1, 2, 2, 1),
+        )
+        self.assertEqual(self.executor.pending, 0)
+
+    async def test_cache_hit_needs_no_slot(self):
+        self.executor.result_cache = ComparisonResultCache(maxsize=8, ttl=60)
+        first = await self.executor.compare(
+            self.sine_bytes, self.sine_bytes, "wav", "wav"
+        )
+        self.assertEqual(first[0], 1)
+
+        # Эталон и результат уже в кэше: полная очередь не мешает ответу
+        with self.executor.reserve(self.executor.capacity):
+            again = await self.executor.compare(
+                self.sine_bytes, self.sine_bytes, "wav", "wav"
+            )
+            self.assertIs(again, first)
+            with self.assertRaises(ExecutorBusyError):
+                await self.executor.compare(
+                    self.sine_bytes, b"other take", "wav", "wav"
+                )
+        self.assertEqual(self.executor.pending, 0)
+
+    async def test_batch_reads_recordings_when_a_slot_is_free(self):
+        melody, min_per = extract_melody_from_audio(self.sine_bytes, "wav")
+        loaded, finished = [], []
+
+        async def load():
+            loaded.append(1)
+            return self.sine_bytes
+
+        async def unavailable():
+            raise OSError("storage unavailable")
+
+        async def run_comparison(*args):
+            # Прочитано не больше записей, чем воркеров (здесь один)
+            self.assertEqual(len(loaded) - len(finished), 1)
+            await asyncio.sleep(0)
+            finished.append(1)
+            return (1,)
+
+        self.executor._run_comparison = run_comparison
+        results = await self.executor.compare_batch_with_melody(
+            melody, min_per, [load, unavailable, load, load], "wav"
+        )
+        self.assertEqual(results, [(1,), None, (1,), (1,)])
+        self.assertEqual(self.executor.pending, 0)
+
+    async def test_batch_keeps_results_when_one_recording_fails(self):
+        melody, min_per = extract_melody_from_audio(self.sine_bytes, "wav")
+
+        async def run_comparison(teacher_melody, min_per_t, recording, file_format):
+            # Например, воркер погиб и пул процессов сломан
+            if recording == b"broken":
+                raise BrokenProcessPool("worker died")
+            return (1,)
+
+        self.executor._run_comparison = run_comparison
+        with self.assertLogs("app.core.analysis_executor", "ERROR") as logs:
+            results = await self.executor.compare_batch_with_melody(
+                melody, min_per, [b"ok", b"broken", b"ok"], "wav"
+            )
+        self.assertEqual(results, [(1,), None, (1,)])
+        self.assertIn("recording 1 failed", logs.output[0])
+        self.assertEqual(self.executor.pending, 0)
+
+    def test_result_cache_ttl_and_size(self):
+        cache = ComparisonResultCache(maxsize=2, ttl=60)
+        for name in ("a", "b", "c"):
+            cache.put((name, name, "v1"), name)
+        self.assertIsNone(cache.get(("a", "a", "v1")))
+        self.assertEqual(cache.get(("c", "c", "v1")), "c")
+        self.assertIsNone(cache.get(("c", "c", "v2")))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        cache.ttl = -1
+        self.assertIsNone(cache.get(("c", "c", "v1")))
+        self.assertEqual(cache.stats()["size"], 1)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            AnalysisExecutor("gpu", 1, 0, 0, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+import numpy as np
+
+from app.core.analysis_metrics import collect_stats, stage
+
+
+class TestAnalysisMetrics(unittest.TestCase):
+
+    def test_peak_rss_is_measured_per_task(self):
+        with collect_stats("wav") as large:
+            with stage("decode"):
+                buffer = np.ones(8 * 1024 * 1024)  # 64 МБ
+            del buffer
+        with collect_stats("wav") as small:
+            np.ones(1024)
+
+        self.assertIn("decode", large.stages)
+        self.assertGreater(large.peak_rss_growth_bytes, 48 * 1024 * 1024)
+        # Пик предыдущей задачи не переносится на следующую
+        self.assertLess(small.peak_rss_growth_bytes, 16 * 1024 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import unittest
+
+import av
+import numpy as np
+import soundfile as sf
+
+from app.core.audio_decoder import AudioDecodeError, decode_audio
+
+
+def encode_audio(audio: np.ndarray, sr: int, container: str, codec: str) -> bytes:
+    """Кодирует моно сигнал в указанный контейнер средствами PyAV."""
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format=container) as output:
+        stream = output.add_stream(codec, rate=sr)
+        stream.layout = "mono"
+        frame_size = 960
+        for start in range(0, len(audio), frame_size):
+            chunk = audio[start : start + frame_size].astype(np.float32)
+            frame = av.AudioFrame.from_ndarray(
+                chunk[np.newaxis, :], format="flt", layout="mono"
+            )
+            frame.sample_rate = sr
+            for packet in stream.encode(frame):
+                output.mux(packet)
+        for packet in stream.encode(None):
+            output.mux(packet)
+    return buffer.getvalue()
+
+
+class TestAudioDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.sample_rate = 48000
+        t = np.arange(self.sample_rate) / self.sample_rate
+        self.sine_wave = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+    def test_decode_wav_stereo_downmix(self):
+        stereo = np.stack([self.sine_wave, np.zeros_like(self.sine_wave)], axis=1)
+        buffer = io.BytesIO()
+        sf.write(buffer, stereo, self.sample_rate, format="WAV", subtype="FLOAT")
+
+        samples, sr = decode_audio(buffer.getvalue(), "wav")
+        self.assertEqual(sr, self.sample_rate)
+        self.assertEqual(samples.dtype, np.float32)
+        np.testing.assert_allclose(samples, self.sine_wave / 2, atol=1e-6)
+
+    def test_decode_mp3_and_webm(self):
+        for container, codec in (("mp3", "libmp3lame"), ("webm", "libopus")):
+            with self.subTest(container=container):
+                data = encode_audio(self.sine_wave, self.sample_rate, container, codec)
+                samples, sr = decode_audio(data, container)
+                self.assertEqual(sr, self.sample_rate)
+                self.assertEqual(samples.ndim, 1)
+                self.assertAlmostEqual(len(samples) / sr, 1.0, delta=0.1)
+
+    def test_decode_resamples_to_analysis_rate(self):
+        buffer = io.BytesIO()
+        sf.write(buffer, self.sine_wave, self.sample_rate, format="WAV")
+
+        samples, sr = decode_audio(buffer.getvalue(), "wav", sample_rate=22050)
+        self.assertEqual(sr, 22050)
+        self.assertEqual(samples.dtype, np.float32)
+        self.assertAlmostEqual(len(samples), 22050, delta=1)
+
+    def test_decode_invalid_data(self):
+        with self.assertRaises(AudioDecodeError):
+            decode_audio(b"not an audio file", "mp3")
+        with self.assertRaises(AudioDecodeError):
+            decode_audio(b"", "mp3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import io
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageFile
+
+from app.core.avatar_images import (
+    parse_sizes,
+    pick_variant,
+    render_thumbnails,
+    thumbnail_name,
+)
+
+
+def encode(image: Image.Image, fmt: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+MAX_PIXELS = 10**6
+
+
+class TestRenderThumbnails(unittest.TestCase):
+
+    def test_sizes_and_formats(self):
+        data = encode(Image.new("RGB", (600, 300), (200, 30, 30)), "JPEG")
+        thumbnails = render_thumbnails(data, [64, 256, 1024], MAX_PIXELS)
+        self.assertEqual(
+            sorted(thumbnails),
+            [(64, "jpeg"), (64, "webp"), (256, "jpeg"), (256, "webp")],
+        )
+        with Image.open(io.BytesIO(thumbnails[(256, "webp")])) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (256, 128)))
+        with Image.open(io.BytesIO(thumbnails[(64, "jpeg")])) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (64, 32)))
+
+    def test_large_jpeg_decoded_at_reduced_scale(self):
+        # Черновик JPEG уменьшает изображение до 512, но размер 512 не теряется
+        data = encode(Image.new("RGB", (1024, 1024), (30, 200, 30)), "JPEG")
+        thumbnails = render_thumbnails(data, [128, 512], MAX_PIXELS * 2)
+        self.assertEqual(
+            sorted(thumbnails),
+            [(128, "jpeg"), (128, "webp"), (512, "jpeg"), (512, "webp")],
+        )
+        with Image.open(io.BytesIO(thumbnails[(512, "jpeg")])) as image:
+            self.assertEqual(image.size, (512, 512))
+
+    def test_exif_rotation_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Ориентация: повернуто на 90 градусов
+        data = encode(Image.new("RGB", (400, 200)), "JPEG", exif=exif)
+        thumbnail = render_thumbnails(data, [100], MAX_PIXELS)[(100, "webp")]
+        with Image.open(io.BytesIO(thumbnail)) as image:
+            self.assertEqual(image.size, (50, 100))
+
+    def test_transparency_kept_in_webp_only(self):
+        data = encode(Image.new("RGBA", (300, 300), (0, 0, 255, 0)), "PNG")
+        thumbnails = render_thumbnails(data, [64], MAX_PIXELS)
+        with Image.open(io.BytesIO(thumbnails[(64, "webp")])) as image:
+            self.assertEqual(image.mode, "RGBA")
+        with Image.open(io.BytesIO(thumbnails[(64, "jpeg")])) as image:
+            self.assertEqual(image.getpixel((10, 10)), (255, 255, 255))
+
+    def test_too_many_pixels_rejected_before_decoding(self):
+        data = encode(Image.new("L", (2000, 1000)), "PNG")
+        with mock.patch.object(ImageFile.ImageFile, "load") as load:
+            with self.assertRaises(Image.DecompressionBombError):
+                render_thumbnails(data, [64], MAX_PIXELS)
+        load.assert_not_called()
+
+    def test_decompression_bomb_warning_is_an_error(self):
+        data = encode(Image.new("L", (300, 300)), "PNG")
+        # Pillow предупреждает об изображениях больше MAX_IMAGE_PIXELS
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 300 * 200):
+            with self.assertRaises(Image.DecompressionBombWarning):
+                render_thumbnails(data, [64], MAX_PIXELS)
+
+
+class TestPickVariant(unittest.TestCase):
+
+    def test_smallest_fitting_thumbnail(self):
+        self.assertEqual(
+            pick_variant("avatars/1_me.png", [64, 128, 256], 100, "webp"),
+            thumbnail_name("avatars/1_me.png", 128, "webp"),
+        )
+        self.assertEqual(
+            pick_variant("avatars/1_me.png", [64, 128, 256], 64, "jpeg"),
+            "avatars/1_me.png@64.jpg",
+        )
+
+    def test_original_as_fallback(self):
+        self.assertEqual(pick_variant("a.png", [64, 128], 512, "webp"), "a.png")
+        self.assertEqual(pick_variant("a.png", [], 64, "webp"), "a.png")
+        self.assertEqual(pick_variant("a.png", [64], None, "webp"), "a.png")
+
+    def test_parse_sizes(self):
+        self.assertEqual(parse_sizes("64,128"), [64, 128])
+        self.assertEqual(parse_sizes(None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.data.database import Base
+from app.data.models import User
+
+# Модуль хранилища проверяет бакет при импорте; сервер MinIO тестам не нужен
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app.core.avatar_thumbnails import AvatarThumbnailer
+
+
+class MemoryStorage:
+    """Object storage keeping objects in a dict."""
+
+    bucket = "bucket"
+
+    def __init__(self):
+        self.objects = {}
+
+    async def put_bytes(self, object_name, data, content_type):
+        self.objects[object_name] = data
+
+    async def get_bytes(self, object_name):
+        return self.objects[object_name]
+
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TestAvatarThumbnailer(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        Base.metadata.create_all(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        db = self.sessions()
+        user = User(email="student@example.com", photo_url="/bucket/avatars/1.png")
+        db.add(user)
+        db.commit()
+        self.user_id = user.id
+        db.close()
+
+        self.storage = MemoryStorage()
+        # Как и общий экземпляр, создается вне цикла событий
+        self.thumbnailer = AvatarThumbnailer(
+            self.storage, self.sessions, [64, 128], 1, max_pixels=10**6
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def process(self):
+        asyncio.run(self.thumbnailer.process(self.user_id, "/bucket/avatars/1.png"))
+
+    def photo_sizes(self):
+        db = self.sessions()
+        try:
+            return db.get(User, self.user_id).photo_sizes
+        finally:
+            db.close()
+
+    def test_thumbnails_stored(self):
+        self.storage.objects["avatars/1.png"] = png(300, 200)
+        # Семафор создается уже в работающем цикле
+        self.assertFalse(self.thumbnailer._slots.created)
+        self.process()
+        self.assertEqual(self.photo_sizes(), "64,128")
+        self.assertIn("avatars/1.png@64.webp", self.storage.objects)
+        self.assertIn("avatars/1.png@128.jpg", self.storage.objects)
+
+    def test_too_large_source_skipped(self):
+        self.storage.objects["avatars/1.png"] = png(2000, 1000)
+        self.process()
+        self.assertIsNone(self.photo_sizes())
+        self.assertEqual(list(self.storage.objects), ["avatars/1.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,19 +2,38 @@ import logging
 import os
 import tempfile
 import unittest
+from math import floor
+from unittest import mock
 
+import librosa
 import numpy as np
 import soundfile as sf
 
-from app.core.compare_melodies import (calculate_average_volume,
+from app.core.compare_melodies import (MELODY_DTYPE, AudioConfig, BlockContour,
+                                       MelodyCache, SignalEnergy,
+                                       StreamingContour,
+                                       align_melody_sequences, analysis_hop_length,
+                                       audible_frames,
+                                       audio_config_fingerprint,
+                                       calculate_average_volume,
                                        calculate_frequency,
                                        calculate_integral_indicator,
                                        calculate_loudness, calculate_rhythm,
                                        compare_melodies,
                                        compare_melody_sequences,
-                                       extend_to_max_length, normalize_melody,
+                                       dtw_melody_sequences,
+                                       extend_to_max_length,
+                                       extract_melody_from_audio,
+                                       extract_melody_from_signal, extract_notes,
+                                       mel_spectrogram_db, melody_cache_key,
+                                       melody_contour,
+                                       melody_from_bytes, melody_from_packed,
+                                       melody_to_bytes, normalize_melody,
+                                       normalize_melody_array,
                                        process_characteristics,
-                                       synchronize_melodies)
+                                       process_characteristics_batch,
+                                       synchronize_melodies, trim_bounds,
+                                       trim_frame_bounds)
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -52,6 +71,11 @@ class TestMelodyComparison(unittest.TestCase):
         result = compare_melodies(b"", self.sine_bytes)
         self.assertIsNone(result)
 
+    def test_compare_melodies_identical(self):
+        result = compare_melodies(self.sine_bytes, self.sine_bytes, "wav", "wav")
+        self.assertIsNotNone(result)
+        self.assertEqual(result[0], 1)
+
     def test_synchronize_melodies(self):
         teacher_melody = [1.0, 1.0, 2.0, 3.0]
         children_melody = [1.0, 1.0, 2.0, 3.0]
@@ -80,6 +104,33 @@ class TestMelodyComparison(unittest.TestCase):
         self.assertEqual(len(f_t), len(f_c))
         self.assertEqual(len(t_m_new), len(c_m_new))
 
+    def test_dtw_alignment_inserts_placeholders(self):
+        teacher = melody_from_packed(np.repeat([1.3, 2.3, 3.3, 4.3], 10))
+        children = melody_from_packed(np.repeat([1.3, 3.3, 4.3, 0.3], 10))
+        result = dtw_melody_sequences(
+            [1, 2, 3, 4], [1, 3, 4, 0], [10] * 4, [10] * 4, teacher, children
+        )
+        t_mel, c_mel, f_t, f_c, t_m_new, c_m_new = result
+        self.assertEqual(f_t.tolist(), [1, 2, 3, 4, 6])
+        self.assertEqual(f_c.tolist(), [1, 6, 3, 4, 0])
+        self.assertEqual(t_m_new.tolist(), [10, 10, 10, 10, 1])
+        self.assertEqual(c_m_new.tolist(), [10, 1, 10, 10, 10])
+        self.assertEqual(len(t_mel), len(c_mel))
+
+    def test_alignment_mode_from_config(self):
+        original = AudioConfig.ALIGNMENT
+        try:
+            AudioConfig.ALIGNMENT = "dtw"
+            result = compare_melodies(
+                self.sine_bytes, self.sine_bytes, file1_format="wav", file2_format="wav"
+            )
+            self.assertEqual(result[0], 1.0)
+            AudioConfig.ALIGNMENT = "unknown"
+            with self.assertRaises(ValueError):
+                align_melody_sequences([], [], [], [], [], [], [], [])
+        finally:
+            AudioConfig.ALIGNMENT = original
+
     def test_normalize_melody(self):
         melody = [1.25, 2.75, 3.1]
         normalized = normalize_melody(melody)
@@ -128,3 +179,249 @@ class TestMelodyComparison(unittest.TestCase):
         extended1, extended2 = extend_to_max_length(list1, list2, 0)
         self.assertEqual(extended1, [1, 2, 0, 0])
         self.assertEqual(extended2, [1, 2, 3, 4])
+
+    def test_melody_cache_lru(self):
+        cache = MelodyCache(maxsize=2)
+        cache.put("a", [1.0, 2.0], 1.5)
+        cache.put("b", [3.0], 2.5)
+        melody, min_per = cache.get("a")
+        self.assertEqual(melody["band"].tolist(), [1, 2])
+        self.assertEqual(min_per, 1.5)
+        cache.put("c", [4.0], 3.5)
+        self.assertIsNone(cache.get("b"))
+
+        melody, _ = cache.get("a")
+        with self.assertRaises(ValueError):
+            melody["band"][0] = 5
+        self.assertEqual(
+            cache.stats(),
+            {"hits": 2, "misses": 1, "evictions": 1, "size": 2, "maxsize": 2},
+        )
+
+    def test_melody_cache_key_depends_on_config(self):
+        key = melody_cache_key(self.sine_bytes, "wav")
+        self.assertEqual(key, melody_cache_key(self.sine_bytes, "wav"))
+        self.assertNotEqual(key, melody_cache_key(self.silence_bytes, "wav"))
+
+        original = AudioConfig.TRIM_DB
+        AudioConfig.TRIM_DB = original + 1
+        try:
+            self.assertNotEqual(key, melody_cache_key(self.sine_bytes, "wav"))
+        finally:
+            AudioConfig.TRIM_DB = original
+
+    def test_melody_serialization_roundtrip(self):
+        melody = melody_from_packed([0.0, 1.12, 1.12, 3.05])
+        data = melody_to_bytes(melody, 10.77)
+        restored, min_per, fingerprint = melody_from_bytes(data)
+        self.assertEqual(restored.dtype, MELODY_DTYPE)
+        np.testing.assert_array_equal(restored, melody)
+        self.assertEqual(min_per, 10.77)
+        self.assertEqual(fingerprint, audio_config_fingerprint())
+
+    def test_melody_contour_matches_packed_floats(self):
+        rng = np.random.default_rng(1)
+        db_mel = rng.uniform(-20, 80, (500, 5))
+        db_mel[rng.random(500) < 0.2] = -1
+
+        # Прежнее представление: номер полосы плюс громкость / 100
+        mask = np.all(db_mel < 0, axis=1)
+        packed = np.zeros(len(db_mel))
+        packed[~mask] = np.argmax(db_mel[~mask], axis=1) + np.round(
+            np.max(db_mel[~mask], axis=1)
+        ) / 100
+
+        melody = melody_contour(db_mel)
+        self.assertEqual(melody.dtype, MELODY_DTYPE)
+        np.testing.assert_array_equal(melody, melody_from_packed(packed))
+        np.testing.assert_array_equal(
+            normalize_melody_array(melody), normalize_melody_array(packed)
+        )
+        np.testing.assert_array_equal(audible_frames(melody), packed != 0)
+
+    def test_trim_bounds_match_librosa(self):
+        rng = np.random.default_rng(2)
+        sr = AudioConfig.SAMPLE_RATE
+        envelope = np.concatenate(
+            (np.zeros(sr // 3), np.linspace(0, 1, sr), np.ones(sr), np.zeros(777))
+        )
+        signals = [
+            self.sine_wave.astype(np.float32),
+            self.silence.astype(np.float32),
+            (envelope * rng.standard_normal(len(envelope))).astype(np.float32),
+            rng.standard_normal(300).astype(np.float32),
+        ]
+        for y in signals:
+            _, expected = librosa.effects.trim(
+                y,
+                top_db=AudioConfig.TRIM_DB,
+                frame_length=AudioConfig.N_FFT,
+                hop_length=analysis_hop_length(),
+            )
+            self.assertEqual(trim_bounds(y), tuple(expected))
+
+    def test_band_mel_spectrogram_matches_full(self):
+        sr = AudioConfig.SAMPLE_RATE
+
+        def full_db(y):
+            mel = librosa.feature.melspectrogram(
+                y=y,
+                sr=sr,
+                n_fft=AudioConfig.N_FFT,
+                hop_length=analysis_hop_length(),
+                n_mels=AudioConfig.N_MELS,
+            )
+            return np.transpose(librosa.amplitude_to_db(mel)[AudioConfig.FREQ_BANDS])
+
+        t = np.arange(3 * sr) / sr
+        tone = (0.3 * np.sin(2 * np.pi * 250 * t)).astype(np.float32)
+        # Тишина и громкий высокий тон: порог top_db задают полосы вне FREQ_BANDS
+        loud = tone.copy()
+        loud[: sr // 2] = 0
+        loud[-sr // 2 :] = np.sin(2 * np.pi * 4000 * t[-sr // 2 :])
+        noise = np.random.default_rng(0).standard_normal(sr).astype(np.float32)
+
+        for y in (tone, loud, noise):
+            np.testing.assert_array_equal(
+                melody_contour(mel_spectrogram_db(y, sr)), melody_contour(full_db(y))
+            )
+        np.testing.assert_array_equal(mel_spectrogram_db(loud, sr), full_db(loud))
+
+    def test_block_contour_matches_signal(self):
+        sr = AudioConfig.SAMPLE_RATE
+        t = np.arange(3 * sr) / sr
+        loud = (0.3 * np.sin(2 * np.pi * 250 * t)).astype(np.float32)
+        loud[: sr // 2] = 0
+        loud[-sr // 2 :] = np.sin(2 * np.pi * 4000 * t[-sr // 2 :])
+        noise = np.random.default_rng(0).standard_normal(sr).astype(np.float32)
+
+        for y in (loud, noise, loud[:1000]):
+            with mock.patch("app.core.compare_melodies.ANALYSIS_BLOCK_SECONDS", 0.3):
+                contour = BlockContour(sr, len(y))
+                energy = SignalEnergy()
+                for i in range(0, len(y), 777):
+                    contour.feed(y[i : i + 777])
+                    energy.feed(y[i : i + 777])
+                np.testing.assert_array_equal(
+                    contour.finish(), melody_contour(mel_spectrogram_db(y, sr))
+                )
+            self.assertEqual(
+                trim_frame_bounds(energy.frame_energy(), energy.samples),
+                trim_bounds(y),
+            )
+
+    def test_streaming_contour_matches_signal(self):
+        sr = AudioConfig.SAMPLE_RATE
+        t = np.arange(3 * sr) / sr
+        tone = 0.3 * np.sin(2 * np.pi * 300 * t)
+        # Тишина с обеих сторон: граничные кадры пересчитываются в finish
+        gaps = tone.copy()
+        gaps[: sr // 2] = 0
+        gaps[-sr:] = 0
+        # Нарастание и затухание: начало и конец сдвигаются с максимумом
+        fade = tone * np.minimum(1, t / 1.5) * np.exp(-np.maximum(0, t - 1.5) * 2)
+        burst = np.zeros(sr)
+        burst[sr // 2 : sr // 2 + 1500] = tone[:1500]
+        tail = np.zeros(sr + 77)
+        tail[-300:] = tone[:300]
+        noise = np.random.default_rng(0).standard_normal(sr) * 0.1
+
+        for y in (gaps, fade, burst, tail, noise):
+            y = y.astype(np.float32)
+            contour = StreamingContour(sr)
+            for i in range(0, len(y), 441):
+                contour.feed(y[i : i + 441])
+            expected, _ = extract_melody_from_signal(y, sr)
+            np.testing.assert_array_equal(contour.finish(), expected)
+
+        with self.assertRaises(ValueError):
+            StreamingContour(sr).finish()
+
+    def test_long_recording_is_analysed_in_blocks(self):
+        sr = 44100
+        t = np.arange(4 * sr) / sr
+        y = 0.3 * np.sin(2 * np.pi * np.where(t < 2, 250, 330) * t)
+        y[: sr // 2] = 0
+        data = self._audio_to_bytes(y, sr)
+
+        expected, _ = extract_melody_from_audio(data, "wav")
+        with mock.patch(
+            "app.core.compare_melodies.ANALYSIS_IN_MEMORY_SECONDS", 1
+        ), mock.patch("app.core.compare_melodies.ANALYSIS_BLOCK_SECONDS", 0.5):
+            melody, _ = extract_melody_from_audio(data, "wav")
+        np.testing.assert_array_equal(melody, expected)
+
+    def test_extract_notes_matches_frame_loop(self):
+        def reference(melody, min_per):
+            counter, all_notes, freq, lengths = 0, [], [], []
+            for i in range(len(melody) - 1):
+                if floor(melody[i]) == floor(melody[i + 1]):
+                    counter += 1
+                elif counter >= min_per:
+                    all_notes.append(floor(melody[i]) + counter / 100)
+                    freq.append(floor(melody[i]))
+                    lengths.append(counter)
+                    counter = 0
+            return all_notes, freq, lengths
+
+        rng = np.random.default_rng(0)
+        for min_per in (0, 1, 2.5, 7):
+            bands = np.repeat(rng.integers(0, 5, 400), rng.integers(1, 12, 400))
+            melody = bands + rng.integers(0, 60, len(bands)) / 100
+            all_notes, freq, lengths = extract_notes(melody, min_per)
+            expected = reference(melody.tolist(), min_per)
+            self.assertEqual(all_notes.tolist(), expected[0])
+            self.assertEqual(freq.tolist(), expected[1])
+            self.assertEqual(lengths.tolist(), expected[2])
+
+    def test_scoring_arrays_match_frame_loops(self):
+        def loudness_reference(t_m, c_m, teacher_m, children_m):
+            res, counter_t, counter_c = [], 0, 0
+            for i in range(len(t_m)):
+                t_sum = sum(teacher_m[counter_t : counter_t + t_m[i]])
+                c_sum = sum(children_m[counter_c : counter_c + c_m[i]])
+                ok = t_sum != 0 and abs(1 - (c_sum / c_m[i]) / (t_sum / t_m[i])) <= 0.25
+                res.extend([0 if ok else 1] * c_m[i])
+                counter_t += t_m[i]
+                counter_c += c_m[i]
+            return res
+
+        def rhythm_reference(t_m, c_m):
+            res = []
+            for t, c in zip(t_m, c_m):
+                if abs((t - c) / t) <= 0.25:
+                    res += [0] * c
+                else:
+                    res += [0] * min(t, c) + [1] * abs(c - t)
+            return res
+
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            n = int(rng.integers(1, 20))
+            t_m = rng.integers(1, 30, n).tolist()
+            c_m = rng.integers(1, 30, n).tolist()
+            teacher_m = rng.integers(0, 60, 300).tolist()
+            children_m = rng.integers(0, 60, 300).tolist()
+            self.assertEqual(
+                calculate_loudness(t_m, c_m, teacher_m, children_m),
+                loudness_reference(t_m, c_m, teacher_m, children_m),
+            )
+            self.assertEqual(calculate_rhythm(t_m, c_m), rhythm_reference(t_m, c_m))
+
+    def test_process_characteristics_batch_matches_slicing_loop(self):
+        def reference(x, time):
+            y, count = [], round(round(time, 2) * 4)
+            while len(x) >= count:
+                y.append(1 if sum(x[:count]) / count > 0.5 else 0)
+                x = x[count:]
+            if x:
+                y.append(1 if sum(x) / len(x) > 0.5 else 0)
+            return y
+
+        rng = np.random.default_rng(0)
+        series = [rng.integers(0, 2, n).tolist() for n in (0, 1, 7, 8, 500, 1003)]
+        for time in (0.25, 1.0, 2, 3.3, 50):
+            expected = [reference(x, time) for x in series]
+            self.assertEqual(process_characteristics_batch(series, time), expected)
+            self.assertEqual(process_characteristics(series[4], time), expected[4])
+        self.assertEqual(process_characteristics_batch(series, 0.1), [[]] * 6)
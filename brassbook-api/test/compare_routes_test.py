@@ -0,0 +1,194 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from app.core.analysis_executor import ExecutorBusyError
+from app.core.auth import security
+from app.core.comparison_jobs import ComparisonJobStore
+from app.data.storage import get_object_storage
+
+# Модуль хранилища проверяет бакет при импорте; сервер MinIO тестам не нужен
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app import main
+    from app.api.routes import compare_routes
+
+COMPARE_URL = "/api/api/v1/compare_melodies"
+BATCH_URL = "/api/api/v1/compare_melodies/batch"
+JOBS_URL = "/api/api/v1/compare_melodies/jobs"
+REFERENCE = ("file1", ("ref.mp3", b"mp3", "audio/mpeg"))
+
+
+class RouteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        main.app.dependency_overrides[security.get_token_from_request] = lambda: None
+        self.addCleanup(main.app.dependency_overrides.clear)
+        self.client = TestClient(main.app)
+        self.executor = mock.Mock()
+        # Записи из хранилища: id -> (содержимое, формат)
+        self.recordings = {}
+        self.patch("analysis_executor", self.executor)
+        self.user = SimpleNamespace(id=1)
+        self.patch("get_current_user", mock.Mock(side_effect=lambda *args: self.user))
+        self.patch("load_recording", self.load_recording)
+        self.patch("find_recording", self.find_recording)
+        storage = mock.Mock(get_bytes=mock.AsyncMock(side_effect=self.get_bytes))
+        main.app.dependency_overrides[get_object_storage] = lambda: storage
+
+    def patch(self, name, value):
+        patcher = mock.patch.object(compare_routes, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def load_recording(self, db, storage, user, recording_id):
+        return self.recordings[recording_id]
+
+    def find_recording(self, db, user, recording_id):
+        return f"recordings/{recording_id}", self.recordings[recording_id][1]
+
+    async def get_bytes(self, object_name):
+        return self.recordings[int(object_name.split("/")[1])][0]
+
+
+class TestCompareRoute(RouteTestCase):
+
+    def test_stored_recording(self):
+        self.recordings[7] = (b"stored", "mp3")
+        self.executor.compare = mock.AsyncMock(return_value=(1, 2))
+        response = self.client.post(
+            COMPARE_URL, files=[REFERENCE], data={"recording_id": "7"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.executor.compare.assert_awaited_once_with(
+            b"mp3", b"stored", file2_format="mp3"
+        )
+
+    def test_recording_and_file_together(self):
+        self.recordings[7] = (b"stored", "webm")
+        files = [REFERENCE, ("file2", ("take.webm", b"webm", "audio/webm"))]
+        response = self.client.post(
+            COMPARE_URL, files=files, data={"recording_id": "7"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBatchRoute(RouteTestCase):
+
+    def post_batch(self, count: int):
+        files = [REFERENCE]
+        files += [
+            ("files", (f"take{i}.webm", b"webm", "audio/webm")) for i in range(count)
+        ]
+        return self.client.post(BATCH_URL, files=files)
+
+    async def read_batch(self, file1, recordings):
+        # Записи передаются загрузчиками и читаются только при сравнении
+        self.read = [await load() for load in recordings]
+        return self.batch_results
+
+    def test_results_in_upload_order(self):
+        self.executor.compare_batch = mock.AsyncMock(return_value=[(1, 2), None])
+        response = self.post_batch(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {"filename": "take0.webm", "recording_id": None, "result": [1, 2]},
+                {"filename": "take1.webm", "recording_id": None, "result": None},
+            ],
+        )
+
+    def test_stored_recordings(self):
+        self.recordings.update({3: (b"three", "webm"), 5: (b"five", "webm")})
+        self.batch_results = [(1,), (2,), None]
+        self.executor.compare_batch = mock.AsyncMock(side_effect=self.read_batch)
+        files = [REFERENCE, ("files", ("take.webm", b"webm", "audio/webm"))]
+        response = self.client.post(
+            BATCH_URL, files=files, data={"recording_ids": ["5", "3"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {"filename": "take.webm", "recording_id": None, "result": [1]},
+                {"filename": None, "recording_id": 5, "result": [2]},
+                {"filename": None, "recording_id": 3, "result": None},
+            ],
+        )
+        self.executor.compare_batch.assert_awaited_once()
+        self.assertEqual(self.read, [b"webm", b"five", b"three"])
+
+    def test_stored_recording_must_be_webm(self):
+        self.recordings[3] = (b"three", "wav")
+        self.executor.compare_batch = mock.AsyncMock()
+        response = self.client.post(
+            BATCH_URL, files=[REFERENCE], data={"recording_ids": ["3"]}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.executor.compare_batch.assert_not_called()
+
+    def test_too_many_files(self):
+        self.executor.compare_batch = mock.AsyncMock()
+        with mock.patch.object(compare_routes, "MAX_BATCH_FILES", 2):
+            response = self.post_batch(3)
+        self.assertEqual(response.status_code, 413)
+        self.executor.compare_batch.assert_not_called()
+
+    def test_busy(self):
+        self.executor.compare_batch = mock.AsyncMock(side_effect=ExecutorBusyError())
+        response = self.post_batch(1)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+
+    def test_timeout(self):
+        self.executor.compare_batch = mock.AsyncMock(side_effect=asyncio.TimeoutError())
+        response = self.post_batch(1)
+        self.assertEqual(response.status_code, 504)
+
+
+class TestJobRoutes(RouteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Задача сравнения не запускается: достаточно ее состояния "pending"
+        self.executor.start_compare = mock.Mock(return_value=mock.Mock())
+        self.executor.start_compare_with_melody = mock.Mock(return_value=mock.Mock())
+        self.patch("comparison_jobs", ComparisonJobStore(self.executor, ttl=60))
+
+    def test_job_visible_only_to_its_owner(self):
+        files = [REFERENCE, ("file2", ("take.webm", b"webm", "audio/webm"))]
+        response = self.client.post(JOBS_URL, files=files)
+        self.assertEqual(response.status_code, 202)
+        self.executor.start_compare.assert_called_once_with(
+            b"mp3", b"webm", "mp3", "webm"
+        )
+        job_url = f"{JOBS_URL}/{response.json()['job_id']}"
+        self.assertEqual(self.client.get(job_url).json()["status"], "pending")
+
+        self.user = SimpleNamespace(id=2)
+        self.assertEqual(self.client.get(job_url).status_code, 404)
+
+    def test_job_with_catalog_reference_and_stored_recording(self):
+        self.recordings[7] = (b"stored", "mp3")
+        melody = object()
+        self.patch(
+            "load_catalog_reference", mock.AsyncMock(return_value=(melody, 2.0))
+        )
+        response = self.client.post(
+            JOBS_URL, data={"reference_id": "4", "recording_id": "7"}
+        )
+        self.assertEqual(response.status_code, 202)
+        self.executor.start_compare_with_melody.assert_called_once_with(
+            melody, 2.0, b"stored", "mp3"
+        )
+
+    def test_job_needs_one_recording_source(self):
+        response = self.client.post(JOBS_URL, files=[REFERENCE])
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
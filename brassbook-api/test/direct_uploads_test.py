@@ -0,0 +1,174 @@
+import base64
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import MAX_FILE_SIZE
+from app.data.database import Base
+from app.data.models import Recording, User
+
+# Модуль хранилища проверяет бакет при импорте; сервер MinIO тестам не нужен
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app.core import direct_uploads
+    from app.data.storage import object_storage
+
+
+class FakeStorage:
+    """Object storage with uploads given as object name -> (content type, data)."""
+
+    bucket = "bucket"
+
+    def __init__(self):
+        self.objects = {}
+
+    async def stat(self, object_name):
+        if object_name not in self.objects:
+            return None
+        content_type, data = self.objects[object_name]
+        return SimpleNamespace(content_type=content_type, size=len(data))
+
+    async def get_bytes(self, object_name):
+        return self.objects[object_name][1]
+
+
+class TestDirectUploads(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.user = User(email="student@example.com")
+        self.other = User(email="other@example.com")
+        self.db.add_all([self.user, self.other])
+        self.db.commit()
+        self.storage = FakeStorage()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def upload(self, kind, content_type, data, user=None):
+        user = user or self.user
+        name = direct_uploads.object_name_for(kind, user.id, content_type)
+        self.storage.objects[name] = (content_type, data)
+        return name
+
+    async def confirm(self, object_name):
+        return await direct_uploads.confirm_upload(
+            self.db, self.storage, self.user, object_name
+        )
+
+    async def test_policy_pins_key_type_and_size(self):
+        upload = await direct_uploads.start_upload(
+            object_storage, self.user, "recording", "audio/webm"
+        )
+        name = upload["object_name"]
+        self.assertTrue(name.startswith(f"recordings/{self.user.id}/"))
+        self.assertTrue(name.endswith(".webm"))
+        self.assertEqual(upload["fields"]["key"], name)
+        self.assertEqual(upload["fields"]["Content-Type"], "audio/webm")
+
+        policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+        conditions = policy["conditions"]
+        self.assertIn(["eq", "$key", name], conditions)
+        self.assertIn(["eq", "$Content-Type", "audio/webm"], conditions)
+        self.assertIn(["content-length-range", 1, MAX_FILE_SIZE], conditions)
+
+    async def test_start_rejects_unknown_kind_and_type(self):
+        for kind, content_type in (("video", "video/mp4"), ("avatar", "image/gif")):
+            with self.assertRaises(HTTPException) as raised:
+                await direct_uploads.start_upload(
+                    object_storage, self.user, kind, content_type
+                )
+            self.assertEqual(raised.exception.status_code, 400)
+
+    async def test_confirm_recording_once(self):
+        name = self.upload("recording", "audio/webm", b"webm")
+        first = await self.confirm(name)
+        second = await self.confirm(name)
+        self.assertEqual(first["kind"], "recording")
+        self.assertEqual(first["recording_id"], second["recording_id"])
+        recording = self.db.get(Recording, first["recording_id"])
+        self.assertEqual(recording.user_id, self.user.id)
+        self.assertEqual(recording.size, 4)
+
+    async def test_concurrent_confirms_return_the_same_recording(self):
+        name = self.upload("recording", "audio/webm", b"webm")
+        other = sessionmaker(bind=self.engine)()
+        self.addCleanup(other.close)
+        commit = self.db.commit
+
+        def racing_commit():
+            # Второй confirm сохранил запись после нашей проверки
+            self.db.commit = commit
+            other.add(
+                Recording(
+                    user_id=self.user.id,
+                    object_name=name,
+                    content_type="audio/webm",
+                    size=4,
+                )
+            )
+            other.commit()
+            commit()
+
+        self.db.commit = racing_commit
+        confirmed = await self.confirm(name)
+        self.assertEqual(self.db.query(Recording).count(), 1)
+        self.assertEqual(confirmed["recording_id"], self.db.query(Recording).one().id)
+
+    async def test_confirm_avatar_sets_photo(self):
+        name = self.upload("avatar", "image/png", b"png")
+        self.user.photo_sizes = "64"
+        confirmed = await self.confirm(name)
+        self.assertIsNone(confirmed["recording_id"])
+        self.assertEqual(self.user.photo_url, f"/bucket/{name}")
+        self.assertIsNone(self.user.photo_sizes)
+
+    async def test_confirm_checks(self):
+        other = self.upload("recording", "audio/webm", b"webm", user=self.other)
+        missing = direct_uploads.object_name_for("recording", self.user.id, "audio/wav")
+        # Клиент мог отправить другой тип или слишком большой файл
+        wrong_type = self.upload("recording", "audio/webm", b"x")
+        self.storage.objects[wrong_type] = ("text/html", b"x")
+        too_big = self.upload("avatar", "image/png", b"x" * (MAX_FILE_SIZE + 1))
+
+        cases = ((other, 403), (missing, 404), (wrong_type, 400), (too_big, 400))
+        for name, code in cases:
+            with self.assertRaises(HTTPException) as raised:
+                await self.confirm(name)
+            self.assertEqual(raised.exception.status_code, code, name)
+        self.assertEqual(self.db.query(Recording).count(), 0)
+        self.assertIsNone(self.user.photo_url)
+
+    async def test_load_recording(self):
+        name = self.upload("recording", "audio/mpeg", b"mp3")
+        recording_id = (await self.confirm(name))["recording_id"]
+        data, file_format = await direct_uploads.load_recording(
+            self.db, self.storage, self.user, recording_id
+        )
+        self.assertEqual((data, file_format), (b"mp3", "mp3"))
+
+        for user, requested, code in (
+            (self.other, recording_id, 403),
+            (self.user, recording_id + 1, 404),
+        ):
+            with self.assertRaises(HTTPException) as raised:
+                await direct_uploads.load_recording(
+                    self.db, self.storage, user, requested
+                )
+            self.assertEqual(raised.exception.status_code, code)
+
+
+if __name__ == "__main__":
+    unittest.main()
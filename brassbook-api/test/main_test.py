@@ -1,4 +1,11 @@
 import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+# Модуль хранилища проверяет бакет при импорте; сервер MinIO тестам не нужен
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app import main
 
 
 class MyTestCase(unittest.TestCase):
@@ -6,5 +13,50 @@ class MyTestCase(unittest.TestCase):
         self.assertEqual(True, True)
 
 
+class TestMetricsRoute(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(main.app)
+
+    def test_disabled_without_token(self):
+        with mock.patch.object(main, "METRICS_TOKEN", ""):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_requires_token(self):
+        with mock.patch.object(main, "METRICS_TOKEN", "secret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            response = self.client.get(
+                "/metrics", headers={"Authorization": "Bearer wrong"}
+            )
+            self.assertEqual(response.status_code, 401)
+            response = self.client.get(
+                "/metrics", headers={"Authorization": "Bearer secret"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("brassbook_analysis_stage_seconds", response.text)
+
+
+class TestFirstRequestLog(unittest.TestCase):
+
+    def test_logs_only_the_first_request(self):
+        client = TestClient(main.FirstRequestLogMiddleware(main.app))
+        with self.assertLogs("app.main", "INFO") as logs:
+            client.get("/metrics")
+            client.get("/metrics")
+        # Второй запрос проходит без записи в лог
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("First request /metrics served in", logs.output[0])
+        self.assertIn("after boot", logs.output[0])
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_fails_without_public_minio_url(self):
+        with mock.patch.object(main, "MINIO_PUBLIC_URL", ""):
+            with self.assertRaises(RuntimeError):
+                with TestClient(main.app):
+                    pass
+
+
 if __name__ == "__main__":
     unittest.main()
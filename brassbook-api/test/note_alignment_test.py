@@ -0,0 +1,102 @@
+import unittest
+
+import numpy as np
+
+from app.core.note_alignment import align_notes, band_radius
+
+
+def full_dtw_cost(freq_t, len_t, freq_c, len_c, gap_cost):
+    """Unbanded alignment cost computed cell by cell."""
+    n, m = len(freq_t), len(freq_c)
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0
+    for i in range(n + 1):
+        for j in range(m + 1):
+            if i and j:
+                note = (freq_t[i - 1] != freq_c[j - 1]) + min(
+                    1.0, abs(len_t[i - 1] - len_c[j - 1]) / len_t[i - 1]
+                )
+                cost[i, j] = min(cost[i, j], cost[i - 1, j - 1] + note)
+            if i:
+                cost[i, j] = min(cost[i, j], cost[i - 1, j] + gap_cost)
+            if j:
+                cost[i, j] = min(cost[i, j], cost[i, j - 1] + gap_cost)
+    return cost[n, m]
+
+
+def path_cost(freq_t, len_t, freq_c, len_c, index_t, index_c, gap_cost):
+    total = 0.0
+    for i, j in zip(index_t, index_c):
+        if i < 0 or j < 0:
+            total += gap_cost
+        else:
+            total += (freq_t[i] != freq_c[j]) + min(
+                1.0, abs(len_t[i] - len_c[j]) / len_t[i]
+            )
+    return total
+
+
+class TestNoteAlignment(unittest.TestCase):
+
+    def test_skipped_and_extra_notes(self):
+        freq_t = np.array([0, 1, 2, 3, 4, 0, 1])
+        len_t = np.full(7, 10)
+        # Пропущена нота 2, после ноты 4 сыграна лишняя
+        freq_c = np.array([0, 1, 3, 4, 2, 0, 1])
+        len_c = np.array([10, 10, 10, 10, 3, 10, 10])
+
+        index_t, index_c = align_notes(freq_t, len_t, freq_c, len_c, 16, 1.0)
+        self.assertEqual(index_t.tolist(), [0, 1, 2, 3, 4, -1, 5, 6])
+        self.assertEqual(index_c.tolist(), [0, 1, -1, 2, 3, 4, 5, 6])
+
+    def test_empty_sequence(self):
+        index_t, index_c = align_notes(
+            np.array([1, 2]), np.array([5, 5]), np.array([]), np.array([]), 16, 1.0
+        )
+        self.assertEqual(index_t.tolist(), [0, 1])
+        self.assertEqual(index_c.tolist(), [-1, -1])
+
+    def test_wide_band_matches_full_dtw(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            n, m = rng.integers(1, 30, 2)
+            freq_t, freq_c = rng.integers(0, 5, n), rng.integers(0, 5, m)
+            len_t, len_c = rng.integers(1, 20, n), rng.integers(1, 20, m)
+            index_t, index_c = align_notes(freq_t, len_t, freq_c, len_c, 64, 0.8)
+
+            self.assertEqual(index_t[index_t >= 0].tolist(), list(range(n)))
+            self.assertEqual(index_c[index_c >= 0].tolist(), list(range(m)))
+            self.assertAlmostEqual(
+                path_cost(freq_t, len_t, freq_c, len_c, index_t, index_c, 0.8),
+                full_dtw_cost(freq_t, len_t, freq_c, len_c, 0.8),
+            )
+
+    def test_band_follows_length_ratio(self):
+        self.assertEqual(band_radius(100, 100, 16), 16)
+        self.assertEqual(band_radius(2, 100, 16), 50)
+
+        freq_c = np.arange(40) % 5
+        index_t, index_c = align_notes(
+            np.array([3]), np.array([5]), freq_c, np.full(40, 5), 2, 1.0
+        )
+        self.assertEqual(index_c.tolist(), list(range(40)))
+        self.assertEqual(index_t.tolist().count(0), 1)
+
+    def test_long_piece_with_gaps(self):
+        rng = np.random.default_rng(1)
+        freq_t = rng.integers(0, 5, 2000)
+        len_t = rng.integers(5, 40, 2000)
+        keep = rng.random(2000) > 0.05
+
+        index_t, index_c = align_notes(
+            freq_t, len_t, freq_t[keep], len_t[keep], 16, 1.0
+        )
+        matched = index_c >= 0
+        np.testing.assert_array_equal(
+            freq_t[index_t[matched]], freq_t[keep][index_c[matched]]
+        )
+        self.assertEqual(int((index_c < 0).sum()), int((~keep).sum()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+
+from app.data.presigned_urls import PresignedUrlCache, object_name_from_reference
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPresignedUrlCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = PresignedUrlCache(maxsize=2, margin=300, clock=self.clock)
+
+    def test_url_reused_until_margin(self):
+        self.cache.put("a.png", 3600, "url-1", self.clock.now)
+        self.clock.now += 3600 - 301
+        self.assertEqual(self.cache.get("a.png", 3600), "url-1")
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get("a.png", 3600))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 0})
+
+    def test_margin_capped_for_short_lifetimes(self):
+        self.cache.put("a.png", 60, "url-1", self.clock.now)
+        self.clock.now += 29
+        self.assertEqual(self.cache.get("a.png", 60), "url-1")
+        self.assertIsNone(self.cache.get("a.png", 3600))
+
+    def test_least_recently_used_evicted(self):
+        self.cache.put("a.png", 3600, "url-a", self.clock.now)
+        self.cache.put("b.png", 3600, "url-b", self.clock.now)
+        self.cache.get("a.png", 3600)
+        self.cache.put("c.png", 3600, "url-c", self.clock.now)
+        self.assertIsNone(self.cache.get("b.png", 3600))
+        self.assertEqual(self.cache.get("a.png", 3600), "url-a")
+
+    def test_discard(self):
+        self.cache.put("a.png", 3600, "url-a", self.clock.now)
+        self.cache.put("a.png", 60, "url-a-short", self.clock.now)
+        self.cache.discard("a.png")
+        self.cache.discard("missing.png")
+        self.assertIsNone(self.cache.get("a.png", 3600))
+        self.assertIsNone(self.cache.get("a.png", 60))
+
+        self.cache.put("b.png", 3600, "url-b", self.clock.now)
+        self.cache.put("c.png", 3600, "url-c", self.clock.now)
+        self.cache.discard("c.png")
+        self.assertEqual(self.cache.get("b.png", 3600), "url-b")
+
+    def test_index_follows_evictions(self):
+        for name in ("a.png", "b.png", "c.png"):
+            self.cache.put(name, 3600, f"url-{name}", self.clock.now)
+        self.clock.now += 3600
+        self.assertIsNone(self.cache.get("c.png", 3600))
+        # Вытесненные и просроченные ссылки не остаются в индексе
+        self.assertEqual(self.cache._lifetimes, {"b.png": {3600}})
+        self.cache.discard("b.png")
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+
+class TestObjectNameFromReference(unittest.TestCase):
+
+    def test_references(self):
+        cases = {
+            "/avatars-bucket/avatars/7_me.png": "avatars/7_me.png",
+            "http://minio:9000/avatars-bucket/avatars/7_m%20e.png?X-Amz-Signature=1": "avatars/7_m e.png",
+            "avatars/7_me.png": "avatars/7_me.png",
+        }
+        for reference, expected in cases.items():
+            self.assertEqual(
+                object_name_from_reference(reference, "avatars-bucket"), expected
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import soundfile as sf
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.analysis_executor import AnalysisExecutor
+from app.core.compare_melodies import melody_cache
+from app.data.database import Base
+from app.data.models import ReferenceTrack
+
+# Модуль хранилища проверяет бакет при импорте; сервер MinIO тестам не нужен
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app.core import reference_catalog
+
+
+class MemoryStorage:
+    """Object storage keeping objects in a dict."""
+
+    def __init__(self):
+        self.objects = {}
+        self.on_put = None
+
+    async def put_bytes(self, object_name, data, content_type):
+        self.objects[object_name] = data
+        if self.on_put is not None:
+            self.on_put()
+
+    async def get_bytes(self, object_name):
+        return self.objects[object_name]
+
+
+class TestReferenceCatalog(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        sample_rate = 22050
+        t = np.linspace(0, 1.0, sample_rate)
+        buffer = io.BytesIO()
+        sf.write(buffer, 0.5 * np.sin(2 * np.pi * 440 * t), sample_rate, format="WAV")
+        self.audio = buffer.getvalue()
+
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        Base.metadata.create_all(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        self.db = self.sessions()
+
+        self.storage = MemoryStorage()
+        self.executor = AnalysisExecutor(
+            backend="thread",
+            workers=1,
+            max_tasks_per_child=0,
+            queue_size=2,
+            task_timeout=60,
+        )
+        melody_cache.clear()
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.db.close()
+        self.engine.dispose()
+        os.remove(self.db_path)
+        melody_cache.clear()
+
+    async def register(self):
+        return await reference_catalog.register_reference(
+            self.db, "Sine", self.audio, "wav", self.executor, self.storage
+        )
+
+    async def test_register_twice_returns_existing(self):
+        first = await self.register()
+        stored = dict(self.storage.objects)
+        second = await self.register()
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(self.storage.objects, stored)
+        self.assertEqual(len(stored), 2)
+        self.assertIn(first.features_object, stored)
+
+    async def test_concurrent_registration_returns_existing(self):
+        def register_elsewhere():
+            # Другой запрос зарегистрировал тот же файл после нашей проверки
+            self.storage.on_put = None
+            other = self.sessions()
+            other.add(ReferenceTrack(title="Other", sha256=digest))
+            other.commit()
+            other.close()
+
+        digest = reference_catalog._sha256(self.audio)
+        self.storage.on_put = register_elsewhere
+        reference = await self.register()
+        self.assertEqual(reference.title, "Other")
+        self.assertEqual(self.db.query(ReferenceTrack).count(), 1)
+
+    async def test_load_without_melody_cache(self):
+        reference = await self.register()
+        melody_cache.clear()
+        with mock.patch.object(melody_cache, "maxsize", 0):
+            melody, min_per = await reference_catalog.load_reference_melody(
+                self.db, reference, self.executor, self.storage
+            )
+        self.assertGreater(len(melody), 0)
+        self.assertGreater(min_per, 0)
+
+    async def test_outdated_features_are_reanalysed(self):
+        reference = await self.register()
+        reference.config_fingerprint = "outdated"
+        reference.features_object = "references/outdated.npz"
+        self.db.commit()
+        melody_cache.clear()
+
+        melody, _ = await reference_catalog.load_reference_melody(
+            self.db, reference, self.executor, self.storage
+        )
+        self.assertGreater(len(melody), 0)
+        self.assertEqual(
+            reference.features_object,
+            reference_catalog.features_object_name(reference.sha256),
+        )
+        self.assertNotEqual(reference.config_fingerprint, "outdated")
+
+    async def test_failed_reanalysis_commit_rolled_back(self):
+        reference = await self.register()
+        reference.config_fingerprint = "outdated"
+        self.db.commit()
+        melody_cache.clear()
+
+        with mock.patch.object(self.db, "commit", side_effect=RuntimeError("down")):
+            melody, _ = await reference_catalog.load_reference_melody(
+                self.db, reference, self.executor, self.storage
+            )
+        self.assertGreater(len(melody), 0)
+        # Сессия пригодна для следующих запросов, изменения отменены
+        self.assertEqual(self.db.get(ReferenceTrack, reference.id).title, "Sine")
+        self.assertEqual(reference.config_fingerprint, "outdated")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import threading
+import time
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+from minio.error import S3Error
+
+# Модуль хранилища проверяет бакет при импорте; сервер MinIO тестам не нужен
+with mock.patch("minio.Minio.bucket_exists", return_value=True):
+    from app.data import storage
+
+
+def s3_error(code: str) -> S3Error:
+    return S3Error(code, "message", "resource", "request", "host", mock.Mock())
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def test_pool_settings(self):
+        client = storage.build_http_client(7)
+        self.assertEqual(client.connection_pool_kw["maxsize"], 7)
+        self.assertTrue(client.connection_pool_kw["block"])
+        timeout = client.connection_pool_kw["timeout"]
+        self.assertEqual(timeout.connect_timeout, storage.MINIO_CONNECT_TIMEOUT)
+        self.assertEqual(timeout.read_timeout, storage.MINIO_READ_TIMEOUT)
+        self.assertEqual(client.connection_pool_kw["retries"].total, 3)
+
+    def test_shared_client_uses_pool(self):
+        self.assertEqual(
+            storage.minio_client._http.connection_pool_kw["maxsize"],
+            storage.MINIO_POOL_SIZE,
+        )
+
+
+class TestObjectHelpers(unittest.TestCase):
+
+    def patch_client(self, method: str, **kwargs) -> mock.Mock:
+        patcher = mock.patch.object(storage.minio_client, method, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_put_bytes(self):
+        put_object = self.patch_client("put_object")
+        storage.put_bytes("a/b.txt", b"data", "text/plain")
+        kwargs = put_object.call_args.kwargs
+        self.assertEqual(kwargs["bucket_name"], storage.MINIO_BUCKET_NAME)
+        self.assertEqual(kwargs["object_name"], "a/b.txt")
+        self.assertEqual(kwargs["data"].read(), b"data")
+        self.assertEqual(kwargs["length"], 4)
+        self.assertEqual(kwargs["content_type"], "text/plain")
+
+    def test_put_stream_error(self):
+        self.patch_client("put_object", side_effect=s3_error("AccessDenied"))
+        with self.assertRaises(HTTPException) as raised:
+            storage.put_stream("a", io.BytesIO(b"x"), 1, "text/plain")
+        self.assertEqual(raised.exception.status_code, 500)
+
+    def test_get_bytes_releases_connection(self):
+        response = mock.Mock()
+        response.read.return_value = b"data"
+        self.patch_client("get_object", return_value=response)
+        self.assertEqual(storage.get_bytes("a"), b"data")
+        response.close.assert_called_once()
+        response.release_conn.assert_called_once()
+
+    def test_get_bytes_error(self):
+        self.patch_client("get_object", side_effect=s3_error("NoSuchKey"))
+        with self.assertRaises(HTTPException) as raised:
+            storage.get_bytes("a")
+        self.assertEqual(raised.exception.status_code, 500)
+
+    def test_stat_file(self):
+        stat_object = self.patch_client("stat_object", return_value="stat")
+        self.assertEqual(storage.stat_file("a"), "stat")
+        stat_object.side_effect = s3_error("NoSuchKey")
+        self.assertIsNone(storage.stat_file("a"))
+        stat_object.side_effect = s3_error("AccessDenied")
+        with self.assertRaises(HTTPException):
+            storage.stat_file("a")
+
+
+class TestObjectStorage(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrency_limited(self):
+        object_storage = storage.ObjectStorage(mock.Mock(), "bucket", 2)
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def call(value):
+            with lock:
+                running.append(value)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(value)
+            return value
+
+        results = await asyncio.gather(
+            *(object_storage.run("get", call, i) for i in range(6))
+        )
+        self.assertEqual(results, list(range(6)))
+        self.assertEqual(max(peak), 2)
+
+    async def test_get_url_cached(self):
+        storage.presigned_urls.discard("a/b.png")
+        with mock.patch.object(
+            storage.minio_client, "presigned_get_object", return_value="url"
+        ) as presign:
+            first = await storage.object_storage.get_url("a/b.png")
+            second = await storage.object_storage.get_url("a/b.png")
+        self.assertEqual((first, second), ("url", "url"))
+        presign.assert_called_once()
+
+
+class TestSlotsCreatedInLoop(unittest.TestCase):
+
+    def test_semaphore_created_on_first_use(self):
+        object_storage = storage.ObjectStorage(mock.Mock(), "bucket", 1)
+        self.assertFalse(object_storage._slots.created)
+        self.assertEqual(asyncio.run(object_storage.run("stat", len, "ab")), 2)
+        self.assertTrue(object_storage._slots.created)
+
+
+if __name__ == "__main__":
+    unittest.main()
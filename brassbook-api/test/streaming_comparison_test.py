@@ -0,0 +1,123 @@
+import unittest
+
+import librosa
+import numpy as np
+
+from app.core.analysis_executor import AnalysisExecutor, ExecutorBusyError
+from app.core.compare_melodies import (
+    MELODY_DTYPE,
+    AudioConfig,
+    compare_with_reference,
+    extract_melody_from_audio,
+    segment_notes,
+)
+from app.core.streaming_comparison import LiveMelodyTracker, StreamingComparison
+from audio_decoder_test import encode_audio
+
+
+def synthesize_notes(bands, sr: int, note_seconds: float = 0.5) -> np.ndarray:
+    """Синтезирует последовательность нот на центральных частотах мел-полос."""
+    mel_f = librosa.mel_frequencies(
+        n_mels=AudioConfig.N_MELS + 2, fmax=AudioConfig.SAMPLE_RATE / 2
+    )
+    first_band = AudioConfig.FREQ_BANDS.start
+    t = np.arange(int(note_seconds * sr)) / sr
+    envelope = np.minimum(1, t / 0.02) * np.exp(-2 * t)
+    notes = [
+        0.4 * np.sin(2 * np.pi * mel_f[first_band + band + 1] * t) * envelope
+        for band in bands
+    ]
+    silence = np.zeros(int(0.3 * sr))
+    return np.concatenate([silence, *notes, silence]).astype(np.float32)
+
+
+class TestStreamingComparison(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        bands = [0, 2, 4, 1, 3, 0, 4, 2]
+        audio = synthesize_notes(bands, 48000)
+        self.webm = encode_audio(audio, 48000, "webm", "libopus")
+        self.teacher_melody, self.min_per_t = extract_melody_from_audio(
+            self.webm, "webm"
+        )
+        self.executor = AnalysisExecutor(
+            backend="thread",
+            workers=1,
+            max_tasks_per_child=0,
+            queue_size=1,
+            task_timeout=60,
+        )
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_stream_matches_upload(self):
+        session = StreamingComparison.open(
+            self.teacher_melody, self.min_per_t, "webm", self.executor
+        )
+        for start in range(0, len(self.webm), 2048):
+            session.feed(self.webm[start : start + 2048])
+        result = await session.finish()
+
+        expected = compare_with_reference(
+            self.teacher_melody, self.min_per_t, self.webm, "webm"
+        )
+        self.assertEqual(result, expected)
+        self.assertEqual(StreamingComparison.active, 0)
+
+        notes = []
+        while not session.events.empty():
+            notes.extend(session.events.get_nowait()["notes"])
+        self.assertGreater(len(notes), 0)
+        self.assertEqual([note["index"] for note in notes], list(range(len(notes))))
+        self.assertTrue(all(note["pitch_ok"] for note in notes))
+
+    async def test_invalid_stream(self):
+        session = StreamingComparison.open(
+            self.teacher_melody, self.min_per_t, "webm", self.executor
+        )
+        session.feed(b"not audio at all")
+        self.assertIsNone(await session.finish())
+        self.assertEqual(StreamingComparison.active, 0)
+
+    async def test_session_limit(self):
+        StreamingComparison.active = 10**6
+        try:
+            with self.assertRaises(ExecutorBusyError):
+                StreamingComparison.open(self.teacher_melody, self.min_per_t)
+        finally:
+            StreamingComparison.active = 0
+
+
+class TestLiveMelodyTracker(unittest.TestCase):
+
+    def test_incremental_notes_match_full_segmentation(self):
+        rng = np.random.default_rng(0)
+        # Серии случайной длины, в том числе короче минимальной ноты
+        runs = rng.integers(1, 12, size=300)
+        contour = np.zeros(int(runs.sum()), dtype=MELODY_DTYPE)
+        contour["band"] = np.repeat(rng.integers(0, 6, size=len(runs)), runs)
+        min_per = 4.0
+        tracker = LiveMelodyTracker(contour[:0], min_per, AudioConfig.SAMPLE_RATE)
+
+        verdicts = []
+        start = 0
+        while start < len(contour):
+            stop = start + int(rng.integers(1, 40))
+            tracker._tail = np.concatenate((tracker._tail, contour[start:stop]))
+            verdicts.extend(tracker._new_verdicts())
+            start = stop
+            # Хранится только хвост после последней законченной ноты
+            self.assertLess(len(tracker._tail), 40 + 12 * 3)
+
+        bands, lengths = segment_notes(contour, min_per)
+        self.assertGreater(len(bands), 0)
+        self.assertEqual([verdict["band"] for verdict in verdicts], bands.tolist())
+        self.assertEqual([verdict["length"] for verdict in verdicts], lengths.tolist())
+        self.assertEqual(
+            [verdict["index"] for verdict in verdicts], list(range(len(bands)))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
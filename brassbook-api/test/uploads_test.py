@@ -0,0 +1,61 @@
+import unittest
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.api.uploads import UploadLimitMiddleware, read_upload
+
+
+def build_app() -> FastAPI:
+    app = FastAPI(root_path="/api")
+    received = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        content = await read_upload(file, "File", limit=1000)
+        received.append(len(content))
+        return {"size": len(content)}
+
+    app.add_middleware(UploadLimitMiddleware, limits={"/upload": 1500})
+    app.state.received = received
+    return app
+
+
+class TestUploadLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.app = build_app()
+        self.client = TestClient(self.app)
+
+    def test_small_upload_passes(self):
+        response = self.client.post("/upload", files={"file": ("a.bin", b"x" * 900)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"size": 900})
+
+    def test_file_over_limit(self):
+        response = self.client.post("/upload", files={"file": ("a.bin", b"x" * 1200)})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("File exceeds", response.json()["detail"])
+        self.assertEqual(self.app.state.received, [])
+
+    def test_declared_length_rejected_before_reading(self):
+        response = self.client.post("/upload", files={"file": ("a.bin", b"x" * 5000)})
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("Request body exceeds", response.json()["detail"])
+
+    def test_streamed_body_rejected_while_reading(self):
+        def body():
+            for _ in range(10):
+                yield b"x" * 1000
+
+        response = self.client.post(
+            "/upload",
+            content=body(),
+            headers={"Content-Type": "multipart/form-data; boundary=b"},
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.app.state.received, [])
+
+
+if __name__ == "__main__":
+    unittest.main()